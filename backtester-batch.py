@@ -0,0 +1,181 @@
+import sys
+import argparse
+import csv
+import glob
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from cube import ResultCube
+from datasets import load_bars, periods_per_year
+from rolling import RollingIndex
+from shared_data import SharedDataset, attach, run_shared_batch
+from sweep import RANK_METRICS, RESULT_COLUMNS, TopK, chunked, parameter_grid, parse_constraint, result_row, stream_results, terminate_pool, uses_risk_metrics
+
+SUMMARY_COLUMNS = ('data_file', 'bars', 'combinations') + RESULT_COLUMNS
+
+def dataset_paths(patterns, manifest=None):
+    """
+    Expands glob patterns and manifest entries (one path or glob per line,
+    '#' starts a comment) into dataset paths.
+
+    Returns:
+        list of paths in first-seen order, without duplicates
+    """
+    entries = list(patterns)
+    if manifest:
+        with open(manifest) as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    entries.append(line)
+    paths = []
+    for entry in entries:
+        for path in sorted(glob.glob(entry)) or [entry]:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Sweep one parameter grid over several datasets with a single worker pool and report the best configuration of each."
+    )
+    parser.add_argument("parallelism", type=int, help="Number of worker processes.")
+    parser.add_argument("start_coin", type=float, help="Starting coin balance.")
+    parser.add_argument("start_cash", type=float, help="Starting cash balance.")
+    parser.add_argument("min_window_size", type=int, help="Smallest buy/sell window in the grid.")
+    parser.add_argument("max_window_size", type=int, help="Upper bound (exclusive) of the buy/sell windows; also the first simulated bar.")
+    parser.add_argument("datasets", nargs='*', help="CSV files or glob patterns, e.g. 'data/btc_cycle*_5D.csv'.")
+    parser.add_argument("--manifest", default=None,
+                        help="Text file listing more CSV files or glob patterns, one per line.")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="Parameter combinations simulated in lockstep per task.")
+    parser.add_argument("--max-pending", type=int, default=0,
+                        help="Tasks in flight at once (default 4 per worker).")
+    parser.add_argument("--top-k", type=int, default=1,
+                        help="Number of best configurations to report per dataset.")
+    parser.add_argument("--rank-by", choices=sorted(RANK_METRICS), default='final_cash',
+                        help="Metric used to rank configurations (max_drawdown and exposure rank lowest first, the others highest first).")
+    parser.add_argument("--constraint", action="append", default=[], metavar="METRIC<=VALUE",
+                        help="Only rank configurations meeting this bound, e.g. 'max_drawdown<=0.5' (repeatable).")
+    parser.add_argument("--risk-metrics", action="store_true", default=False,
+                        help="Compute the risk metrics of every combination even if neither --rank-by nor --constraint uses them (they are NaN otherwise).")
+    parser.add_argument("--results-csv", default=None,
+                        help="Write the per-dataset best configurations to this CSV file.")
+    parser.add_argument("--cube", default=None,
+                        help="Write every metric of every dataset into a memory-mapped results cube in this directory (see cube.py).")
+    parser.add_argument("--no-cache", action="store_true", default=False,
+                        help="Parse the CSV files instead of using the binary dataset cache.")
+    args = parser.parse_args(argv)
+    if not args.datasets and not args.manifest:
+        parser.error("give at least one dataset or --manifest")
+    try:
+        args.constraint = [parse_constraint(text) for text in args.constraint]
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def main(argv):
+    args = parse_args(argv)
+
+    workers = args.parallelism
+    start_coin = args.start_coin
+    start_cash = args.start_cash
+    min_window_size = args.min_window_size
+    max_window_size = args.max_window_size
+    batch_size = max(args.batch_size, 1)
+    max_pending = args.max_pending or 4 * workers
+    top_k = args.top_k
+    rank_by = args.rank_by
+    # The engines skip the risk metrics unless the ranking or the output needs them
+    risk = args.risk_metrics or uses_risk_metrics(rank_by, args.constraint)
+    use_cache = not args.no_cache
+    window_size = 0
+
+    start_time = time.time()
+
+    axes = parameter_grid(min_window_size, max_window_size)
+    stop_percentages, buy_windows, sell_windows, go_percentages, bad_percentages = axes
+    grid = list(itertools.product(*axes))
+    windows = set(buy_windows) | set(sell_windows)
+
+    # Load every dataset once; the largest ones are scheduled first so the
+    # pool is not left waiting on one long series at the end
+    datasets = []
+    for data_file in dataset_paths(args.datasets, args.manifest):
+        bars = load_bars(data_file, use_cache)
+        if len(bars) <= max_window_size:
+            print(f"Skipping {data_file}: {len(bars)} bars, need more than {max_window_size}")
+            continue
+        datasets.append((data_file, bars))
+    if not datasets:
+        print("No dataset to sweep")
+        return 1
+    datasets.sort(key=lambda entry: len(entry[1]), reverse=True)
+    print(f"{len(datasets)} datasets, {len(grid)} combinations each, {len(datasets) * len(grid)} simulations")
+
+    tops = {data_file: TopK(top_k, rank_by, args.constraint) for data_file, _ in datasets}
+    cube = ResultCube.create(args.cube, sorted(data_file for data_file, _ in datasets), axes,
+                             {'start_coin': start_coin, 'start_cash': start_cash, 'max_window_size': max_window_size, 'window_size': window_size}) if args.cube else None
+    tasks = (
+        ((data_file, index), run_shared_batch, (data_file, window_size, start_coin, start_cash, max_window_size, chunk, None, risk))
+        for data_file, _ in datasets
+        for index, chunk in chunked(grid, batch_size)
+    )
+
+    shared = []
+    try:
+        for data_file, bars in datasets:
+            shared.append(SharedDataset(data_file, bars, RollingIndex(bars.close, windows), periods_per_year(data_file, use_cache)))
+        # One pool for every dataset: workers attach all of them once at startup
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=tuple(dataset.spec for dataset in shared)) as executor:
+            try:
+                completed = 0
+                cur_time = time.time()
+                for (data_file, index), results in stream_results(executor, tasks, max_pending):
+                    for k, result in enumerate(results, index):
+                        tops[data_file].push(k, result)
+                    if cube is not None:
+                        cube.write(data_file, range(index, index + len(results)), results)
+                    completed += len(results)
+                    if time.time() - cur_time >= 1.0:
+                        print(f"{round(time.time() - start_time, 3)}s: {completed}/{len(datasets) * len(grid)} completed...")
+                        cur_time = time.time()
+            except KeyboardInterrupt:
+                for dataset in shared:
+                    dataset.close()
+                terminate_pool(executor)
+                raise
+    finally:
+        for dataset in shared:
+            dataset.close()
+        if cube is not None:
+            cube.close()
+
+    rows = []
+    unmet = []
+    for data_file, bars in sorted(datasets):
+        best = tops[data_file].best()
+        if not best:
+            unmet.append(data_file)
+        for result in best:
+            rows.append((data_file, len(bars), len(grid)) + result_row(result, start_coin, start_cash))
+
+    print("****************************************")
+    print(f"Best configurations by {rank_by}:")
+    print(f"{'Dataset':<32} {'Bars':>6} {'Stop':>5} {'Buy':>4} {'Sell':>4} {'Go':>5} {'Bad':>5} {'Final Cash':>16} {'Trades':>6} {'Win Avg':>10} {'Loss Avg':>10} {'Max DD':>7} {'Sharpe':>7}")
+    for row in rows:
+        r = dict(zip(SUMMARY_COLUMNS, row))
+        print(f"{r['data_file']:<32} {r['bars']:>6} {r['stop_percentage']:>5} {r['buy_window']:>4} {r['sell_window']:>4} {r['go_percentage']:>5} {r['bad_percentage']:>5} "
+              f"{round(r['final_cash'], 2):>16} {r['trades']:>6} {round(r['win_average'], 4):>10} {round(r['loss_average'], 4):>10} {round(r['max_drawdown'], 4):>7} {round(r['sharpe'], 3):>7}")
+    for data_file in unmet:
+        print(f"{data_file:<32} no configuration meets the constraints")
+    if args.results_csv:
+        with open(args.results_csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY_COLUMNS)
+            writer.writerows(rows)
+    print(f"Elapsed Time: {round(time.time() - start_time, 3)} seconds")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
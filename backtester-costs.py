@@ -0,0 +1,137 @@
+import sys
+import argparse
+import itertools
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from datasets import content_hash, load_bars
+from engine import simulate_batch
+from replay import check_variants, load_logs, log_settings, replay, save_logs, variant_grid
+from rolling import RollingIndex
+from shared_data import SharedDataset, attach, run_shared_trades
+from sweep import chunked, parameter_grid, stream_results, terminate_pool
+
+REPLAY_METRICS = ('final_cash', 'final_balance')
+
+def sweep_trade_logs(data_file, bars, grid, workers, start_coin, start_cash, max_window_size, batch_size, max_pending):
+    """
+    Simulates every combination once, recording its trades.
+
+    Returns:
+        (list of SimulationResult, list of TradeLog) in grid order
+    """
+    results = [None] * len(grid)
+    logs = [None] * len(grid)
+    rolling = RollingIndex(bars.close, {p[1] for p in grid} | {p[2] for p in grid})
+    with SharedDataset(data_file, bars, rolling) as shared:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=(shared.spec,)) as executor:
+            try:
+                tasks = ((index, run_shared_trades, (data_file, 0, start_coin, start_cash, max_window_size, chunk, None, False)) for index, chunk in chunked(grid, batch_size))
+                for index, (batch, batch_logs) in stream_results(executor, tasks, max_pending):
+                    results[index:index + len(batch)] = batch
+                    logs[index:index + len(batch)] = batch_logs
+            except KeyboardInterrupt:
+                shared.close()
+                terminate_pool(executor)
+                raise
+    return results, logs
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Simulate the parameter grid once with trade logs, then re-price every configuration under many fee, slippage and starting-capital variants."
+    )
+    parser.add_argument("parallelism", type=int, help="Number of worker processes.")
+    parser.add_argument("data_file", help="Path to the input CSV file.")
+    parser.add_argument("start_coin", type=float, help="Starting coin balance of the recorded sweep.")
+    parser.add_argument("start_cash", type=float, help="Starting cash balance of the recorded sweep.")
+    parser.add_argument("min_window_size", type=int, help="Smallest buy/sell window in the grid.")
+    parser.add_argument("max_window_size", type=int, help="Upper bound (exclusive) of the buy/sell windows; also the first simulated bar.")
+    parser.add_argument("--fees", type=float, nargs='+', default=[0.0],
+                        help="Fee fractions charged on every trade, e.g. 0 0.001 0.002.")
+    parser.add_argument("--slippages", type=float, nargs='+', default=[0.0],
+                        help="Fill price slippage fractions, against the trade.")
+    parser.add_argument("--start-coins", type=float, nargs='+', default=None,
+                        help="Starting coin balances to replay (default: start_coin).")
+    parser.add_argument("--start-cashes", type=float, nargs='+', default=None,
+                        help="Starting cash balances to replay (default: start_cash).")
+    parser.add_argument("--rank-by", choices=REPLAY_METRICS, default='final_cash',
+                        help="Metric used to pick the best configuration of each variant.")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="Parameter combinations simulated in lockstep per task.")
+    parser.add_argument("--max-pending", type=int, default=0,
+                        help="Tasks in flight at once (default 4 per worker).")
+    parser.add_argument("--save-logs", default=None,
+                        help="Save the recorded trade logs to this .npz file.")
+    parser.add_argument("--load-logs", default=None,
+                        help="Replay the trade logs saved in this .npz file instead of simulating.")
+    parser.add_argument("--verify", action="store_true", default=False,
+                        help="Re-simulate every fee- and slippage-free variant and check that the replay matches it exactly.")
+    parser.add_argument("--no-cache", action="store_true", default=False,
+                        help="Parse the CSV file instead of using the binary dataset cache.")
+    args = parser.parse_args(argv)
+
+    args.variants = variant_grid(args.fees, args.slippages, args.start_coins or [args.start_coin], args.start_cashes or [args.start_cash])
+    try:
+        # The logs are recorded from start_coin and start_cash (checked against --load-logs in main())
+        check_variants(args.variants, args.start_coin > 0)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def main(argv):
+    args = parse_args(argv)
+    start_coin = args.start_coin
+    start_cash = args.start_cash
+    max_window_size = args.max_window_size
+
+    bars = load_bars(args.data_file, not args.no_cache)
+    settings = log_settings(content_hash(args.data_file, not args.no_cache), start_coin, start_cash, max_window_size)
+    start_time = time.time()
+    if args.load_logs:
+        grid, logs, saved = load_logs(args.load_logs)
+        if saved is None:
+            print(f"Warning: {args.load_logs} does not record its dataset and settings, they are not checked")
+        else:
+            mismatched = [key for key in settings if saved.get(key) != settings[key]]
+            if mismatched:
+                sys.exit(f"{args.load_logs} was recorded with different inputs: "
+                         + ', '.join(f"{key} {saved.get(key)} instead of {settings[key]}" for key in mismatched))
+        print(f"Loaded {len(logs)} trade logs from {args.load_logs}")
+    else:
+        grid = list(itertools.product(*parameter_grid(args.min_window_size, max_window_size)))
+        _, logs = sweep_trade_logs(args.data_file, bars, grid, args.parallelism, start_coin, start_cash, max_window_size,
+                                   max(args.batch_size, 1), args.max_pending or 4 * args.parallelism)
+        if args.save_logs:
+            save_logs(args.save_logs, grid, logs, settings)
+    sweep_time = round(time.time() - start_time, 3)
+
+    variants = args.variants
+    start_time = time.time()
+    replayed = replay(logs, variants)
+    replay_time = round(time.time() - start_time, 3)
+
+    print(f"Best configuration by {args.rank_by} for each variant:")
+    values = replayed[args.rank_by]
+    for v, variant in enumerate(variants):
+        # Ties go to the lower grid index, as in the sweep
+        best = int(np.argmax(values[:, v]))
+        stop_percentage, buy_window, sell_window, go_percentage, bad_percentage = grid[best]
+        print(f"Fee: {variant.fee}, Slippage: {variant.slippage}, Start Coins: {variant.start_coin}, Start Cash: {variant.start_cash}: "
+              f"Stop Percentage: {stop_percentage}, Buy Window: {buy_window}, Sell Window: {sell_window}, Go Percentage: {go_percentage}, Bad Percentage: {bad_percentage}, "
+              f"Final Balance: {replayed['final_balance'][best, v]}, Balance (in cash): {round(replayed['final_cash'][best, v], 2)}, Trades: {len(logs[best])}")
+
+    if args.verify:
+        rolling = RollingIndex(bars.close, {p[1] for p in grid} | {p[2] for p in grid})
+        for v, variant in enumerate(variants):
+            if variant.fee or variant.slippage:
+                continue
+            results = simulate_batch(bars, 0, variant.start_coin, variant.start_cash, max_window_size, grid, rolling, risk=False)
+            expected = np.array([[r.end_coin, r.end_cash, r.final_balance, r.final_cash] for r in results])
+            actual = np.column_stack([replayed[name][:, v] for name in ('end_coin', 'end_cash', 'final_balance', 'final_cash')])
+            print(f"{variant}: replay {'matches' if np.array_equal(expected, actual) else 'DOES NOT MATCH'} the simulation")
+
+    print(f"{len(logs)} configurations {'loaded' if args.load_logs else 'simulated'} in {sweep_time} seconds, {len(variants)} variants replayed in {replay_time} seconds")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
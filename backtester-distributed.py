@@ -0,0 +1,153 @@
+import sys
+import argparse
+import itertools
+import os
+import time
+from multiprocessing import Process
+from datasets import load_bars, periods_per_year
+from distributed import Coordinator, parse_address, run_worker
+from engine import simulate_history
+from rolling import RollingIndex
+from sweep import RANK_METRICS, RESULT_COLUMNS, CsvSink, PrintSink, SweepStats, TopK, parameter_grid, parse_constraint, result_row, uses_risk_metrics
+
+def authkey_of(args, parser):
+    authkey = args.authkey or os.environ.get('BACKTESTER_AUTHKEY')
+    if not authkey:
+        parser.error("give --authkey or set BACKTESTER_AUTHKEY (the same on the coordinator and every worker)")
+    return authkey.encode()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Distribute a parameter sweep over worker processes on any number of hosts."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser("coordinator", help="Serve the grid of one dataset and report the best configuration.")
+    coordinator.add_argument("data_file", help="Path to the input CSV file.")
+    coordinator.add_argument("start_coin", type=float, help="Starting coin balance.")
+    coordinator.add_argument("start_cash", type=float, help="Starting cash balance.")
+    coordinator.add_argument("min_window_size", type=int, help="Smallest buy/sell window in the grid.")
+    coordinator.add_argument("max_window_size", type=int, help="Upper bound (exclusive) of the buy/sell windows; also the first simulated bar.")
+    coordinator.add_argument("--listen", default="localhost:5555",
+                             help="host:port to serve work units on (default localhost:5555; use 0.0.0.0:PORT for other hosts).")
+    coordinator.add_argument("--authkey", default=None, help="Shared secret of the coordinator and its workers (default $BACKTESTER_AUTHKEY).")
+    coordinator.add_argument("--unit-size", type=int, default=256, help="Parameter combinations per work unit.")
+    coordinator.add_argument("--timeout", type=float, default=10.0,
+                             help="Seconds without a heartbeat after which a worker is dropped and its units reassigned.")
+    coordinator.add_argument("--idle-limit", type=float, default=300.0,
+                             help="Seconds without any connected worker, while units are left, after which the sweep fails (default 300).")
+    coordinator.add_argument("--local-workers", type=int, default=0, help="Also start this many workers on this host.")
+    coordinator.add_argument("--top-k", type=int, default=1, help="Number of best configurations to keep and report.")
+    coordinator.add_argument("--rank-by", choices=sorted(RANK_METRICS), default='final_cash',
+                             help="Metric used to rank configurations (max_drawdown and exposure rank lowest first, the others highest first).")
+    coordinator.add_argument("--constraint", action="append", default=[], metavar="METRIC<=VALUE",
+                             help="Only rank configurations meeting this bound, e.g. 'max_drawdown<=0.5' or 'trades>=10' (repeatable).")
+    coordinator.add_argument("--risk-metrics", action="store_true", default=False,
+                             help="Compute the risk metrics of every combination even if neither --rank-by nor --constraint uses them (they are NaN otherwise).")
+    coordinator.add_argument("--results-csv", default=None, help="Write one row per combination to this CSV file instead of printing it.")
+    coordinator.add_argument("--stats", action="store_true", default=False,
+                             help="Print aggregate statistics of the ranking metric over the sweep.")
+    coordinator.add_argument("--no-cache", action="store_true", default=False,
+                             help="Parse the CSV file instead of using the binary dataset cache.")
+
+    worker = commands.add_parser("worker", help="Simulate work units served by a coordinator.")
+    worker.add_argument("address", help="host:port of the coordinator.")
+    worker.add_argument("--authkey", default=None, help="Shared secret of the coordinator and its workers (default $BACKTESTER_AUTHKEY).")
+    worker.add_argument("--processes", type=int, default=1, help="Worker processes to run on this host.")
+    worker.add_argument("--heartbeat", type=float, default=2.0, help="Seconds between heartbeats.")
+
+    args = parser.parse_args(argv)
+    args.authkey = authkey_of(args, parser)
+    if args.command == 'coordinator':
+        try:
+            args.constraint = [parse_constraint(text) for text in args.constraint]
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+def run_workers(address, authkey, processes, heartbeat=2.0):
+    workers = [Process(target=run_worker, args=(address, authkey, heartbeat)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    return workers
+
+def coordinate(args):
+    start_time = time.time()
+    cur_time = time.time()
+    start_coin = args.start_coin
+    start_cash = args.start_cash
+    max_window_size = args.max_window_size
+    rank_by = args.rank_by
+    window_size = 0
+
+    bars = load_bars(args.data_file, not args.no_cache)
+    ppy = periods_per_year(args.data_file, not args.no_cache)
+    grid = list(itertools.product(*parameter_grid(args.min_window_size, max_window_size)))
+    top = TopK(args.top_k, rank_by, args.constraint)
+    stats = SweepStats(rank_by)
+    sink = CsvSink(args.results_csv, start_coin, start_cash) if args.results_csv else PrintSink(start_coin, start_cash)
+
+    host, port = parse_address(args.listen)
+    local = []
+    try:
+        with Coordinator((host, port), args.authkey, bars, grid, window_size, start_coin, start_cash, max_window_size, args.unit_size, args.timeout, ppy,
+                         args.risk_metrics or uses_risk_metrics(rank_by, args.constraint), args.idle_limit) as coordinator:
+            print(f"Serving {len(grid)} combinations on {host}:{port}")
+            if args.local_workers:
+                local = run_workers(('localhost' if host in ('', '0.0.0.0') else host, port), args.authkey, args.local_workers)
+            completed = 0
+            for index, results in coordinator.results():
+                for k, result in enumerate(results, index):
+                    sink.write(result)
+                    stats.add(result)
+                    if top.push(k, result):
+                        print('****found a better configuration:',result.window_size, result.stop_percentage, result.buy_window, result.sell_window, result.go_percentage, result.bad_percentage, start_coin, start_cash, result.final_cash)
+                completed += len(results)
+                if time.time() - cur_time >= 1.0:
+                    print(f"{round(time.time() - start_time, 3)}s: {completed}/{len(grid)} completed... ({coordinator.workers} workers connected, {coordinator.reassigned} units reassigned)")
+                    cur_time = time.time()
+            elapsed_time = round(time.time() - start_time, 3)
+    except TimeoutError as e:
+        sys.exit(f"Sweep stopped: {e}")
+    finally:
+        for process in local:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        sink.close()
+
+    best = top.best()
+    if args.top_k > 1:
+        print(f"Top {len(best)} configurations by {rank_by}:")
+        for rank, result in enumerate(best, 1):
+            print(f"{rank}.", dict(zip(RESULT_COLUMNS, result_row(result, start_coin, start_cash))))
+    if args.stats:
+        print(stats.summary())
+
+    if not best:
+        sys.exit("No configuration meets the constraints")
+    r = best[0]
+    print('****found the best configuration:',r.window_size, r.stop_percentage, r.buy_window, r.sell_window, r.go_percentage, r.bad_percentage, start_coin, start_cash, r.final_cash)
+    rolling = RollingIndex(bars.close, (r.buy_window, r.sell_window))
+    result, _ = simulate_history(bars, r.window_size, start_coin, start_cash, False, r.stop_percentage, max_window_size, r.buy_window, r.sell_window, r.go_percentage, r.bad_percentage, rolling, ppy)
+
+    print("****************************************")
+    print(f"\nBest Parameters: Window Size: {r.window_size}, Stop Percentage: {r.stop_percentage}, Buy Window: {r.buy_window}, Sell Window: {r.sell_window}, Go Percentage: {r.go_percentage}, Bad Percentage: {r.bad_percentage} ")
+    print(f"Final Balance (in cash): {round(result.final_cash,2)}")
+    print(f"Total Trades: {result.trades}")
+    print(f"buy_good: {result.buy_good}, buy_bad: {result.buy_bad}, sell_good: {result.sell_good}, sell_bad: {result.sell_bad}")
+    print(f"Win Average: {result.win_average}, Loss Average: {result.loss_average}")
+    print(f"Max Drawdown: {result.max_drawdown}, Sharpe: {result.sharpe}, Sortino: {result.sortino}, Exposure: {result.exposure}, Profit Factor: {result.profit_factor}, CAGR: {result.cagr}")
+    print(f"Elapsed Time: {elapsed_time} seconds")
+    return 0
+
+def main(argv):
+    args = parse_args(argv)
+    if args.command == 'coordinator':
+        return coordinate(args)
+    for process in run_workers(parse_address(args.address), args.authkey, args.processes, args.heartbeat):
+        process.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,110 @@
+import sys
+import argparse
+import json
+import os
+import time
+import numpy as np
+from datasets import TIME_COLUMN, columns_hash, load_bars, load_columns, periods_per_year
+from engine import simulate_metrics
+from streaming import StreamingStrategy
+
+# Options a saved state must have been started with to be resumed
+RESUME_SETTINGS = ('start_coin', 'start_cash', 'max_window_size', 'stop_percentage', 'buy_window', 'sell_window', 'go_percentage', 'bad_percentage')
+
+def seen_hash(columns, bars):
+    """
+    Returns:
+        hex SHA-256 of the first bars rows of a dataset's columns, so a state
+        still resumes after new candles are appended to its file
+    """
+    return columns_hash({name: values[:bars] for name, values in columns.items()})
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Replay a CSV file bar by bar through the streaming strategy, as live candles would arrive, and report per-bar latency."
+    )
+    parser.add_argument("data_file", help="Path to the input CSV file.")
+    parser.add_argument("start_coin", type=float, help="Starting coin balance.")
+    parser.add_argument("start_cash", type=float, help="Starting cash balance.")
+    parser.add_argument("max_window_size", type=int, help="First bar on which the strategy trades.")
+    parser.add_argument("stop_percentage", type=float, help="Trailing stop below the highest close since the last buy.")
+    parser.add_argument("buy_window", type=int, help="Buy when the close reaches the max of this many closes.")
+    parser.add_argument("sell_window", type=int, help="Sell when the close falls to the min of this many closes.")
+    parser.add_argument("go_percentage", type=float, help="Take profit this far above the last buy.")
+    parser.add_argument("bad_percentage", type=float, help="Buy back this far above the last sell.")
+    parser.add_argument("--state", default=None,
+                        help="JSON state file: resume from it if it exists (skipping the bars it has seen) and save the final state to it. "
+                             "It must have been saved with the same parameters, after the same first bars of data_file.")
+    parser.add_argument("--signals", action="store_true", default=False,
+                        help="Print every buy and sell signal.")
+    parser.add_argument("--verify", action="store_true", default=False,
+                        help="Check the streamed result against the batch engine over the whole file.")
+    parser.add_argument("--no-cache", action="store_true", default=False,
+                        help="Parse the CSV file instead of using the binary dataset cache.")
+    args = parser.parse_args(argv)
+
+    args.resume = None
+    if args.state and os.path.exists(args.state):
+        with open(args.state) as f:
+            state = json.load(f)
+        mismatched = [name for name in RESUME_SETTINGS if name in state and state[name] != getattr(args, name)]
+        if mismatched:
+            parser.error(f"{args.state} was saved with " + ', '.join(f"{name} {state[name]}" for name in mismatched)
+                         + "; pass the same values or use another --state file")
+        columns = load_columns(args.data_file, not args.no_cache)
+        if 'dataset' not in state:
+            parser.error(f"{args.state} does not record the bars it has seen; delete it to replay {args.data_file} from the start")
+        if state['index'] > len(columns[TIME_COLUMN]):
+            parser.error(f"{args.data_file} has {len(columns[TIME_COLUMN])} bars, {args.state} was saved after {state['index']}")
+        if seen_hash(columns, state['index']) != state['dataset']:
+            parser.error(f"the first {state['index']} bars of {args.data_file} are not the ones {args.state} was saved after")
+        args.resume = state
+    return args
+
+def main(argv):
+    args = parse_args(argv)
+    bars = load_bars(args.data_file, not args.no_cache)
+    ppy = periods_per_year(args.data_file, not args.no_cache)
+    params = (args.stop_percentage, args.max_window_size, args.buy_window, args.sell_window, args.go_percentage, args.bad_percentage)
+
+    if args.resume:
+        strategy = StreamingStrategy.restore(args.resume)
+        print(f"Resumed from {args.state} at bar {strategy.index}")
+    else:
+        strategy = StreamingStrategy(0, args.start_coin, args.start_cash, *params, periods_per_year=ppy)
+
+    # Candles arrive one at a time as Python floats
+    candles = list(zip(*(column.tolist() for column in bars)))[strategy.index:]
+    latencies = np.empty(len(candles), dtype=np.int64)
+    signal = None
+    for k, candle in enumerate(candles):
+        t0 = time.perf_counter_ns()
+        signal = strategy.update(*candle)
+        latencies[k] = time.perf_counter_ns() - t0
+        if args.signals and signal.decision:
+            print(f"bar {signal.index}: {'buy' if signal.decision > 0 else 'sell'} at {signal.close}, balance: {signal.balance}")
+
+    if signal is not None:
+        print(f"Last bar {signal.index}: close: {signal.close}, decision: {signal.decision}, stop: {signal.stop_price}, go: {signal.go_price}, bad: {signal.bad_price}")
+        micros = latencies / 1000.0
+        print(f"Per-bar latency over {len(candles)} bars: mean {micros.mean():.2f}us, p50 {np.percentile(micros, 50):.2f}us, "
+              f"p99 {np.percentile(micros, 99):.2f}us, max {micros.max():.2f}us")
+
+    result = strategy.result()
+    print(f"Final Balance (in cash): {round(result.final_cash,2)}")
+    print(f"Total Trades: {result.trades}")
+    print(f"buy_good: {result.buy_good}, buy_bad: {result.buy_bad}, sell_good: {result.sell_good}, sell_bad: {result.sell_bad}")
+    print(f"Win Average: {result.win_average}, Loss Average: {result.loss_average}")
+    print(f"Max Drawdown: {result.max_drawdown}, Sharpe: {result.sharpe}, Sortino: {result.sortino}, Exposure: {result.exposure}, "
+          f"Profit Factor: {result.profit_factor}, CAGR: {result.cagr}")
+
+    if args.verify:
+        batch = simulate_metrics(bars, 0, args.start_coin, args.start_cash, *params, periods_per_year=ppy)
+        print("Streamed result matches the batch engine" if batch == result else f"MISMATCH: batch engine gives {batch}")
+    if args.state:
+        with open(args.state, 'w') as f:
+            json.dump({**strategy.snapshot(), 'dataset': seen_hash(load_columns(args.data_file, not args.no_cache), strategy.index)}, f)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
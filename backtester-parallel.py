@@ -1,13 +1,58 @@
 import sys
-from pandas import read_csv, DataFrame
-import plotly.graph_objects as go
-import numpy as np
+import argparse
 from concurrent.futures import ProcessPoolExecutor
 import time
-import plotly.io as pio
 import gc
-
-def run_simulation(df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, cleanup):
+import importlib.util
+import itertools
+import os
+from engine import Bars, SimulationResult, bars_from_frame, simulate, simulate_history
+from datasets import content_hash, load_bars, load_frame, periods_per_year
+from rolling import RollingIndex
+from shared_data import SharedDataset, attach, run_shared_batch, run_shared_forking_stats, run_shared_simulation
+from result_store import ResultStore
+from cube import ResultCube
+from figures import simulation_figure
+from forking import format_stats
+from halving import evaluate, format_report, successive_halving
+from walk_forward import format_walk_forward, regime_segments, walk_forward
+from telemetry import SweepTracer
+from sweep import RANK_METRICS, parameter_grid, terminate_pool, RESULT_COLUMNS, CsvSink, PrintSink, SweepStats, TopK, chunked, parse_constraint, rank_value, result_row, stream_results, uses_risk_metrics
+
+ENGINES = ('array', 'pandas')
+
+def _load_plot_data():
+    """
+    Returns:
+        the plot-data.py module
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plot-data.py')
+    spec = importlib.util.spec_from_file_location('plot_data', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_simulation(df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, cleanup, engine='array', rolling=None):
+    """
+    Runs one parameter combination with the selected simulation engine.
+
+    df is either the loaded DataFrame or a Bars tuple already extracted from it;
+    the 'pandas' engine needs the DataFrame. rolling is the dataset's shared
+    RollingIndex, used by the 'array' engine. Both engines return the same
+    28-element result tuple.
+    """
+    if engine == 'pandas':
+        return run_simulation_pandas(df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, cleanup)
+    bars = df if isinstance(df, Bars) else bars_from_frame(df)
+    return simulate(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, cleanup, rolling)
+
+def run_simulation_record(df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, engine='array', rolling=None):
+    """
+    Sweep task: run_simulation without histories, returning a SimulationResult.
+    """
+    return SimulationResult.from_tuple(run_simulation(df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, True, engine, rolling))
+
+def run_simulation_pandas(df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, cleanup):
     if max_window_size < min(buy_window, sell_window):
         return 0, 0, 0, 0, 0, 0, [], [], [], [], [], []
 
@@ -182,155 +227,326 @@ def run_simulation(df, window_size, start_coin, start_cash, debug, stop_percenta
     
     return data_len, coin, cash, coin + cash / close_price, coin * close_price + cash, trades, balance_history, close_price_history, volume_history, buy_signals, sell_signals, buy_good, buy_bad, sell_good, sell_bad, aver_wins, aver_losses, window_size, stop_percentage, min_range_history, max_range_history, stop_price_history, go_price_history, bad_price_history, buy_window, sell_window, go_percentage, bad_percentage
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Sweep the trading strategy over a parameter grid and report the best configuration."
+    )
+    parser.add_argument("parallelism", type=int, help="Number of worker processes.")
+    parser.add_argument("data_file", help="Path to the input CSV file.")
+    parser.add_argument("start_coin", type=float, help="Starting coin balance.")
+    parser.add_argument("start_cash", type=float, help="Starting cash balance.")
+    parser.add_argument("min_window_size", type=int, help="Smallest buy/sell window in the grid.")
+    parser.add_argument("max_window_size", type=int, help="Upper bound (exclusive) of the buy/sell windows; also the first simulated bar.")
+    parser.add_argument("debug", help="True to print per-bar simulation output.")
+    parser.add_argument("figure", help="True to plot and save the best configuration.")
+    parser.add_argument("--engine", choices=ENGINES, default='array',
+                        help="Simulation engine: 'array' (NumPy arrays, default) or 'pandas' (reference implementation).")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Parameter combinations simulated in lockstep per task (default 1: one scalar simulation per task).")
+    parser.add_argument("--share-prefixes", action="store_true", default=False,
+                        help="With --batch-size, simulate the shared trade path of combinations once and fork only where their trades differ, and report the share of bar-steps that saved.")
+    parser.add_argument("--max-pending", type=int, default=0,
+                        help="Tasks in flight at once (default 4 per worker).")
+    parser.add_argument("--top-k", type=int, default=1,
+                        help="Number of best configurations to keep and report.")
+    parser.add_argument("--rank-by", choices=sorted(RANK_METRICS), default='final_cash',
+                        help="Metric used to rank configurations (max_drawdown and exposure rank lowest first, the others highest first).")
+    parser.add_argument("--constraint", action="append", default=[], metavar="METRIC<=VALUE",
+                        help="Only rank configurations meeting this bound, e.g. 'max_drawdown<=0.5' or 'trades>=10' (repeatable).")
+    parser.add_argument("--risk-metrics", action="store_true", default=False,
+                        help="Compute the risk metrics of every combination even if neither --rank-by nor --constraint uses them (they are NaN otherwise).")
+    parser.add_argument("--results-csv", default=None,
+                        help="Write one row per combination to this CSV file instead of printing it.")
+    parser.add_argument("--stats", action="store_true", default=False,
+                        help="Print aggregate statistics of the ranking metric over the sweep.")
+    parser.add_argument("--no-cache", action="store_true", default=False,
+                        help="Parse the CSV file instead of using the binary dataset cache.")
+    parser.add_argument("--search", choices=('grid', 'halving'), default='grid',
+                        help="'grid' simulates every combination on the full series; 'halving' prunes them in rungs over growing prefixes.")
+    parser.add_argument("--halving-rungs", type=int, default=3,
+                        help="Number of successive-halving rungs, the last one on the full series.")
+    parser.add_argument("--halving-eta", type=float, default=3.0,
+                        help="Each rung keeps the best 1/eta of the configurations and runs them on an eta times longer prefix.")
+    parser.add_argument("--verify-halving", action="store_true", default=False,
+                        help="Also run the exhaustive sweep and report whether its winner survived the pruning.")
+    parser.add_argument("--walk-forward", action="store_true", default=False,
+                        help="Optimize on each bull/bear regime of the series (as plot-data.py splits it) and report the winner's out-of-sample result on the next regime.")
+    parser.add_argument("--store", default=None,
+                        help="SQLite result store: combinations already stored for this dataset and settings are not simulated again.")
+    parser.add_argument("--store-top", type=int, default=0,
+                        help="Print the best N configurations stored for this dataset across past runs.")
+    parser.add_argument("--trace", default=None,
+                        help="Write per-task telemetry to this file: JSON lines, or Chrome trace format if it ends in .json.")
+    parser.add_argument("--profile-every", type=int, default=0,
+                        help="With --trace, run every Nth task under cProfile and report the merged profile.")
+    parser.add_argument("--profile-out", default=None,
+                        help="Save the merged profile to this pstats file instead of printing its top functions.")
+    parser.add_argument("--cube", default=None,
+                        help="Also write every metric into a memory-mapped results cube in this directory (see cube.py).")
+    parser.add_argument("--max-points", type=int, default=4000,
+                        help="Downsample each line of the figure to at most this many points, keeping highs and lows (default 4000; 0 plots every bar).")
+    parser.add_argument("--no-webgl", action="store_true", default=False,
+                        help="Draw the figure with SVG instead of WebGL traces.")
+    args = parser.parse_args(argv)
+    if args.trace and args.search != 'grid':
+        parser.error("--trace supports --search grid only")
+    if args.store and args.search != 'grid':
+        parser.error("--store supports --search grid only")
+    if args.cube and args.search != 'grid':
+        parser.error("--cube supports --search grid only")
+    if args.walk_forward and (args.search != 'grid' or args.store or args.cube or args.trace or args.results_csv):
+        parser.error("--walk-forward does not support --search halving, --store, --cube, --trace or --results-csv")
+    if args.walk_forward and (args.engine == 'pandas' or args.debug.lower() == 'true'):
+        parser.error("--walk-forward requires the 'array' engine and debug=False")
+    try:
+        args.constraint = [parse_constraint(text) for text in args.constraint]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.engine == 'pandas' and (args.risk_metrics or uses_risk_metrics(args.rank_by, args.constraint)):
+        parser.error("the risk metrics require the 'array' engine")
+    if args.batch_size > 1 and (args.engine == 'pandas' or args.debug.lower() == 'true'):
+        parser.error("--batch-size requires the 'array' engine and debug=False")
+    if args.share_prefixes and args.batch_size <= 1:
+        parser.error("--share-prefixes requires --batch-size greater than 1")
+    if args.search == 'halving' and (args.engine == 'pandas' or args.debug.lower() == 'true'):
+        parser.error("--search halving requires the 'array' engine and debug=False")
+    if args.halving_rungs < 1:
+        parser.error("--halving-rungs must be at least 1")
+    if args.halving_eta <= 1:
+        parser.error("--halving-eta must be greater than 1")
+    return args
+
 def main(argv):
-    if len(argv) != 8:
-        print('Usage: python trader-simple-parallel.py <parallelism> <data_file> <start_coin> <start_cash> <min_window_size> <max_window_size> <debug> <figure>')
-        sys.exit(2)
-
-    workers = int(argv[0])
-    data_file = argv[1]
-    start_coin = float(argv[2])
-    start_cash = float(argv[3])
-    min_window_size = int(argv[4])
-    max_window_size = int(argv[5])
-    debug = argv[6].lower() == 'true'
-    figure = argv[7].lower() == 'true'
+    args = parse_args(argv)
+
+    workers = args.parallelism
+    data_file = args.data_file
+    start_coin = args.start_coin
+    start_cash = args.start_cash
+    min_window_size = args.min_window_size
+    max_window_size = args.max_window_size
+    debug = args.debug.lower() == 'true'
+    figure = args.figure.lower() == 'true'
+    engine = args.engine
+    batch_size = args.batch_size
+    share_prefixes = args.share_prefixes
+    max_pending = args.max_pending
+    top_k = args.top_k
+    rank_by = args.rank_by
+    constraints = args.constraint
+    # The engines skip the risk metrics unless the ranking or the output needs them
+    risk = args.risk_metrics or uses_risk_metrics(rank_by, constraints)
+    results_csv = args.results_csv
+    show_stats = args.stats
+    use_cache = not args.no_cache
+    search = args.search
+    halving_rungs = args.halving_rungs
+    halving_eta = args.halving_eta
+    verify_halving = args.verify_halving
+    walk = args.walk_forward
+    store_path = args.store
+    cube_path = args.cube
+    store_top = args.store_top
+    trace_path = args.trace
+    profile_every = args.profile_every
+    profile_out = args.profile_out
+    max_points = args.max_points or None
+    webgl = not args.no_webgl
 
     # Start time
     start_time = time.time()
     cur_time = time.time()
 
     # Load the data
-    df = read_csv(data_file, skiprows=0, sep=",")
+    # (memory-mapped from the binary dataset cache after the first run)
+    data = load_frame(data_file, use_cache) if engine == 'pandas' else load_bars(data_file, use_cache)
+    # Bars per year, to annualize the risk metrics
+    ppy = periods_per_year(data_file, use_cache)
 
     window_size = 0
-    #stop_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
-    #stop_percentages = [0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
-    #buy_windows = [7, 14, 21, 28, 35, 42, 49, 56, 63, 70, 77, 84, 91, 98]
-    #sell_windows = [7, 14, 21, 28, 35, 42, 49, 56, 63, 70, 77, 84, 91, 98]
-    
-    sell_windows = []
-    sell_window_min = min_window_size
-    sell_window_max = max_window_size
-    sell_window_increment = 1    
-    for i in range(sell_window_min,sell_window_max,sell_window_increment):
-    	sell_windows.append(i)
-    
-    #sell_windows = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
-    stop_percentages = [0.1,0.2,0.3]
-    
-    buy_windows = []
-    buy_window_min = min_window_size
-    buy_window_max = max_window_size
-    buy_window_increment = 1    
-    for i in range(buy_window_min,buy_window_max,buy_window_increment):
-    	buy_windows.append(i)
-    
-    #buy_windows = [1, 7, 14]
-    #sell_windows = [14]
-    #go_percentages = [2.0]
-    #bad_percentages = [2.0]
-    #go_percentages = [1.7, 1.8, 1.9, 2.0, 2.1, 2.2, 2.3]
-    #bad_percentages = [1.7, 1.8, 1.9, 2.0, 2.1, 2.2, 2.3]
-    go_percentages = [0.1, 1.0, 2.0, 3.0, 4.0, 5.0]
-    bad_percentages = [0.1, 1.0, 2.0, 3.0, 4.0, 5.0]
-    #go_percentages = [0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
-    #bad_percentages = [0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
-    #go_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
-    #bad_percentages = [0.01,0.02,0.04,0.06,0.08,0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
-    
-    #stop_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1]
-    #buy_windows = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
-    #sell_windows = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
-    #go_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1]
-    #bad_percentages = [0.01,0.02,0.04,0.06,0.08,0.1]
-
-    best_params = None
-    best_profit = float('-inf')
-    
-    with ProcessPoolExecutor(max_workers=workers) as executor:
-        futures = [
-            executor.submit(run_simulation, df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, True)
-            #for window_size in window_sizes
-            for stop_percentage in stop_percentages
-            for buy_window in buy_windows
-            for sell_window in sell_windows
-            for go_percentage in go_percentages
-            for bad_percentage in bad_percentages
-        ]
-        
-        # Collect results
-        results = []
-        for i, future in enumerate(futures):
-            result = future.result()  # Waits for the future to complete
-            results.append(result)
-            cur_elapsed_time = time.time() - cur_time
-            elapsed_time = round(time.time() - start_time, 3)
-            if cur_elapsed_time >= 1.0:
-                print(f"{elapsed_time}s: {i+1}/{len(futures)} completed...")
-                cur_time = time.time()
-
-    for result in results:
-    	_, end_coin, end_cash, final_balance, final_cash, trades, _, _, _, _, _, buy_good, buy_bad, sell_good, sell_bad, win_average, loss_average, window_size, stop_percentage, _, _, _, _, _, buy_window, sell_window, go_percentage, bad_percentage = result
-    
-    	print(f"Window Size: {window_size}, Stop Percentage: {stop_percentage}, Buy Window: {buy_window}, Sell Window: {sell_window}, Go Percentage: {go_percentage}, Bad Percentage: {bad_percentage}, "
-          f"Start Coins: {start_coin}, Start Cash: {start_cash}, "
-          f"End Coins: {end_coin}, End Cash: {end_cash}, Final Balance: {final_balance}, Balance (in cash): {final_cash}, "
-          f"Trades: {trades}, buy_good: {buy_good}, buy_bad: {buy_bad}, sell_good: {sell_good}, sell_bad: {sell_bad}, win_average: {win_average}, loss_average: {loss_average}")
-
-    	if final_cash > best_profit:
-    		print('****found a better configuration:',window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage, start_coin, start_cash, final_cash)
-    		best_profit = final_cash
-    		best_params = (window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage, start_coin, start_cash, final_cash)
+    stop_percentages, buy_windows, sell_windows, go_percentages, bad_percentages = parameter_grid(min_window_size, max_window_size)
+
+    # Rolling min/max of Close for every window in the grid, shared by all tasks
+    rolling = None if engine == 'pandas' else RollingIndex(data.close, set(buy_windows) | set(sell_windows))
+
+    grid = itertools.product(stop_percentages, buy_windows, sell_windows, go_percentages, bad_percentages)
+    grid_size = len(stop_percentages) * len(buy_windows) * len(sell_windows) * len(go_percentages) * len(bad_percentages)
+
+    top = TopK(top_k, rank_by, constraints)
+    stats = SweepStats(rank_by)
+    sink = CsvSink(results_csv, start_coin, start_cash) if results_csv else PrintSink(start_coin, start_cash)
+    tracer = SweepTracer(trace_path, workers, profile_every) if trace_path else None
+    cube = ResultCube.create(cube_path, [data_file], (stop_percentages, buy_windows, sell_windows, go_percentages, bad_percentages),
+                             {'start_coin': start_coin, 'start_cash': start_cash, 'max_window_size': max_window_size, 'window_size': window_size}) if cube_path else None
+
+    # Combinations already in the result store are reused instead of simulated
+    store = ResultStore(store_path) if store_path else None
+    run_key = ResultStore.run_key(content_hash(data_file, use_cache), start_coin, start_cash, max_window_size, window_size) if store else None
+
+    def grid_tasks(chunks):
+        """
+        Yields ((grid indexes, cached), fn, args) for stream_results; stored
+        results come back with fn None.
+        """
+        for index, chunk in chunks:
+            indexes = range(index, index + len(chunk))
+            if store is not None:
+                found = store.lookup(run_key, chunk, risk)
+                if found:
+                    yield ([k for k, params in zip(indexes, chunk) if params in found], True), None, [found[params] for params in chunk if params in found]
+                    indexes = [k for k, params in zip(indexes, chunk) if params not in found]
+                    chunk = [params for params in chunk if params not in found]
+                    if not chunk:
+                        continue
+            if batch_size > 1:
+                # Each task advances a whole batch of combinations in lockstep, or along their shared trade paths
+                batch_fn = run_shared_forking_stats if share_prefixes else run_shared_batch
+                yield (indexes, False), batch_fn, (data_file, window_size, start_coin, start_cash, max_window_size, chunk, None, risk)
+            elif shared is None:
+                stop_percentage, buy_window, sell_window, go_percentage, bad_percentage = chunk[0]
+                yield (indexes, False), run_simulation_record, (data, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, engine)
+            else:
+                stop_percentage, buy_window, sell_window, go_percentage, bad_percentage = chunk[0]
+                yield (indexes, False), run_shared_simulation, (data_file, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, risk)
+
+    # Publish the arrays once; workers attach in the pool initializer and tasks carry only parameters
+    shared = None if engine == 'pandas' else SharedDataset(data_file, data, rolling, ppy)
+    try:
+        if shared is None:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=(shared.spec,))
+        with executor:
+            try:
+                if walk:
+                    # Every (regime, parameter chunk) task is queued at once
+                    segments = regime_segments(_load_plot_data().compute_bull_bear_boundaries(data_file, use_cache), max_window_size, len(data))
+                    walk_report = walk_forward(executor, data_file, list(grid), segments, window_size, start_coin, start_cash, rank_by, constraints,
+                                               max(batch_size, 256), max_pending or 4 * workers, share_prefixes, risk)
+                    tasks = ()
+                elif search == 'halving':
+                    grid = list(grid)
+                    scored, report = successive_halving(executor, data_file, grid, len(data), window_size, start_coin, start_cash, max_window_size,
+                                                        rank_by, halving_rungs, halving_eta, max(batch_size, 256), max_pending or 4 * workers, risk)
+                    for index, result in scored:
+                        sink.write(result)
+                        stats.add(result)
+                        if top.push(index, result):
+                            print('****found a better configuration:',result.window_size, result.stop_percentage, result.buy_window, result.sell_window, result.go_percentage, result.bad_percentage, start_coin, start_cash, result.final_cash)
+                    print(format_report(report))
+                    if verify_halving:
+                        # Exhaustive sweep for comparison: did its winner survive the pruning?
+                        exhaustive = evaluate(executor, data_file, grid, None, window_size, start_coin, start_cash, max_window_size, max(batch_size, 256), max_pending or 4 * workers, risk)
+                        winner = max(range(len(grid)), key=lambda k: (rank_value(exhaustive[k], rank_by), -k))
+                        survived = any(index == winner for index, _ in scored)
+                        print(f"Exhaustive winner {grid[winner]} ({rank_by}: {getattr(exhaustive[winner], rank_by)}) {'survived' if survived else 'was pruned'}")
+                    tasks = ()  # survivors were reduced above
+                else:
+                    tasks = grid_tasks(chunked(grid, max(batch_size, 1)))
+
+                # Reduce results as they complete
+                completed = 0
+                # Bar-steps of the --share-prefixes tasks, added up
+                sharing = {'bar_steps': 0, 'independent_bar_steps': 0, 'groups': 0}
+                if tracer is not None:
+                    results_stream = tracer.unwrap(stream_results(executor, tracer.wrap(tasks), max_pending or 4 * workers))
+                else:
+                    results_stream = stream_results(executor, tasks, max_pending or 4 * workers)
+                for (indexes, cached), result in results_stream:
+                    if share_prefixes and not cached:
+                        result, task_stats = result
+                        for key in sharing:
+                            sharing[key] += task_stats[key]
+                    results = result if isinstance(result, list) else [result]
+                    if store is not None and not cached:
+                        store.save(run_key, results, data_file)
+                    if cube is not None:
+                        cube.write(data_file, indexes, results)
+                    for index, result in zip(indexes, results):
+                        sink.write(result)
+                        stats.add(result)
+                        if top.push(index, result):
+                            print('****found a better configuration:',result.window_size, result.stop_percentage, result.buy_window, result.sell_window, result.go_percentage, result.bad_percentage, start_coin, start_cash, result.final_cash)
+                        completed += 1
+                    cur_elapsed_time = time.time() - cur_time
+                    elapsed_time = round(time.time() - start_time, 3)
+                    if cur_elapsed_time >= 1.0:
+                        if tracer is not None:
+                            print(f"{elapsed_time}s: {completed}/{grid_size} completed... {tracer.summary(completed, grid_size)}")
+                        else:
+                            print(f"{elapsed_time}s: {completed}/{grid_size} completed...")
+                        cur_time = time.time()
+                elapsed_time = round(time.time() - start_time, 3)
+            except KeyboardInterrupt:
+                if shared is not None:
+                    shared.close()
+                terminate_pool(executor)
+                raise
+    finally:
+        if shared is not None:
+            shared.close()
+        if store is not None:
+            store.close()
+        if cube is not None:
+            cube.close()
+        if tracer is not None:
+            tracer.close(profile_out)
+        sink.close()
+
+    if walk:
+        print(format_walk_forward(walk_report, segments, rank_by))
+        print(f"Elapsed Time: {elapsed_time} seconds")
+        return
+
+    best = top.best()
+    if top_k > 1:
+        print(f"Top {len(best)} configurations by {rank_by}:")
+        for rank, result in enumerate(best, 1):
+            print(f"{rank}.", dict(zip(RESULT_COLUMNS, result_row(result, start_coin, start_cash))))
+    if share_prefixes and search == 'grid' and not walk:
+        print(format_stats(sharing))
+    if show_stats:
+        print(stats.summary())
+    if store_path and store_top:
+        with ResultStore(store_path) as past:
+            print(f"Best stored configurations by {rank_by} on this dataset:")
+            for rank, (stored_file, settings, result) in enumerate(past.best(rank_by, store_top, run_key[0]), 1):
+                print(f"{rank}.", stored_file, settings, dict(zip(RESULT_COLUMNS, result_row(result, settings['start_coin'], settings['start_cash']))))
+
+    if not best:
+        sys.exit("No configuration meets the constraints")
+    best_result = best[0]
+    best_params = (best_result.window_size, best_result.stop_percentage, best_result.buy_window, best_result.sell_window, best_result.go_percentage, best_result.bad_percentage, start_coin, start_cash, best_result.final_cash)
 
     #if best_params:
     #    print(f"Best parameters: Window Size: {best_params[0]}, Stop Percentage: {best_params[1]}, Buy Window: {best_params[2]}, Sell Window: {best_params[3]}, Final Balance: {best_params[6]}")
     window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage, start_coin, start_cash, final_cash = best_params
     print('****found the best configuration:',window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage, start_coin, start_cash, final_cash)
     #window_size, stop_percentage, buy_window, sell_window, start_coin, start_cash, final_cash = best_params
-    result = run_simulation(df, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, False)
-    _, end_coin, end_cash, final_balance, final_cash, trades, balance_history, close_price_history, volume_history, buy_signals, sell_signals, buy_good, buy_bad, sell_good, sell_bad, win_average, loss_average, window_size, stop_percentage, min_range_history, max_range_history, stop_price_history, go_price_history, bad_price_history, buy_window, sell_window , go_percentage, bad_percentage = result
+
+    # Replay the best configuration with full per-bar histories
+    bars = data if isinstance(data, Bars) else bars_from_frame(data)
+    result, history = simulate_history(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling, ppy)
+    final_cash = result.final_cash
+    trades = result.trades
 
     print("****************************************")
     print(f"\nBest Parameters: Window Size: {window_size}, Stop Percentage: {stop_percentage}, Buy Window: {buy_window}, Sell Window: {sell_window}, Go Percentage: {go_percentage}, Bad Percentage: {bad_percentage} ")
     print(f"Final Balance (in cash): {round(final_cash,2)}")
     print(f"Total Trades: {trades}")
-    print(f"buy_good: {buy_good}, buy_bad: {buy_bad}, sell_good: {sell_good}, sell_bad: {sell_bad}")
-    print(f"Win Average: {win_average}, Loss Average: {loss_average}")
+    print(f"buy_good: {result.buy_good}, buy_bad: {result.buy_bad}, sell_good: {result.sell_good}, sell_bad: {result.sell_bad}")
+    print(f"Win Average: {result.win_average}, Loss Average: {result.loss_average}")
+    print(f"Max Drawdown: {result.max_drawdown}, Sharpe: {result.sharpe}, Sortino: {result.sortino}, Exposure: {result.exposure}, Profit Factor: {result.profit_factor}, CAGR: {result.cagr}")
     print(f"Elapsed Time: {elapsed_time} seconds")
 
 
 
     if figure:
         
-        balance_x, balance_y = zip(*balance_history)
-        price_x, price_y = zip(*close_price_history)
-        #volume_x, volume_y = zip(*volume_history)
-        buy_x, buy_y = zip(*buy_signals)
-        sell_x, sell_y = zip(*sell_signals)
-        min_range_x, min_range_y = zip(*min_range_history)
-        max_range_x, max_range_y = zip(*max_range_history)
-        stop_price_x, stop_price_y = zip(*stop_price_history)
-        go_price_x, go_price_y = zip(*go_price_history)
-        bad_price_x, bad_price_y = zip(*bad_price_history)
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=balance_x, y=balance_y, mode='lines', name='Balance'))
-        fig.add_trace(go.Scatter(x=price_x, y=price_y, mode='lines', name='Close Price'))
-        #fig.add_trace(go.Bar(x=volume_x, y=volume_y, name='Volume', marker=dict(color='rgba(0, 255, 0, 0.5)'), opacity=0.5))
-        fig.add_trace(go.Scatter(x=buy_x, y=buy_y, mode='markers', marker=dict(color='green', size=9), name='Buy Signal'))
-        fig.add_trace(go.Scatter(x=sell_x, y=sell_y, mode='markers', marker=dict(color='red', size=9), name='Sell Signal'))
-        fig.add_trace(go.Scatter(x=min_range_x, y=min_range_y, mode='lines', line=dict(color='gray'), name='Min Range'))
-        fig.add_trace(go.Scatter(x=max_range_x, y=max_range_y, mode='lines', line=dict(color='black'), name='Max Range'))
-        fig.add_trace(go.Scatter(x=stop_price_x, y=stop_price_y, mode='lines', line=dict(color='purple'), name='Stop Price'))
-        fig.add_trace(go.Scatter(x=go_price_x, y=go_price_y, mode='lines', line=dict(color='orange'), name='Go Price'))
-        fig.add_trace(go.Scatter(x=bad_price_x, y=bad_price_y, mode='lines', line=dict(color='pink'), name='Bad Price'))
-    
-        
         graphTitle = 'Simulation Results: buy_window='+str(buy_window)+' sell_window='+str(sell_window)+' stop='+str(stop_percentage)+' go='+str(go_percentage)+ ' bad='+str(bad_percentage)+' trades='+str(trades)+' balance=$'+str(round(final_cash,2))
         output_filename = 'results-trader-simple-parallel-v3-Close-bw'+str(buy_window)+'-sw'+str(sell_window)+'-s'+str(stop_percentage)+'-g'+str(go_percentage)+'-b'+str(bad_percentage)+'.html'
         
-        fig.update_layout(title=graphTitle, xaxis_title='Time', yaxis_title='$')
+        fig = simulation_figure(history, graphTitle, max_points, webgl)
         fig.show()
         fig.write_html(output_filename)
 
@@ -0,0 +1,286 @@
+"""
+Throughput benchmarks for the simulation engines and the parameter sweep.
+
+Every benchmark returns a flat {name: measurement} dict, where a
+measurement is {'value': float, 'unit': str, 'higher_is_better': bool}, so
+the results of a run can be saved as a JSON baseline and compared with a
+later run. Timings take the best of several repeats to keep scheduler noise
+out of the comparison. Usable as a library or through its command line:
+
+    python3 benchmark.py --save baseline.json
+    python3 benchmark.py --baseline baseline.json --threshold 0.1
+"""
+
+import argparse
+import glob
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from datasets import load_bars, read_columns
+from engine import simulate_batch, simulate_history, simulate_metrics
+from figures import simulation_figure
+from forking import simulate_forking
+from rolling import RollingIndex
+from shared_data import SharedDataset, attach, run_shared_batch
+from sweep import chunked, parameter_grid, stream_results
+
+# The full-range series, from the shortest (3M) to the longest (1D)
+DEFAULT_DATASETS = tuple(f'data/btc_2010-2024_{timeframe}.csv' for timeframe in ('3M', '1M', '1W', '5D', '1D'))
+
+# Windows of the benchmark grid: 3 * 6 * 6 * 6 * 6 = 3888 combinations
+MIN_WINDOW_SIZE = 1
+MAX_WINDOW_SIZE = 7
+START_COIN = 0
+START_CASH = 1000
+
+
+def _measurement(value, unit, higher_is_better):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def best_time(fn, repeat=3, min_time=0.2):
+    """
+    Calls fn() repeatedly, at least repeat times and for at least min_time seconds.
+
+    Returns:
+        the fastest call in seconds
+    """
+    best = float('inf')
+    calls = 0
+    start = time.perf_counter()
+    while calls < repeat or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        calls += 1
+    return best
+
+
+def benchmark_grid(limit=None):
+    """
+    Returns:
+        list of (stop, buy_window, sell_window, go, bad) tuples of the benchmark grid
+    """
+    grid = list(itertools.product(*parameter_grid(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE)))
+    return grid[:limit] if limit else grid
+
+
+def _load_reference():
+    """
+    Returns:
+        the backtester-parallel.py module, for its pandas reference engine
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backtester-parallel.py')
+    spec = importlib.util.spec_from_file_location('backtester_parallel', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_engines(path, engines=('scalar', 'batch'), configs=64, repeat=3):
+    """
+    Simulations per second of each engine on one dataset, over the first
+    configs combinations of the benchmark grid. 'scalar' is simulate_metrics(),
+    'batch' is simulate_batch(), 'forking' is simulate_forking() and 'pandas'
+    is the reference run_simulation().
+
+    Returns:
+        {name: measurement}
+    """
+    name = os.path.basename(path)
+    bars = load_bars(path)
+    grid = benchmark_grid(configs)
+    rolling = RollingIndex(bars.close, range(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE))
+    runners = {
+        'scalar': lambda: [simulate_metrics(bars, 0, START_COIN, START_CASH, stop, MAX_WINDOW_SIZE, bw, sw, go, bad, rolling) for stop, bw, sw, go, bad in grid],
+        'batch': lambda: simulate_batch(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, grid, rolling),
+        'forking': lambda: simulate_forking(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, grid, rolling),
+    }
+    if 'pandas' in engines:
+        reference = _load_reference()
+        df = reference.load_frame(path)
+        pandas_grid = grid[:max(1, configs // 16)]
+        runners['pandas'] = lambda: [reference.run_simulation(df, 0, START_COIN, START_CASH, False, stop, MAX_WINDOW_SIZE, bw, sw, go, bad, True, 'pandas')
+                                     for stop, bw, sw, go, bad in pandas_grid]
+    results = {}
+    for engine in engines:
+        count = len(pandas_grid) if engine == 'pandas' else len(grid)
+        seconds = best_time(runners[engine], repeat)
+        results[f'engine/{engine}/{name}'] = _measurement(count / seconds, 'sim/s', True)
+        results[f'engine/{engine}/{name}/bar-steps'] = _measurement(count * (len(bars) - MAX_WINDOW_SIZE) / seconds, 'bar/s', True)
+        if engine == 'forking':
+            # Share of the independent bar-steps the shared trade paths actually simulated
+            stats = {}
+            simulate_forking(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, grid, rolling, stats)
+            results[f'engine/forking/{name}/simulated-steps'] = _measurement(stats['bar_steps'] / max(stats['independent_bar_steps'], 1), 'ratio', False)
+    return results
+
+
+def bench_load(path, repeat=3):
+    """
+    Seconds to parse the CSV file and to load it from the dataset cache.
+
+    Returns:
+        {name: measurement}
+    """
+    name = os.path.basename(path)
+    load_bars(path)  # make sure the cache entry exists
+    return {
+        f'load/csv/{name}': _measurement(best_time(lambda: read_columns(path), repeat), 's', False),
+        f'load/cache/{name}': _measurement(best_time(lambda: load_bars(path), repeat), 's', False),
+    }
+
+
+def bench_figure(path, repeat=3, max_points=4000):
+    """
+    Seconds to replay one configuration with full history and write its
+    figure as HTML, at full resolution and downsampled to max_points with
+    WebGL traces.
+
+    Returns:
+        {name: measurement}
+    """
+    name = os.path.basename(path)
+    bars = load_bars(path)
+
+    def render(max_points=None, webgl=False):
+        _, history = simulate_history(bars, 0, START_COIN, START_CASH, False, 0.1, MAX_WINDOW_SIZE, 4, 4, 5.0, 0.1)
+        with tempfile.TemporaryDirectory() as tmp:
+            simulation_figure(history, name, max_points, webgl).write_html(os.path.join(tmp, 'figure.html'))
+
+    return {
+        f'figure/{name}': _measurement(best_time(render, repeat), 's', False),
+        f'figure/downsampled/{name}': _measurement(best_time(lambda: render(max_points, True), repeat), 's', False),
+    }
+
+
+def bench_sweep(path, workers=(1, 2, 4), batch_size=256, repeat=1):
+    """
+    Simulations per second of the full benchmark grid through a process
+    pool, for each worker count. Pool startup is not timed.
+
+    Returns:
+        {name: measurement}
+    """
+    name = os.path.basename(path)
+    bars = load_bars(path)
+    grid = benchmark_grid()
+    results = {}
+    with SharedDataset(path, bars, RollingIndex(bars.close, range(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE))) as shared:
+        for count in workers:
+            with ProcessPoolExecutor(max_workers=count, initializer=attach, initargs=(shared.spec,)) as executor:
+                # Warm the workers up so their startup is not measured
+                list(executor.map(run_shared_batch, [path] * count, [0] * count, [START_COIN] * count, [START_CASH] * count, [MAX_WINDOW_SIZE] * count, [grid[:1]] * count))
+
+                def sweep():
+                    tasks = ((index, run_shared_batch, (path, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, chunk)) for index, chunk in chunked(grid, batch_size))
+                    for _ in stream_results(executor, tasks, 4 * count):
+                        pass
+
+                results[f'sweep/workers={count}/{name}'] = _measurement(len(grid) / best_time(sweep, repeat, 0.0), 'sim/s', True)
+    return results
+
+
+def run_benchmarks(datasets=DEFAULT_DATASETS, engines=('scalar', 'batch'), workers=(1, 2, 4), sweep_dataset=None, repeat=3):
+    """
+    Runs every benchmark. The sweep scaling runs on sweep_dataset, the
+    longest of datasets by default.
+
+    Returns:
+        {name: measurement}
+    """
+    results = {}
+    for path in datasets:
+        results.update(bench_engines(path, engines, repeat=repeat))
+        results.update(bench_load(path, repeat))
+    longest = sweep_dataset or max(datasets, key=lambda path: len(load_bars(path)))
+    results.update(bench_figure(longest, repeat))
+    if workers:
+        results.update(bench_sweep(longest, workers))
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares results with a baseline; a measurement regresses when it is
+    more than threshold (a fraction) worse than its baseline value.
+
+    Returns:
+        list of (name, baseline value, value, relative change) of the regressions
+    """
+    regressions = []
+    for name, measurement in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['value']
+        value = measurement['value']
+        if before <= 0:
+            continue
+        change = (value - before) / before
+        worse = -change if measurement['higher_is_better'] else change
+        if worse > threshold:
+            regressions.append((name, before, value, change))
+    return regressions
+
+
+def save_baseline(path, results):
+    document = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                'machine': platform.machine(), 'cpus': os.cpu_count(), 'results': results}
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engines, dataset loading, figure generation and the sweep.")
+    parser.add_argument("--datasets", nargs='+', default=list(DEFAULT_DATASETS),
+                        help="CSV files or glob patterns to benchmark (default: the 2010-2024 series, 3M to 1D).")
+    parser.add_argument("--engines", nargs='+', choices=('scalar', 'batch', 'forking', 'pandas'), default=['scalar', 'batch'],
+                        help="Engines to measure; 'pandas' is the slow reference implementation.")
+    parser.add_argument("--workers", nargs='*', type=int, default=[1, 2, 4],
+                        help="Worker counts for the sweep scaling benchmark (none to skip it).")
+    parser.add_argument("--repeat", type=int, default=3, help="Minimum repeats per timing; the fastest is kept.")
+    parser.add_argument("--save", default=None, help="Write the results to this JSON baseline file.")
+    parser.add_argument("--baseline", default=None, help="Compare the results with this JSON baseline file.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown against the baseline that counts as a regression (default 0.1 = 10%%).")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    datasets = [path for pattern in args.datasets for path in (sorted(glob.glob(pattern)) or [pattern])]
+    results = run_benchmarks(datasets, args.engines, args.workers, repeat=args.repeat)
+
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    for name, measurement in results.items():
+        line = f"{name:<48} {measurement['value']:>14.6g} {measurement['unit']}"
+        if name in baseline and baseline[name]['value'] > 0:
+            line += f"  ({(measurement['value'] - baseline[name]['value']) / baseline[name]['value']:+.1%} vs baseline)"
+        print(line)
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"Saved baseline to {args.save}")
+    if args.baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, value, change in regressions:
+            print(f"REGRESSION {name}: {before:.6g} -> {value:.6g} ({change:+.1%})")
+        if regressions:
+            return 1
+        print(f"No regression beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,390 @@
+"""
+N-dimensional, memory-mapped store of sweep results.
+
+A cube is a directory with one .npy file per metric, each a float64 array
+indexed by (dataset, stop_percentage, buy_window, sell_window,
+go_percentage, bad_percentage), and a meta.json file with the values of
+every axis and the run settings. The dataset axis comes first so that the
+grid of one dataset, in the order itertools.product() walks it, is one
+contiguous block that a sweep fills as results arrive. Cells that were not
+simulated are NaN.
+
+Arrays are memory-mapped, so queries read only the cells they select:
+values() slices, marginal() reduces over the axes it does not keep block by
+block, top() finds the best cells and best_region() the cell whose
+neighbourhood is best on average, which is a more robust choice than the
+single best cell. Usable as a library or through its command line:
+
+    python3 cube.py results.cube --keep buy_window sell_window --fix stop_percentage=0.1
+    python3 cube.py results.cube --top 10 --region 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+
+from sweep import LOWER_IS_BETTER
+
+AXES = ('dataset', 'stop_percentage', 'buy_window', 'sell_window', 'go_percentage', 'bad_percentage')
+METRICS = ('final_cash', 'final_balance', 'end_coin', 'end_cash', 'trades', 'buy_good', 'buy_bad', 'sell_good', 'sell_bad',
+           'win_average', 'loss_average', 'max_drawdown', 'sharpe', 'sortino', 'exposure', 'profit_factor', 'cagr')
+REDUCTIONS = ('max', 'min', 'mean')
+CUBE_VERSION = 1
+
+# Bytes of one metric read per block by marginal() and top()
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+class ResultCube:
+    """
+    Metrics of a sweep by parameter axes.
+
+    Selections are keyword arguments naming an axis: a single value fixes
+    the axis (and drops it from the result), a list keeps only those values.
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != CUBE_VERSION:
+            raise ValueError(f"{path}: unsupported cube version {meta.get('version')}")
+        self.axes = {name: meta['axes'][name] for name in AXES}
+        self.metrics = tuple(meta['metrics'])
+        self.settings = meta['settings']
+        self.shape = tuple(len(values) for values in self.axes.values())
+        self._arrays = {metric: np.load(os.path.join(path, f'{metric}.npy'), mmap_mode=mode) for metric in self.metrics}
+
+    @classmethod
+    def create(cls, path, datasets, parameter_axes, settings=None, metrics=METRICS):
+        """
+        Creates an empty cube for a sweep of parameter_axes (the five
+        parameter_grid() lists) over datasets, replacing any cube at path.
+
+        Returns:
+            ResultCube open for writing
+        """
+        os.makedirs(path, exist_ok=True)
+        axes = dict(zip(AXES, [list(datasets)] + [list(values) for values in parameter_axes], strict=True))
+        shape = tuple(len(values) for values in axes.values())
+        for metric in metrics:
+            array = np.lib.format.open_memmap(os.path.join(path, f'{metric}.npy'), mode='w+', dtype=np.float64, shape=shape)
+            for block in array:
+                block[...] = np.nan
+            array.flush()
+            del array
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'version': CUBE_VERSION, 'axes': axes, 'metrics': list(metrics), 'settings': settings or {}}, f, indent=2)
+        return cls(path, 'r+')
+
+    def write(self, dataset, indexes, results):
+        """
+        Stores SimulationResult records of one dataset at their grid indexes
+        (positions in itertools.product() order of the parameter axes).
+        """
+        position = self._position('dataset', dataset)
+        indexes = np.asarray(indexes, dtype=np.intp)
+        for metric in self.metrics:
+            self._arrays[metric][position].reshape(-1)[indexes] = [getattr(result, metric) for result in results]
+
+    def flush(self):
+        for array in self._arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def close(self):
+        self.flush()
+        self._arrays = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _position(self, axis, value):
+        values = self.axes[axis]
+        if axis == 'dataset':
+            if value in values:
+                return values.index(value)
+        else:
+            matches = np.flatnonzero(np.isclose(values, float(value), rtol=1e-9, atol=1e-12))
+            if len(matches):
+                return int(matches[0])
+        raise KeyError(f"{axis} has no value {value!r}; values: {values}")
+
+    def _selection(self, selection):
+        """
+        Returns:
+            (basic index tuple, remaining axis names, index array of each remaining axis)
+        """
+        unknown = set(selection) - set(AXES)
+        if unknown:
+            raise KeyError(f"unknown axes {', '.join(sorted(unknown))}; axes: {', '.join(AXES)}")
+        basic = []
+        names = []
+        positions = []
+        for axis, length in zip(AXES, self.shape):
+            value = selection.get(axis)
+            if value is None:
+                basic.append(slice(None))
+                names.append(axis)
+                positions.append(np.arange(length))
+            elif isinstance(value, (list, tuple, np.ndarray)):
+                basic.append(slice(None))
+                names.append(axis)
+                positions.append(np.array([self._position(axis, v) for v in value], dtype=np.intp))
+            else:
+                basic.append(self._position(axis, value))
+        return tuple(basic), names, positions
+
+    def _blocks(self, metric, selection):
+        """
+        Reads the selected cells of a metric in blocks along the first remaining axis.
+
+        Yields:
+            (block array, index arrays of the block's axes)
+        """
+        basic, names, positions = self._selection(selection)
+        view = self._arrays[metric][basic]
+        if not names:
+            yield np.asarray(view), positions
+            return
+        row_bytes = view.itemsize * int(np.prod([len(p) for p in positions[1:]], dtype=np.int64))
+        rows = max(1, BLOCK_BYTES // max(row_bytes, 1))
+        first = positions[0]
+        for start in range(0, len(first), rows):
+            chunk = first[start:start + rows]
+            if np.array_equal(chunk, np.arange(chunk[0], chunk[0] + len(chunk))):
+                block = np.asarray(view[chunk[0]:chunk[0] + len(chunk)])
+            else:
+                block = np.take(view, chunk, axis=0)
+            for axis, index in enumerate(positions[1:], 1):
+                if len(index) != block.shape[axis] or not np.array_equal(index, np.arange(len(index))):
+                    block = np.take(block, index, axis=axis)
+            yield block, [chunk] + positions[1:]
+
+    def values(self, metric, **selection):
+        """
+        Returns:
+            (remaining axis names, array of the selected cells)
+        """
+        _, names, _ = self._selection(selection)
+        blocks = [block for block, _ in self._blocks(metric, selection)]
+        return names, (np.concatenate(blocks) if names else blocks[0])
+
+    def marginal(self, metric, keep, reduce='max', **selection):
+        """
+        Reduces the selected cells over every remaining axis not in keep,
+        ignoring cells that were not simulated.
+
+        Returns:
+            (kept axis names in the order given, array over them)
+        """
+        if reduce not in REDUCTIONS:
+            raise ValueError(f"unknown reduction {reduce}, expected one of {', '.join(REDUCTIONS)}")
+        _, names, _ = self._selection(selection)
+        keep = list(keep)
+        missing = [axis for axis in keep if axis not in names]
+        if missing:
+            raise KeyError(f"cannot keep fixed or unknown axes {', '.join(missing)}")
+        reduced_axes = tuple(k for k, axis in enumerate(names) if axis not in keep)
+        first_kept = names[0] in keep
+
+        parts = []
+        total = count = None
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN slices of unsimulated cells
+            for block, _ in self._blocks(metric, selection):
+                if reduce == 'mean':
+                    block_total = np.nansum(block, axis=reduced_axes)
+                    block_count = np.sum(~np.isnan(block), axis=reduced_axes)
+                    if first_kept:
+                        parts.append((block_total, block_count))
+                    elif total is None:
+                        total, count = block_total, block_count
+                    else:
+                        total, count = total + block_total, count + block_count
+                else:
+                    part = (np.nanmax if reduce == 'max' else np.nanmin)(block, axis=reduced_axes)
+                    if first_kept:
+                        parts.append(part)
+                    else:
+                        # fmax/fmin ignore NaN, like nanmax/nanmin
+                        total = part if total is None else (np.fmax if reduce == 'max' else np.fmin)(total, part)
+            if reduce == 'mean':
+                if first_kept:
+                    total = np.concatenate([p[0] for p in parts])
+                    count = np.concatenate([p[1] for p in parts])
+                result = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+            else:
+                result = np.concatenate(parts) if first_kept else total
+        kept = [axis for axis in names if axis in keep]
+        return keep, np.transpose(result, [kept.index(axis) for axis in keep])
+
+    def top(self, metric, k=10, **selection):
+        """
+        Ties go to the cell that comes first in grid order, as with TopK.
+
+        Returns:
+            list of ({axis: value}, value) of the k selected cells with the
+            best metric (the lowest for LOWER_IS_BETTER metrics, else the
+            highest), best first (fixed axes included)
+        """
+        sign = -1.0 if metric in LOWER_IS_BETTER else 1.0
+        fixed = {axis: value for axis, value in selection.items() if value is not None and not isinstance(value, (list, tuple, np.ndarray))}
+        _, names, _ = self._selection(selection)
+        candidates = []
+        for block, index in self._blocks(metric, selection):
+            flat = np.where(np.isnan(block), -np.inf, sign * block).reshape(-1)
+            if len(flat) > k:
+                # Every cell tied with the k-th best, so ties can be broken by position
+                threshold = np.partition(flat, -k)[-k]
+                best = np.flatnonzero(flat >= threshold)
+            else:
+                best = np.arange(len(flat))
+            for cell in best.tolist():
+                if flat[cell] == -np.inf:
+                    continue
+                coords = np.unravel_index(cell, block.shape)
+                position = tuple(int(index[n][c]) for n, c in enumerate(coords))
+                candidates.append((float(flat[cell]), position))
+            candidates = sorted(candidates, key=lambda entry: (-entry[0], entry[1]))[:k]
+        return [({**fixed, **{axis: self.axes[axis][p] for axis, p in zip(names, position)}}, sign * value) for value, position in candidates]
+
+    def best_region(self, metric, radius=1, **selection):
+        """
+        Averages every selected cell with its neighbours up to radius steps
+        away along each remaining axis (a box filter; unsimulated and
+        infinite cells are left out of the average) and picks the best
+        average, the lowest for LOWER_IS_BETTER metrics. Loads the
+        selection into memory, so fix the axes that are not needed.
+
+        Returns:
+            ({axis: value}, neighbourhood mean, value of the cell itself)
+        """
+        fixed = {axis: value for axis, value in selection.items() if value is not None and not isinstance(value, (list, tuple, np.ndarray))}
+        _, names, positions = self._selection(selection)
+        _, values = self.values(metric, **selection)
+        sign = -1.0 if metric in LOWER_IS_BETTER else 1.0
+        valid = np.isfinite(values)
+        total = np.where(valid, sign * values, 0.0)
+        count = valid.astype(np.float64)
+        for axis in range(values.ndim):
+            total = _box_sum(total, axis, radius)
+            count = _box_sum(count, axis, radius)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, total / count, -np.inf)
+        cell = np.unravel_index(int(np.argmax(mean)), mean.shape)
+        cell_axes = {axis: self.axes[axis][int(positions[n][c])] for n, (axis, c) in enumerate(zip(names, cell))}
+        return {**fixed, **cell_axes}, sign * float(mean[cell]), float(values[cell])
+
+
+def _box_sum(values, axis, radius):
+    """
+    Returns:
+        sum of values over a window of radius cells on either side along axis
+    """
+    if radius <= 0 or values.shape[axis] == 1:
+        return values
+    padded = np.moveaxis(values, axis, 0)
+    cumulative = np.concatenate([np.zeros((1,) + padded.shape[1:]), np.cumsum(padded, axis=0)])
+    length = padded.shape[0]
+    upper = np.minimum(np.arange(length) + radius + 1, length)
+    lower = np.maximum(np.arange(length) - radius, 0)
+    return np.moveaxis(cumulative[upper] - cumulative[lower], 0, axis)
+
+
+def parse_selection(items):
+    """
+    Parses AXIS=VALUE[,VALUE...] arguments.
+
+    Returns:
+        {axis: value or list of values}
+    """
+    selection = {}
+    for item in items:
+        axis, _, text = item.partition('=')
+        if axis not in AXES or not text:
+            raise ValueError(f"expected AXIS=VALUE with AXIS one of {', '.join(AXES)}, got {item!r}")
+        values = text.split(',') if axis == 'dataset' else [float(value) for value in text.split(',')]
+        selection[axis] = values if len(values) > 1 else values[0]
+    return selection
+
+
+def format_table(names, values, labels):
+    """
+    Returns:
+        text table of a 1-D or 2-D marginal, rows along the first axis;
+        labels holds the axis values of each axis
+    """
+    rows = labels[0]
+    if len(names) == 1:
+        return '\n'.join([f"{names[0]:>16} value"] + [f"{str(row):>16} {value:.6g}" for row, value in zip(rows, values.tolist())])
+    columns = labels[1]
+    lines = [f"{names[0] + ' / ' + names[1]:>24} " + ' '.join(f"{str(column):>12}" for column in columns)]
+    for row, line in zip(rows, values.tolist()):
+        lines.append(f"{str(row):>24} " + ' '.join(f"{value:>12.6g}" for value in line))
+    return '\n'.join(lines)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Slice, marginalize and search a results cube written with --cube.")
+    parser.add_argument("path", help="Cube directory.")
+    parser.add_argument("--metric", default='final_cash', choices=METRICS, help="Metric to query (default final_cash).")
+    parser.add_argument("--fix", nargs='+', default=[], metavar='AXIS=VALUE',
+                        help="Fix axes to a value, or restrict them to comma-separated values.")
+    parser.add_argument("--keep", nargs='+', choices=AXES, default=None,
+                        help="Print the metric over these one or two axes, reduced over the others.")
+    parser.add_argument("--reduce", choices=REDUCTIONS, default='max', help="Reduction for --keep (default max).")
+    parser.add_argument("--heatmap", default=None, help="With two --keep axes, also write a heatmap to this HTML file.")
+    parser.add_argument("--top", type=int, default=0, help="Print the N best cells.")
+    parser.add_argument("--region", type=int, default=None, metavar='RADIUS',
+                        help="Print the cell with the best mean over its neighbours up to RADIUS steps away on every axis.")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.path):
+        parser.error(f"{args.path} is not a directory; give the path of a cube written with --cube")
+    if not os.path.isfile(os.path.join(args.path, 'meta.json')):
+        parser.error(f"{args.path} has no meta.json: it is not a cube written with --cube, or it is incomplete")
+    if args.keep and len(args.keep) > 2:
+        parser.error("--keep takes one or two axes")
+    if args.heatmap and (not args.keep or len(args.keep) != 2):
+        parser.error("--heatmap requires two --keep axes")
+    try:
+        args.selection = parse_selection(args.fix)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    with ResultCube(args.path) as cube:
+        print(f"{args.path}: {' x '.join(f'{axis} ({length})' for axis, length in zip(AXES, cube.shape))}, settings {cube.settings}")
+        if args.keep:
+            names, values = cube.marginal(args.metric, args.keep, args.reduce, **args.selection)
+            labels = [args.selection[axis] if isinstance(args.selection.get(axis), list) else cube.axes[axis] for axis in names]
+            print(f"{args.reduce} of {args.metric}:")
+            print(format_table(names, values, labels))
+            if args.heatmap:
+                import plotly.graph_objects as go
+                fig = go.Figure(go.Heatmap(z=values, y=[str(v) for v in labels[0]], x=[str(v) for v in labels[1]]))
+                fig.update_layout(title=f"{args.reduce} of {args.metric} {args.selection or ''}", yaxis_title=names[0], xaxis_title=names[1])
+                fig.write_html(args.heatmap)
+                print(f"Heatmap saved to {args.heatmap}")
+        if args.top:
+            print(f"Top {args.top} cells by {args.metric}:")
+            for rank, (cell, value) in enumerate(cube.top(args.metric, args.top, **args.selection), 1):
+                print(f"{rank}.", cell, value)
+        if args.region is not None:
+            cell, mean, value = cube.best_region(args.metric, args.region, **args.selection)
+            print(f"Best region (radius {args.region}) by {args.metric}: {cell}, neighbourhood mean {mean}, cell {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,187 @@
+"""
+Binary columnar cache for the OHLCV CSV files.
+
+The first load of a CSV parses it once and writes every column as a .npy
+file into a cache directory keyed on the file's path, size and mtime. Later
+loads memory-map those columns, so startup no longer depends on text
+parsing. Files using either a "DateTime" or a "Timestamp" header for the
+Unix-seconds time column are stored under the single name "DateTime".
+
+The cache lives in $BACKTESTER_CACHE_DIR, or ~/.cache/backtester by default.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from engine import OHLCV_COLUMNS, Bars
+
+TIME_COLUMN = 'DateTime'
+TIME_ALIASES = ('DateTime', 'Timestamp')
+CACHE_VERSION = 2
+
+
+def cache_dir():
+    return os.environ.get('BACKTESTER_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'backtester'))
+
+
+def _source_key(path):
+    """
+    Returns:
+        (absolute path, size, mtime in ns) identifying the current file contents
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def _entry_dir(path):
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir(), f"{os.path.splitext(os.path.basename(path))[0]}-{digest}")
+
+
+def read_columns(path):
+    """
+    Parses a CSV file, or reads an .npz file written by resample-data.py,
+    into canonical columns.
+
+    Returns:
+        dict with an int64 "DateTime" array and float64 OHLCV arrays
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            table = {name: data[name] for name in data.files}
+    else:
+        table = pd.read_csv(path)
+    time_column = next((name for name in TIME_ALIASES if name in table), None)
+    if time_column is None:
+        raise ValueError(f"{path}: no time column, expected one of {', '.join(TIME_ALIASES)}")
+    columns = {TIME_COLUMN: np.asarray(table[time_column], dtype=np.int64)}
+    for name in OHLCV_COLUMNS:
+        columns[name] = np.asarray(table[name], dtype=np.float64)
+    return columns
+
+
+def columns_hash(columns):
+    """
+    Returns:
+        hex SHA-256 of the canonical columns, independent of CSV formatting
+    """
+    digest = hashlib.sha256()
+    for name in (TIME_COLUMN,) + OHLCV_COLUMNS:
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(columns[name]).tobytes())
+    return digest.hexdigest()
+
+
+def _write_entry(path, key, columns):
+    entry = _entry_dir(path)
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(entry))
+    try:
+        for name, values in columns.items():
+            np.save(os.path.join(staging, name + '.npy'), np.ascontiguousarray(values))
+        meta = {'version': CACHE_VERSION, 'path': key[0], 'size': key[1], 'mtime_ns': key[2],
+                'columns': list(columns), 'rows': len(columns[TIME_COLUMN]), 'sha256': columns_hash(columns)}
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(staging, entry)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _read_entry(path, key):
+    """
+    Returns:
+        dict of memory-mapped columns, or None if there is no valid entry for key
+    """
+    entry = _entry_dir(path)
+    try:
+        with open(os.path.join(entry, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION or (meta['path'], meta['size'], meta['mtime_ns']) != key:
+        return None
+    try:
+        return {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in meta['columns']}
+    except (OSError, ValueError):
+        return None
+
+
+def load_columns(path, use_cache=True):
+    """
+    Loads the columns of a CSV file through the cache.
+
+    Returns:
+        dict with a "DateTime" array and the OHLCV arrays, memory-mapped
+        from the cache when use_cache is set
+    """
+    if not use_cache:
+        return read_columns(path)
+    key = _source_key(path)
+    columns = _read_entry(path, key)
+    if columns is None:
+        try:
+            _write_entry(path, key, read_columns(path))
+        except OSError:
+            # Read-only or full cache location: fall back to parsing every time
+            return read_columns(path)
+        columns = _read_entry(path, key)
+    return columns
+
+
+def content_hash(path, use_cache=True):
+    """
+    Returns:
+        hex SHA-256 of the dataset's columns, read from the cache entry when there is one
+    """
+    if use_cache:
+        load_columns(path)
+        try:
+            with open(os.path.join(_entry_dir(path), 'meta.json')) as f:
+                meta = json.load(f)
+            if (meta['path'], meta['size'], meta['mtime_ns']) == _source_key(path):
+                return meta['sha256']
+        except (OSError, ValueError, KeyError):
+            pass
+    return columns_hash(load_columns(path, use_cache))
+
+
+def periods_per_year(path, use_cache=True):
+    """
+    Bars per year of a dataset, from the median spacing of its DateTime
+    column, for annualizing risk metrics.
+
+    Returns:
+        float, or None if the spacing cannot be told
+    """
+    times = load_columns(path, use_cache)[TIME_COLUMN]
+    if len(times) < 2:
+        return None
+    step = float(np.median(np.diff(times)))
+    return 365.25 * 86400 / step if step > 0 else None
+
+
+def load_bars(path, use_cache=True):
+    """
+    Returns:
+        Bars of a CSV file, memory-mapped from the cache
+    """
+    columns = load_columns(path, use_cache)
+    return Bars(*(columns[name] for name in OHLCV_COLUMNS))
+
+
+def load_frame(path, use_cache=True):
+    """
+    Returns:
+        DataFrame with "DateTime" and OHLCV columns, built from the cache
+    """
+    return pd.DataFrame(dict(load_columns(path, use_cache)))
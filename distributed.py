@@ -0,0 +1,228 @@
+"""
+Coordinator/worker distribution of a sweep over TCP.
+
+The coordinator splits the parameter grid into work units and serves them
+with multiprocessing.connection (length-prefixed pickles over TCP,
+authenticated with a shared key) to any number of workers, on this host or
+others. On connecting, a worker receives the dataset and run settings once
+and then asks for units until the grid is done. While simulating it sends a
+heartbeat every few seconds; a worker that disconnects or misses heartbeats
+for longer than the timeout is dropped and its units go back to the queue,
+so a sweep finishes as long as one worker is left. The first result of a
+unit wins if a reassigned unit is completed twice. While no worker is
+connected the coordinator reports that it is waiting, and gives up after
+an idle limit instead of waiting forever.
+
+Messages are pickled, so only run workers and coordinators that trust
+each other, with a private authkey.
+"""
+
+import collections
+import os
+import queue
+import socket
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from engine import Bars, simulate_batch
+from rolling import RollingIndex
+from sweep import chunked
+
+# Seconds between checks for results, and between reports while no worker is connected
+POLL_INTERVAL = 1.0
+WAIT_REPORT_INTERVAL = 10.0
+
+
+def parse_address(address):
+    """
+    Returns:
+        (host, port) of a 'host:port' string
+    """
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+class Coordinator:
+    """
+    Serves the work units of one sweep.
+
+    results() yields (first grid index, list of SimulationResult) per unit as
+    workers complete them, and returns once every unit is done. The workers
+    compute the risk metrics only if risk. If no worker is connected for
+    idle_limit seconds while units are left, results() raises TimeoutError.
+    """
+
+    def __init__(self, address, authkey, bars, grid, window_size, start_coin, start_cash, max_window_size, unit_size=256, timeout=10.0,
+                 periods_per_year=None, risk=True, idle_limit=300.0):
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.timeout = timeout
+        self.idle_limit = idle_limit
+        windows = sorted({params[1] for params in grid} | {params[2] for params in grid})
+        self.setup = {'columns': [column for column in bars], 'windows': windows, 'window_size': window_size,
+                      'start_coin': start_coin, 'start_cash': start_cash, 'max_window_size': max_window_size,
+                      'periods_per_year': periods_per_year, 'risk': risk}
+        self._units = {unit: (index, chunk) for unit, (index, chunk) in enumerate(chunked(grid, unit_size))}
+        self._pending = collections.deque(self._units)
+        self._done = set()
+        self._lock = threading.Lock()
+        self._results = queue.Queue()
+        self._finished = threading.Event()
+        self.workers = 0
+        self.reassigned = 0
+        self._accepter = threading.Thread(target=self._accept, daemon=True)
+        self._accepter.start()
+
+    def _accept(self):
+        while not self._finished.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # Closed listener, or a client that failed authentication
+                if self._finished.is_set():
+                    return
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        """Handles one worker connection until the sweep is done or the worker is lost."""
+        assigned = set()
+        name = None
+        try:
+            while True:
+                if not conn.poll(self.timeout):
+                    print(f"Worker {name or '?'} missed its heartbeats, dropping it")
+                    break
+                message = conn.recv()
+                kind = message[0]
+                if kind == 'hello':
+                    name = message[1]
+                    with self._lock:
+                        self.workers += 1
+                    conn.send(('setup', self.setup))
+                elif kind == 'heartbeat':
+                    pass
+                elif kind == 'result':
+                    _, unit, results = message
+                    assigned.discard(unit)
+                    self._complete(unit, results)
+                elif kind == 'ready':
+                    if self._finished.is_set():
+                        conn.send(('done',))
+                        break
+                    with self._lock:
+                        unit = self._pending.popleft() if self._pending else None
+                    if unit is None:
+                        # Everything is handed out: ask again later in case a unit is reassigned
+                        conn.send(('wait', 0.5))
+                    else:
+                        assigned.add(unit)
+                        conn.send(('unit', unit, self._units[unit][1]))
+        except (EOFError, OSError):
+            if not self._finished.is_set():
+                print(f"Lost worker {name or '?'}")
+        finally:
+            with self._lock:
+                if name is not None:
+                    self.workers -= 1
+                lost = [unit for unit in assigned if unit not in self._done]
+                self._pending.extendleft(lost)
+                self.reassigned += len(lost)
+            conn.close()
+
+    def _complete(self, unit, results):
+        with self._lock:
+            if unit in self._done:
+                return
+            self._done.add(unit)
+            finished = len(self._done) == len(self._units)
+        self._results.put((self._units[unit][0], results))
+        if finished:
+            self._finished.set()
+
+    def results(self):
+        idle_since = reported = None
+        for _ in range(len(self._units)):
+            while True:
+                try:
+                    item = self._results.get(timeout=POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    pass
+                if self.workers:
+                    idle_since = None
+                    continue
+                now = time.monotonic()
+                if idle_since is None:
+                    idle_since = reported = now
+                left = len(self._units) - len(self._done)
+                if now - idle_since >= self.idle_limit:
+                    raise TimeoutError(f"no worker connected for {round(now - idle_since)} seconds with {left} of {len(self._units)} units left")
+                if now - reported >= WAIT_REPORT_INTERVAL:
+                    print(f"Waiting for workers: none connected for {round(now - idle_since)} seconds, {left} of {len(self._units)} units left")
+                    reported = now
+            yield item
+
+    def close(self):
+        self._finished.set()
+        self.listener.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_worker(address, authkey, heartbeat=2.0):
+    """
+    Connects to a coordinator and simulates its units until the sweep is done.
+
+    Returns:
+        number of units simulated
+    """
+    conn = Client(address, authkey=authkey)
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(heartbeat):
+            try:
+                send(('heartbeat',))
+            except OSError:
+                return
+
+    units = 0
+    try:
+        send(('hello', f"{socket.gethostname()}:{os.getpid()}"))
+        _, setup = conn.recv()
+        threading.Thread(target=beat, daemon=True).start()
+        bars = Bars(*setup['columns'])
+        rolling = RollingIndex(bars.close, setup['windows'])
+        while True:
+            send(('ready',))
+            message = conn.recv()
+            if message[0] == 'done':
+                return units
+            if message[0] == 'wait':
+                time.sleep(message[1])
+                continue
+            _, unit, params = message
+            results = simulate_batch(bars, setup['window_size'], setup['start_coin'], setup['start_cash'], setup['max_window_size'], params, rolling,
+                                     periods_per_year=setup['periods_per_year'], risk=setup['risk'])
+            send(('result', unit, results))
+            units += 1
+    except (EOFError, ConnectionError):
+        # The coordinator finished and closed the connection
+        return units
+    finally:
+        stop.set()
+        conn.close()
+
@@ -0,0 +1,787 @@
+"""
+Array-native simulation engine for backtester-parallel.py.
+
+The OHLCV columns are pulled out of the DataFrame once into contiguous
+NumPy arrays, and the trailing-stop / go / bad / min-max-range state machine
+runs over plain Python floats instead of per-bar pandas ``.iloc`` lookups.
+Results are bit-identical to the pandas implementation in
+backtester-parallel.py.
+"""
+
+import math
+from array import array
+from typing import NamedTuple
+
+import numpy as np
+
+from rolling import RollingIndex
+
+OHLCV_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# Bump whenever a change to the strategy alters simulation results, so stored
+# results from older versions are no longer reused
+STRATEGY_VERSION = 2
+
+# Risk metrics of every SimulationResult, computed by risk_metrics()
+RISK_METRICS = ('max_drawdown', 'sharpe', 'sortino', 'exposure', 'profit_factor', 'cagr')
+
+# Risk metrics of a simulation run with risk=False: NaN, as for a metric the engine did not compute
+NO_RISK_METRICS = (math.nan,) * len(RISK_METRICS)
+
+
+class Bars(NamedTuple):
+    """Contiguous float64 OHLCV columns of one dataset."""
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self):
+        return len(self.close)
+
+
+def bars_from_frame(df):
+    """
+    Extracts the OHLCV columns of a DataFrame into a Bars tuple.
+
+    Returns:
+        Bars with one contiguous float64 array per column
+    """
+    return Bars(*(np.ascontiguousarray(df[column].to_numpy(dtype=np.float64)) for column in OHLCV_COLUMNS))
+
+
+class SimulationResult:
+    """
+    Final balances, trade counters, parameters and risk metrics of one simulation.
+
+    A fixed-layout record returned by the metrics-only engines in place of
+    the 28-element run_simulation tuple. The risk metrics are described in
+    risk_metrics().
+    """
+    __slots__ = ('data_len', 'end_coin', 'end_cash', 'final_balance', 'final_cash', 'trades',
+                 'buy_good', 'buy_bad', 'sell_good', 'sell_bad', 'win_average', 'loss_average',
+                 'window_size', 'stop_percentage', 'buy_window', 'sell_window', 'go_percentage', 'bad_percentage') + RISK_METRICS
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values, strict=True):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_tuple(cls, result):
+        """
+        Builds a record from a 28-element run_simulation result tuple. The
+        tuple carries no risk metrics, so they are NaN.
+        """
+        data_len, end_coin, end_cash, final_balance, final_cash, trades, _, _, _, _, _, buy_good, buy_bad, sell_good, sell_bad, win_average, loss_average, window_size, stop_percentage, _, _, _, _, _, buy_window, sell_window, go_percentage, bad_percentage = result
+        return cls(data_len, end_coin, end_cash, final_balance, final_cash, trades, buy_good, buy_bad, sell_good, sell_bad,
+                   win_average, loss_average, window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage,
+                   *NO_RISK_METRICS)
+
+    @classmethod
+    def skipped(cls, window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage):
+        """
+        Record of a combination whose windows do not fit before max_window_size.
+        """
+        return cls(0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0.0, 0.0, window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage,
+                   *(0.0 for _ in RISK_METRICS))
+
+    def astuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @property
+    def params(self):
+        return self.stop_percentage, self.buy_window, self.sell_window, self.go_percentage, self.bad_percentage
+
+    def __reduce__(self):
+        return self.__class__, self.astuple()
+
+    def __eq__(self, other):
+        return isinstance(other, SimulationResult) and self.astuple() == other.astuple()
+
+    def __repr__(self):
+        return 'SimulationResult(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__) + ')'
+
+
+class History(NamedTuple):
+    """
+    Per-bar series of a simulation, for plotting the best configuration.
+
+    Every array has one entry per bar of the dataset. Levels that are only
+    recorded on some bars (stop, go and bad price) are NaN elsewhere, and
+    buy/sell are True on the bars where a trade happened.
+    """
+    start: int
+    balance: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    min_range: np.ndarray
+    max_range: np.ndarray
+    stop_price: np.ndarray
+    go_price: np.ndarray
+    bad_price: np.ndarray
+    buy: np.ndarray
+    sell: np.ndarray
+
+    @classmethod
+    def allocate(cls, n, start):
+        return cls(start, *(np.full(n, np.nan) for _ in range(8)), np.zeros(n, dtype=bool), np.zeros(n, dtype=bool))
+
+    def points(self, name):
+        """
+        Returns:
+            list of (bar index, value) tuples of a series, as run_simulation records them
+        """
+        values = getattr(self, name)
+        if name in ('buy', 'sell'):
+            indexes = np.flatnonzero(values)
+            return list(zip(indexes.tolist(), self.close[indexes].tolist()))
+        indexes = np.arange(self.start, len(values))
+        recorded = ~np.isnan(values[self.start:])
+        return list(zip(indexes[recorded].tolist(), values[self.start:][recorded].tolist()))
+
+
+class TradeLog(NamedTuple):
+    """
+    The trades of one simulation: bar index, side (1 buy, -1 sell) and
+    close price of each, in order.
+
+    The buy/sell decisions depend only on prices and on whether coin is
+    held, not on the fee or the size of the balances, so replay.py can
+    re-price a log under other fees, slippage and starting capital.
+    holding is True if the simulation started holding coin; last_close is
+    the close of the last bar, used to mark the final position to market.
+    """
+    index: np.ndarray
+    side: np.ndarray
+    price: np.ndarray
+    holding: bool
+    last_close: float
+
+    @classmethod
+    def from_events(cls, events, holding, last_close):
+        """
+        Builds a log from a list of (bar index, side, price) tuples.
+        """
+        return cls(np.array([event[0] for event in events], dtype=np.int64),
+                   np.array([event[1] for event in events], dtype=np.int8),
+                   np.array([event[2] for event in events], dtype=np.float64),
+                   bool(holding), float(last_close))
+
+    def __len__(self):
+        return len(self.index)
+
+
+def risk_metrics(close, start, trade_bars, trade_values, start_coin, start_cash, periods_per_year=None):
+    """
+    Risk metrics of one simulation, from its trades.
+
+    The strategy is always all in or all out, so trades alternate between
+    selling and buying, and between two trades the equity is a constant
+    amount of coin marked to the close or a constant amount of cash.
+    trade_bars holds the bar index of every trade and trade_values the coin
+    held after each buy or the cash held after each sell, as the engine
+    computed them (NumPy arrays or array.array buffers). The equity curve
+    over bars start.. is rebuilt from them with a few vectorized operations,
+    without any per-bar or per-trade Python work, and:
+
+    - max_drawdown is the largest fall of the equity from its running peak,
+      as a fraction of the peak;
+    - sharpe and sortino are the mean bar-to-bar return of the equity over
+      its standard deviation and over its downside deviation;
+    - exposure is the fraction of bars that end holding coin;
+    - profit_factor is the cash gained by winning round trips (buy, then
+      sell) over the cash lost by losing ones;
+    - cagr is the compound annual growth rate of the equity.
+
+    sharpe, sortino and cagr are annualized with periods_per_year, the number
+    of bars in a year; they are per bar when it is None. A profit factor or
+    Sortino ratio without any loss is inf if there was any gain, else 0.
+
+    Sums are accumulated in bar order (np.add.accumulate is a plain running
+    sum), so engines that keep running totals bar by bar, like
+    simulate_batch() and the streaming strategy, get identical values.
+
+    Returns:
+        tuple of the RISK_METRICS values
+    """
+    bars = len(close) - start
+    if bars <= 0:
+        return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+
+    # A plain view: arithmetic on np.memmap goes through its slower subclass hooks
+    close = np.asarray(close)[start:]
+    values = np.asarray(trade_values, dtype=np.float64)
+    trades = len(values)
+    # The first trade sells if the simulation starts holding coin, and sides alternate from there;
+    # segment k + 1 holds the balances after trade k
+    first_buy = 1 if start_coin > 0 else 0
+    coins = np.zeros(trades + 1)
+    coins[0] = start_coin
+    coins[1 + first_buy::2] = values[first_buy::2]
+    cashes = np.zeros(trades + 1)
+    cashes[0] = start_cash
+    cashes[2 - first_buy::2] = values[1 - first_buy::2]
+    bounds = np.empty(trades + 2, dtype=np.int64)
+    bounds[0] = start
+    bounds[1:-1] = trade_bars
+    bounds[-1] = start + bars
+    lengths = bounds[1:] - bounds[:-1]
+    equity = np.repeat(coins, lengths)
+    equity *= close
+    equity += np.repeat(cashes, lengths)
+
+    # Round trips: every sell after a buy, against the cash spent on that buy
+    first_sell = 2 if first_buy else 1
+    proceeds = values[first_sell::2]
+    entries = cashes[first_sell - 1::2][:len(proceeds)]
+    gross_profit = _running_total(np.maximum(proceeds - entries, 0.0))
+    gross_loss = _running_total(np.maximum(entries - proceeds, 0.0))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        peak = np.maximum.accumulate(equity)
+        # NaN while the peak is still 0, which fmin skips
+        drawdown = 1 - float(np.fmin.reduce(equity / peak))
+        returns = equity[1:] / equity[:-1]
+    returns -= 1
+    return_sum = _running_total(returns)
+    losses = np.minimum(returns, 0.0)
+    losses *= losses
+    downside_sum = _running_total(losses)
+    returns *= returns
+    square_sum = _running_total(returns)
+    if drawdown != drawdown:
+        drawdown = 0.0
+    # Every buy spends a positive cash balance, so coin is held exactly on the segments after buys
+    held_bars = int(lengths[1 + first_buy::2].sum()) + (int(lengths[0]) if start_coin > 0 else 0)
+    return risk_summary(bars, float(equity[0]), float(equity[-1]), drawdown, return_sum, square_sum, downside_sum,
+                        held_bars, gross_profit, gross_loss, periods_per_year)
+
+
+def _running_total(values):
+    """
+    Returns:
+        the left-to-right sum of values as a float, 0.0 if empty
+    """
+    return float(np.add.accumulate(values)[-1]) if len(values) else 0.0
+
+
+def risk_summary(bars, first_equity, last_equity, max_drawdown, return_sum, square_sum, downside_sum, held_bars, gross_profit, gross_loss, periods_per_year=None):
+    """
+    Turns the running totals of an equity curve into the risk metrics, for
+    risk_metrics() and for engines that accumulate them bar by bar.
+    return_sum, square_sum and downside_sum are the sums of the bar-to-bar
+    returns, of their squares and of the squares of the negative ones; a
+    non-finite return_sum (a balance of 0 somewhere) leaves the returns
+    undefined and Sharpe and Sortino at 0.
+
+    Returns:
+        tuple of the RISK_METRICS values
+    """
+    count = bars - 1
+    if count > 0 and math.isfinite(return_sum):
+        mean = return_sum / count
+        deviation = math.sqrt(max(square_sum / count - mean * mean, 0.0))
+        downside = math.sqrt(downside_sum / count)
+    else:
+        mean = deviation = downside = 0.0
+    scale = math.sqrt(periods_per_year) if periods_per_year else 1.0
+    sharpe = mean / deviation * scale if deviation > 0 else 0.0
+    sortino = mean / downside * scale if downside > 0 else (math.inf if mean > 0 else 0.0)
+    exposure = held_bars / bars if bars > 0 else 0.0
+    profit_factor = gross_profit / gross_loss if gross_loss > 0 else (math.inf if gross_profit > 0 else 0.0)
+    periods = count / periods_per_year if periods_per_year else count
+    if periods > 0 and first_equity > 0:
+        cagr = (last_equity / first_equity) ** (1 / periods) - 1
+    else:
+        cagr = 0.0
+    return max_drawdown, sharpe, sortino, exposure, profit_factor, cagr
+
+
+class _EquityTotals:
+    """
+    Running totals of many equity curves for risk_summary(), summed in the
+    order risk_metrics() sums them. add() records the equity of every curve
+    at one bar; the rows are folded into the totals a block of bars at a
+    time, so that each NumPy call covers many bars.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        # A single curve is kept twice: NumPy sums a one-column block pairwise
+        # down the rows instead of one row at a time
+        width = max(n, 2)
+        self.rows = np.empty((max(1, min(256, (1 << 16) // width)), width))
+        self.returns = np.empty_like(self.rows)
+        self.squares = np.empty_like(self.rows)
+        self.filled = 0
+        self.first = self.last = self.peak = None
+        self.low_ratio = np.ones(width)
+        self.return_sum = np.zeros(width)
+        self.square_sum = np.zeros(width)
+        self.downside_sum = np.zeros(width)
+
+    def add(self, coin, cash, close_price):
+        row = self.rows[self.filled]
+        np.multiply(coin, close_price, out=row)
+        row += cash
+        self.filled += 1
+        if self.filled == len(self.rows):
+            self.flush()
+
+    def flush(self):
+        m = self.filled
+        self.filled = 0
+        if not m:
+            return
+        equity = self.rows[:m]
+        returns = self.returns[:m]
+        squares = self.squares[:m]
+        if self.peak is None:
+            # The first bar has no return: dividing it by itself adds 0 to the sums
+            self.first = equity[0].copy()
+            self.last = self.first
+            self.peak = self.first.copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(equity[0], self.last, out=returns[0])
+            np.divide(equity[1:], equity[:-1], out=returns[1:])
+            returns -= 1
+            # Reducing over the first (slow) axis adds one row at a time, like a
+            # running total: NumPy only sums pairwise along the fast axis
+            np.minimum(returns, 0.0, out=squares)
+            squares *= squares
+            squares[0] += self.downside_sum
+            np.add.reduce(squares, axis=0, out=self.downside_sum)
+            np.multiply(returns, returns, out=squares)
+            squares[0] += self.square_sum
+            np.add.reduce(squares, axis=0, out=self.square_sum)
+            returns[0] += self.return_sum
+            np.add.reduce(returns, axis=0, out=self.return_sum)
+            # Running peaks row by row: maximum.accumulate over the slow axis is far slower
+            peak = self.peak
+            for k in range(m):
+                peak = np.maximum(peak, equity[k], out=returns[k])
+            self.peak = peak.copy()
+            np.divide(equity, returns, out=returns)
+        # NaN while the peak is still 0, which fmin skips
+        np.fmin(self.low_ratio, np.fmin.reduce(returns, axis=0), out=self.low_ratio)
+        self.last = equity[-1].copy()
+
+    def totals(self):
+        """
+        Returns:
+            list of (first_equity, last_equity, max_drawdown, return_sum,
+            square_sum, downside_sum) lists, or None before any bar
+        """
+        self.flush()
+        if self.peak is None:
+            return None
+        return [array[:self.n].tolist() for array in (self.first, self.last, 1 - self.low_ratio, self.return_sum, self.square_sum, self.downside_sum)]
+
+def _simulate(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling, history, trade_log=None, periods_per_year=None, risk=True):
+    """
+    The strategy state machine. Fills history when one is given and appends
+    (bar index, side, price) to trade_log for every trade when it is a list.
+    With risk the risk metrics are computed from the trades afterwards, else
+    they are NaN.
+
+    Returns:
+        SimulationResult
+    """
+    if max_window_size < min(buy_window, sell_window):
+        return SimulationResult.skipped(window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage)
+    if max(buy_window, sell_window) > max_window_size + 1:
+        raise ValueError(f"window {max(buy_window, sell_window)} does not fit before bar {max_window_size}")
+
+    if rolling is None or sell_window not in rolling or buy_window not in rolling:
+        rolling = RollingIndex(bars.close, (buy_window, sell_window))
+
+    # Python lists index far faster than NumPy scalars in a per-bar loop
+    closes = bars.close.tolist()
+    min_ranges = rolling.min(sell_window).tolist()
+    max_ranges = rolling.max(buy_window).tolist()
+
+    fee = 0.000
+    trades = 0
+    sell_good = 0
+    sell_bad = 0
+    buy_good = 0
+    buy_bad = 0
+    win_total = 0
+    win_count = 0
+    loss_total = 0
+    loss_count = 0
+    data_len = len(closes)
+    close_price = 0.0
+    highest_price = 0.0
+
+    coin = start_coin
+    cash = start_cash
+
+    last_buy_price = 0.0
+    last_sell_price = 0.0
+
+    go_price = 0
+    bad_price = 0
+
+    # Bar index and resulting balance of every trade, for risk_metrics(); typed
+    # arrays append as fast as lists and reach NumPy without a conversion
+    trade_bars = array('q')
+    trade_values = array('d')
+    record_bar = trade_bars.append
+    record_value = trade_values.append
+
+    if history is not None:
+        history.close[:] = bars.close
+        history.volume[:] = bars.volume
+        history.min_range[:] = min_ranges
+        history.max_range[:] = max_ranges
+
+    for i in range(max_window_size, data_len):
+        close_price = closes[i]
+        decision = 0
+
+        if history is not None:
+            history.balance[i] = cash + coin * close_price
+
+        if i == min(buy_window, sell_window) and debug:
+            print(i, close_price, close_price, close_price, close_price, coin, cash, coin + cash / close_price,
+                  coin * close_price + cash, trades)
+
+        min_range = min_ranges[i]
+        max_range = max_ranges[i]
+
+        if coin > 0:
+            # Trailing stop logic
+            if close_price > highest_price:
+                highest_price = close_price
+
+            stop_price = highest_price * (1 - stop_percentage)
+            if history is not None:
+                history.stop_price[i] = stop_price
+                history.go_price[i] = go_price
+
+            # Sell if the price falls below the stop price, min range, or if the profit exceeds go_percentage
+            if close_price <= min_range or close_price <= stop_price or (last_buy_price > 0 and close_price >= go_price):
+                bad_price = close_price * (1 + bad_percentage)
+
+                cash = coin * close_price * (1 - fee)
+                trades += 1
+                if debug:
+                    print("***trade #", trades, "sell", coin, "BTC for $", cash)
+                coin = 0.0
+                decision = -1
+                if risk:
+                    record_bar(i)
+                    record_value(cash)
+                if trade_log is not None:
+                    trade_log.append((i, -1, close_price))
+                if history is not None:
+                    history.bad_price[i] = bad_price
+                    history.sell[i] = True
+                if last_buy_price > 0:
+                    curr_profit = close_price - last_buy_price
+                    if curr_profit >= 0:
+                        sell_good += 1
+                        win_total += curr_profit
+                        win_count += 1
+                    else:
+                        sell_bad += 1
+                        loss_total += curr_profit
+                        loss_count += 1
+                last_sell_price = close_price
+
+        elif cash > 0:
+            if history is not None:
+                history.bad_price[i] = bad_price
+
+            if close_price >= max_range or (last_sell_price > 0 and close_price <= bad_price):
+                go_price = close_price * (1 + go_percentage)
+
+                coin = cash / close_price * (1 - fee)
+                highest_price = close_price  # Reset highest price after buying
+                stop_price = highest_price * (1 - stop_percentage)
+                if debug:
+                    print("***trade #", trades, "buy", coin, "BTC for $", cash)
+                cash = 0.0
+                trades += 1
+                decision = 1
+                if risk:
+                    record_bar(i)
+                    record_value(coin)
+                if trade_log is not None:
+                    trade_log.append((i, 1, close_price))
+                if history is not None:
+                    history.go_price[i] = go_price
+                    history.stop_price[i] = stop_price  # Add stop price after buying
+                    history.buy[i] = True
+                if last_sell_price > 0:
+                    curr_profit = close_price - last_sell_price
+                    if curr_profit >= 0:
+                        buy_good += 1
+                    else:
+                        buy_bad += 1
+                last_buy_price = close_price
+
+        if debug:
+            print(i, close_price, min_range, max_range, coin, cash, coin + cash / close_price, coin * close_price + cash, trades, decision)
+
+    if debug:
+        print(data_len, close_price, min_range, max_range, coin, cash, coin + cash / close_price,
+              coin * close_price + cash, trades, decision)
+
+    # Running totals add the profits in the same order as sum() over a list of them
+    aver_wins = win_total / win_count if win_count else 0.0
+    aver_losses = loss_total / loss_count if loss_count else 0.0
+
+    return SimulationResult(data_len, coin, cash, coin + cash / close_price, coin * close_price + cash, trades,
+                            buy_good, buy_bad, sell_good, sell_bad, aver_wins, aver_losses,
+                            window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage,
+                            *(risk_metrics(bars.close, max_window_size, trade_bars, trade_values, start_coin, start_cash, periods_per_year)
+                              if risk else NO_RISK_METRICS))
+
+
+def simulate_metrics(bars, window_size, start_coin, start_cash, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling=None, periods_per_year=None,
+                     risk=True):
+    """
+    Runs the trading strategy without recording any per-bar history.
+
+    This is the sweep hot path: nothing is allocated per bar. rolling is a
+    RollingIndex over bars.close shared by all simulations of the dataset;
+    one is built for the two windows if omitted. periods_per_year annualizes
+    the risk metrics (see risk_metrics()); with risk False they are skipped
+    and left NaN.
+
+    Returns:
+        SimulationResult
+    """
+    return _simulate(bars, window_size, start_coin, start_cash, False, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling, None,
+                     periods_per_year=periods_per_year, risk=risk)
+
+
+def simulate_trades(bars, window_size, start_coin, start_cash, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling=None, periods_per_year=None,
+                    risk=True):
+    """
+    Runs the trading strategy like simulate_metrics() and also records its trades.
+
+    Returns:
+        (SimulationResult, TradeLog)
+    """
+    events = []
+    result = _simulate(bars, window_size, start_coin, start_cash, False, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling, None, events,
+                       periods_per_year, risk)
+    last_close = bars.close[-1] if len(bars) > max_window_size else 0.0
+    return result, TradeLog.from_events(events, start_coin > 0, last_close)
+
+
+def simulate_history(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling=None, periods_per_year=None):
+    """
+    Runs the trading strategy and records its per-bar series in preallocated
+    NumPy arrays, for the final replay of the best configuration.
+
+    Returns:
+        (SimulationResult, History)
+    """
+    history = History.allocate(len(bars), max_window_size)
+    result = _simulate(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling, history,
+                       periods_per_year=periods_per_year)
+    return result, history
+
+
+def simulate(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, cleanup, rolling=None):
+    """
+    Runs the trading strategy over a Bars tuple.
+
+    Takes the same parameters as run_simulation() in backtester-parallel.py,
+    with the DataFrame replaced by Bars, and returns the same 28-element
+    result tuple. With cleanup the history lists are empty and no history is
+    recorded at all.
+    """
+    if max_window_size < min(buy_window, sell_window):
+        return 0, 0, 0, 0, 0, 0, [], [], [], [], [], []
+    if cleanup and not debug:
+        result, history = simulate_metrics(bars, window_size, start_coin, start_cash, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling), None
+    else:
+        result, history = simulate_history(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling)
+    if cleanup:
+        series = {name: [] for name in ('balance', 'close', 'volume', 'buy', 'sell', 'min_range', 'max_range', 'stop_price', 'go_price', 'bad_price')}
+    else:
+        series = {name: history.points(name) for name in ('balance', 'close', 'volume', 'buy', 'sell', 'min_range', 'max_range', 'stop_price', 'go_price', 'bad_price')}
+    r = result
+    return (r.data_len, r.end_coin, r.end_cash, r.final_balance, r.final_cash, r.trades,
+            series['balance'], series['close'], series['volume'], series['buy'], series['sell'],
+            r.buy_good, r.buy_bad, r.sell_good, r.sell_bad, r.win_average, r.loss_average, r.window_size, r.stop_percentage,
+            series['min_range'], series['max_range'], series['stop_price'], series['go_price'], series['bad_price'],
+            r.buy_window, r.sell_window, r.go_percentage, r.bad_percentage)
+
+
+def simulate_batch(bars, window_size, start_coin, start_cash, max_window_size, params, rolling=None, trade_logs=None, periods_per_year=None, risk=True):
+    """
+    Runs many parameter combinations over a Bars tuple in lockstep.
+
+    params is a sequence of (stop_percentage, buy_window, sell_window,
+    go_percentage, bad_percentage) tuples. The state of every combination is
+    held in 1-D arrays and all of them advance one bar at a time with masked
+    NumPy updates, performing the same floating-point operations as
+    simulate(). If trade_logs is a list, the TradeLog of every combination
+    is appended to it, in the order of params. With risk the risk metrics
+    are accumulated bar by bar as running totals over every combination, in
+    the order risk_metrics() sums them; without it they are NaN and the
+    per-bar equity work is skipped.
+
+    Returns:
+        list with one SimulationResult per combination, identical to
+        simulate_metrics()
+    """
+    params = list(params)
+    stop_p = np.array([p[0] for p in params], dtype=np.float64)
+    buy_w = np.array([p[1] for p in params], dtype=np.int64)
+    sell_w = np.array([p[2] for p in params], dtype=np.int64)
+    go_p = np.array([p[3] for p in params], dtype=np.float64)
+    bad_p = np.array([p[4] for p in params], dtype=np.float64)
+
+    skipped = max_window_size < np.minimum(buy_w, sell_w)
+    live = ~skipped
+    if np.any(np.maximum(buy_w, sell_w)[live] > max_window_size + 1):
+        raise ValueError(f"window {int(np.maximum(buy_w, sell_w)[live].max())} does not fit before bar {max_window_size}")
+
+    windows = sorted(set(buy_w[live].tolist()) | set(sell_w[live].tolist()))
+    if rolling is None or any(w not in rolling for w in windows):
+        rolling = RollingIndex(bars.close, windows)
+    # (bars, windows) tables so that one bar's ranges for every window are a contiguous row
+    column = {w: k for k, w in enumerate(windows)}
+    min_table = np.column_stack([rolling.min(w) for w in windows]) if windows else np.empty((len(bars), 0))
+    max_table = np.column_stack([rolling.max(w) for w in windows]) if windows else np.empty((len(bars), 0))
+    sell_col = np.array([column.get(w, 0) for w in sell_w.tolist()], dtype=np.intp)
+    buy_col = np.array([column.get(w, 0) for w in buy_w.tolist()], dtype=np.intp)
+
+    n = len(stop_p)
+    fee = 0.000
+    closes = bars.close
+    data_len = len(closes)
+    close_price = 0.0
+
+    coin = np.full(n, start_coin, dtype=np.float64)
+    cash = np.full(n, start_cash, dtype=np.float64)
+    highest_price = np.zeros(n)
+    go_price = np.zeros(n)
+    bad_price = np.zeros(n)
+    last_buy_price = np.zeros(n)
+    last_sell_price = np.zeros(n)
+    trades = np.zeros(n, dtype=np.int64)
+    buy_good = np.zeros(n, dtype=np.int64)
+    buy_bad = np.zeros(n, dtype=np.int64)
+    sell_good = np.zeros(n, dtype=np.int64)
+    sell_bad = np.zeros(n, dtype=np.int64)
+    win_sum = np.zeros(n)
+    win_count = np.zeros(n, dtype=np.int64)
+    loss_sum = np.zeros(n)
+    loss_count = np.zeros(n, dtype=np.int64)
+    events = [[] for _ in range(n)] if trade_logs is not None else None
+    if risk:
+        # Equity curves and round trips for risk_summary()
+        equity = _EquityTotals(n)
+        # Bars that start holding coin; shifted by one bar at the end into the bars that end holding it
+        held_bars = -(live & (coin > 0)).astype(np.int64)
+        entry_cash = np.full(n, np.nan)
+        gross_profit = np.zeros(n)
+        gross_loss = np.zeros(n)
+
+    for i in range(max_window_size, data_len):
+        close_price = closes[i]
+        min_range = min_table[i][sell_col]
+        max_range = max_table[i][buy_col]
+
+        holding = live & (coin > 0)
+        if risk:
+            held_bars += holding
+        waiting = live & ~holding & (cash > 0)
+
+        # Trailing stop logic
+        np.maximum(highest_price, close_price, out=highest_price, where=holding)
+        stop_price = highest_price * (1 - stop_p)
+
+        sell = holding & ((close_price <= min_range) | (close_price <= stop_price) | ((last_buy_price > 0) & (close_price >= go_price)))
+        buy = waiting & ((close_price >= max_range) | ((last_sell_price > 0) & (close_price <= bad_price)))
+
+        if sell.any():
+            idx = np.flatnonzero(sell)
+            bad_price[idx] = close_price * (1 + bad_p[idx])
+            proceeds = coin[idx] * close_price * (1 - fee)
+            cash[idx] = proceeds
+            trades[idx] += 1
+            coin[idx] = 0.0
+            entry = last_buy_price[idx]
+            profit = close_price - entry
+            good = idx[(entry > 0) & (profit >= 0)]
+            bad = idx[(entry > 0) & (profit < 0)]
+            sell_good[good] += 1
+            win_sum[good] += close_price - last_buy_price[good]
+            win_count[good] += 1
+            sell_bad[bad] += 1
+            loss_sum[bad] += close_price - last_buy_price[bad]
+            loss_count[bad] += 1
+            last_sell_price[idx] = close_price
+            if risk:
+                # NaN entry (no buy yet): fmax adds 0
+                spent = entry_cash[idx]
+                gross_profit[idx] += np.fmax(proceeds - spent, 0.0)
+                gross_loss[idx] += np.fmax(spent - proceeds, 0.0)
+            if events is not None:
+                for k in idx.tolist():
+                    events[k].append((i, -1, close_price))
+
+        if buy.any():
+            idx = np.flatnonzero(buy)
+            go_price[idx] = close_price * (1 + go_p[idx])
+            spent = cash[idx]
+            if risk:
+                entry_cash[idx] = spent
+            coin[idx] = spent / close_price * (1 - fee)
+            highest_price[idx] = close_price
+            cash[idx] = 0.0
+            trades[idx] += 1
+            exit_price = last_sell_price[idx]
+            profit = close_price - exit_price
+            buy_good[idx[(exit_price > 0) & (profit >= 0)]] += 1
+            buy_bad[idx[(exit_price > 0) & (profit < 0)]] += 1
+            last_buy_price[idx] = close_price
+            if events is not None:
+                for k in idx.tolist():
+                    events[k].append((i, 1, close_price))
+
+        if risk:
+            equity.add(coin, cash, close_price)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final_balance = coin + cash / close_price
+        final_cash = coin * close_price + cash
+        aver_wins = np.where(win_count > 0, win_sum / np.maximum(win_count, 1), 0.0)
+        aver_losses = np.where(loss_count > 0, loss_sum / np.maximum(loss_count, 1), 0.0)
+
+    if events is not None:
+        trade_logs.extend(TradeLog.from_events(trades_k, start_coin > 0, close_price) for trades_k in events)
+
+    columns = [array.tolist() for array in (coin, cash, final_balance, final_cash, trades, buy_good, buy_bad, sell_good, sell_bad, aver_wins, aver_losses)]
+    totals = None
+    if risk:
+        held_bars += live & (coin > 0)
+        bar_count = data_len - max_window_size
+        totals = equity.totals()
+        if totals is not None:
+            totals += [array.tolist() for array in (held_bars, gross_profit, gross_loss)]
+
+    results = []
+    for k, (stop_percentage, buy_window, sell_window, go_percentage, bad_percentage) in enumerate(params):
+        if skipped[k]:
+            results.append(SimulationResult.skipped(window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage))
+            continue
+        if not risk:
+            metrics = NO_RISK_METRICS
+        elif totals:
+            metrics = risk_summary(bar_count, *(values[k] for values in totals), periods_per_year)
+        else:
+            metrics = (0.0,) * len(RISK_METRICS)
+        results.append(SimulationResult(data_len, *(values[k] for values in columns),
+                                        window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage, *metrics))
+    return results
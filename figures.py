@@ -0,0 +1,123 @@
+"""
+Plotly figures of simulations and of OHLC series.
+
+Long series are downsampled before plotting so the figures stay small and
+fast to render: line traces keep the first, last, lowest and highest point
+of each bucket of bars (min/max bucketing), so every spike and dip stays
+visible; candles are merged bucket by bucket into wider candles with the
+bucket's open, high, low and close. With webgl, line and marker traces
+are drawn with go.Scattergl.
+"""
+
+import numpy as np
+import plotly.graph_objects as go
+
+
+def bucket_starts(length, buckets):
+    """
+    Returns:
+        int array with the first index of each of up to buckets equal buckets of range(length)
+    """
+    return np.unique(np.linspace(0, length, min(buckets, length), endpoint=False).astype(np.int64))
+
+
+def minmax_indices(y, max_points):
+    """
+    Picks indices of y that keep its visual shape: the first, last, lowest
+    and highest point of each of max_points // 4 buckets.
+
+    Returns:
+        sorted int array of at most max_points indices (every index if y is
+        short enough or max_points is None)
+    """
+    length = len(y)
+    if max_points is None or length <= max_points:
+        return np.arange(length)
+    starts = bucket_starts(length, max(1, max_points // 4))
+    ends = np.r_[starts[1:], length] - 1
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, length]))
+    # First position of each bucket's minimum and maximum
+    firsts = []
+    for extreme in (np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)):
+        at = np.flatnonzero(y == extreme[bucket])
+        _, first = np.unique(bucket[at], return_index=True)
+        firsts.append(at[first])
+    return np.unique(np.concatenate((starts, ends, *firsts)))
+
+
+def downsample_line(x, y, max_points):
+    """
+    Downsamples a line with minmax_indices(), leaving out NaN points.
+
+    Returns:
+        (x, y) arrays of at most max_points points, or the line unchanged if
+        it is short enough
+    """
+    if max_points is None or len(y) <= max_points:
+        return x, y
+    finite = np.flatnonzero(np.isfinite(y))
+    keep = finite[minmax_indices(y[finite], max_points)]
+    return x[keep], y[keep]
+
+
+def downsample_ohlc(time, open_, high, low, close, max_points):
+    """
+    Merges consecutive bars into at most max_points candles.
+
+    Returns:
+        (time, open, high, low, close) arrays; each candle carries the time
+        and open of its first bar, the close of its last bar and the
+        high/low extremes of all its bars
+    """
+    length = len(close)
+    if max_points is None or length <= max_points:
+        return time, open_, high, low, close
+    starts = bucket_starts(length, max_points)
+    ends = np.r_[starts[1:], length] - 1
+    return time[starts], open_[starts], np.maximum.reduceat(high, starts), np.minimum.reduceat(low, starts), close[ends]
+
+
+def _scatter(webgl):
+    return go.Scattergl if webgl else go.Scatter
+
+
+def simulation_figure(history, title, max_points=None, webgl=False):
+    """
+    Plots the balance, close price, trade signals, min/max range and the
+    stop/go/bad levels of a History. With max_points every line trace is
+    downsampled to at most that many points; trade signals are always
+    plotted in full.
+
+    Returns:
+        plotly.graph_objects.Figure
+    """
+    Scatter = _scatter(webgl)
+    x = np.arange(history.start, len(history.close))
+    buy_x = np.flatnonzero(history.buy)
+    sell_x = np.flatnonzero(history.sell)
+
+    def line(values):
+        return downsample_line(x, values[x], max_points)
+
+    fig = go.Figure()
+    bx, by = line(history.balance)
+    fig.add_trace(Scatter(x=bx, y=by, mode='lines', name='Balance'))
+    cx, cy = line(history.close)
+    fig.add_trace(Scatter(x=cx, y=cy, mode='lines', name='Close Price'))
+    #fig.add_trace(go.Bar(x=x, y=history.volume[x], name='Volume', marker=dict(color='rgba(0, 255, 0, 0.5)'), opacity=0.5))
+    fig.add_trace(Scatter(x=buy_x, y=history.close[buy_x], mode='markers', marker=dict(color='green', size=9), name='Buy Signal'))
+    fig.add_trace(Scatter(x=sell_x, y=history.close[sell_x], mode='markers', marker=dict(color='red', size=9), name='Sell Signal'))
+    mx, my = line(history.min_range)
+    fig.add_trace(Scatter(x=mx, y=my, mode='lines', line=dict(color='gray'), name='Min Range'))
+    mx, my = line(history.max_range)
+    fig.add_trace(Scatter(x=mx, y=my, mode='lines', line=dict(color='black'), name='Max Range'))
+    # Stop/go/bad levels are only recorded on some bars; join the recorded points
+    sx, sy = line(history.stop_price)
+    fig.add_trace(Scatter(x=sx, y=sy, mode='lines', connectgaps=True, line=dict(color='purple'), name='Stop Price'))
+    gx, gy = line(history.go_price)
+    fig.add_trace(Scatter(x=gx, y=gy, mode='lines', connectgaps=True, line=dict(color='orange'), name='Go Price'))
+    bx, by = line(history.bad_price)
+    fig.add_trace(Scatter(x=bx, y=by, mode='lines', connectgaps=True, line=dict(color='pink'), name='Bad Price'))
+
+    fig.update_layout(title=title, xaxis_title='Time', yaxis_title='$')
+    return fig
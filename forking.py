@@ -0,0 +1,239 @@
+"""
+Prefix-sharing simulation of many parameter combinations.
+
+All combinations start in the same state, and the strategy state itself
+(coin, cash, highest price since the last buy, last buy/sell prices and the
+trade counters) depends only on which bars were traded on. The parameters
+only decide whether a bar is traded on. So a group of combinations that
+have traded identically so far is simulated as one, and the group forks
+into two only on a bar where some of its members trade and others do not.
+
+A bar is checked against the group's extreme members first: rolling min/max
+ranges are monotonic in the window size and the stop/go/bad levels are
+monotonic in their percentages, so if the most and least eager members
+agree, every member does, and only ambiguous bars are evaluated member by
+member. Results are identical to simulate_batch(); with risk the risk
+metrics are computed once per final group, from the trades it made.
+"""
+
+from array import array
+
+import numpy as np
+
+from engine import NO_RISK_METRICS, SimulationResult, risk_metrics
+from rolling import RollingIndex
+
+
+class _Group:
+    """Shared strategy state of combinations that have traded identically so far."""
+    __slots__ = ('members', 'start', 'coin', 'cash', 'highest_price', 'last_buy_price', 'last_sell_price', 'trades',
+                 'buy_good', 'buy_bad', 'sell_good', 'sell_bad', 'win_total', 'win_count', 'loss_total', 'loss_count', 'trade_bars', 'trade_values')
+
+    def fork(self, members, start):
+        group = _Group()
+        for name in self.__slots__:
+            setattr(group, name, getattr(self, name))
+        group.trade_bars = array('q', self.trade_bars)
+        group.trade_values = array('d', self.trade_values)
+        group.members = members
+        group.start = start
+        return group
+
+
+def simulate_forking(bars, window_size, start_coin, start_cash, max_window_size, params, rolling=None, stats=None, periods_per_year=None, risk=True):
+    """
+    Runs many parameter combinations, simulating shared trade paths once.
+
+    Takes the same arguments as simulate_batch(). If stats is a dict, it
+    receives 'bar_steps' (bars simulated over all groups), 'independent_bar_steps'
+    (bars the combinations would take one by one) and 'groups' (groups at the end).
+
+    Returns:
+        list with one SimulationResult per combination, identical to
+        simulate_batch()
+    """
+    params = list(params)
+    stop_p = np.array([p[0] for p in params], dtype=np.float64)
+    buy_w = np.array([p[1] for p in params], dtype=np.int64)
+    sell_w = np.array([p[2] for p in params], dtype=np.int64)
+    go_p = np.array([p[3] for p in params], dtype=np.float64)
+    bad_p = np.array([p[4] for p in params], dtype=np.float64)
+
+    skipped = max_window_size < np.minimum(buy_w, sell_w)
+    live = np.flatnonzero(~skipped)
+    if np.any(np.maximum(buy_w, sell_w)[live] > max_window_size + 1):
+        raise ValueError(f"window {int(np.maximum(buy_w, sell_w)[live].max())} does not fit before bar {max_window_size}")
+
+    windows = sorted(set(buy_w[live].tolist()) | set(sell_w[live].tolist()))
+    if rolling is None or any(w not in rolling for w in windows):
+        rolling = RollingIndex(bars.close, windows)
+    # Python lists index far faster than NumPy scalars in a per-bar loop
+    min_ranges = {w: rolling.min(w).tolist() for w in set(sell_w[live].tolist())}
+    max_ranges = {w: rolling.max(w).tolist() for w in set(buy_w[live].tolist())}
+    # (bars, windows) tables for evaluating a bar member by member
+    row = {w: k for k, w in enumerate(windows)}
+    min_table = np.column_stack([rolling.min(w) for w in windows]) if windows else np.empty((len(bars), 0))
+    max_table = np.column_stack([rolling.max(w) for w in windows]) if windows else np.empty((len(bars), 0))
+    sell_col = np.array([row.get(w, 0) for w in sell_w.tolist()], dtype=np.intp)
+    buy_col = np.array([row.get(w, 0) for w in buy_w.tolist()], dtype=np.intp)
+    keep_p = 1 - stop_p
+
+    fee = 0.000
+    closes = bars.close.tolist()
+    data_len = len(closes)
+
+    root = _Group()
+    root.members = live
+    root.start = max_window_size
+    root.coin = start_coin
+    root.cash = start_cash
+    root.highest_price = 0.0
+    root.last_buy_price = 0.0
+    root.last_sell_price = 0.0
+    root.trades = root.buy_good = root.buy_bad = root.sell_good = root.sell_bad = 0
+    root.win_total = root.win_count = root.loss_total = root.loss_count = 0
+    root.trade_bars = array('q')
+    root.trade_values = array('d')
+
+    results = [None] * len(params)
+    bar_steps = 0
+    groups = 0
+    stack = [root] if len(live) else []
+    while stack:
+        g = stack.pop()
+        members = g.members
+        # Extreme members of the group: the windows and percentages that trade first and last
+        min_eager = min_ranges[int(sell_w[members].min())]
+        min_lazy = min_ranges[int(sell_w[members].max())]
+        max_eager = max_ranges[int(buy_w[members].min())]
+        max_lazy = max_ranges[int(buy_w[members].max())]
+        keep_eager = float(keep_p[members].max())
+        keep_lazy = float(keep_p[members].min())
+        go_eager = float(go_p[members].min())
+        go_lazy = float(go_p[members].max())
+        bad_eager = float(bad_p[members].max())
+        bad_lazy = float(bad_p[members].min())
+
+        coin = g.coin
+        cash = g.cash
+        highest_price = g.highest_price
+        last_buy_price = g.last_buy_price
+        last_sell_price = g.last_sell_price
+        forked = None
+
+        for i in range(g.start, data_len):
+            close_price = closes[i]
+            decision = 0
+
+            if coin > 0:
+                # Trailing stop logic
+                if close_price > highest_price:
+                    highest_price = close_price
+                entered = last_buy_price > 0
+                if (close_price <= min_lazy[i] or close_price <= highest_price * keep_lazy
+                        or (entered and close_price >= last_buy_price * (1 + go_lazy))):
+                    decision = -1
+                elif (close_price <= min_eager[i] or close_price <= highest_price * keep_eager
+                        or (entered and close_price >= last_buy_price * (1 + go_eager))):
+                    sell = ((close_price <= min_table[i, sell_col[members]]) | (close_price <= highest_price * keep_p[members])
+                            | (entered & (close_price >= last_buy_price * (1 + go_p[members]))))
+                    if sell.all():
+                        decision = -1
+                    elif sell.any():
+                        forked = (i, members[sell], members[~sell])
+
+            elif cash > 0:
+                exited = last_sell_price > 0
+                if close_price >= max_lazy[i] or (exited and close_price <= last_sell_price * (1 + bad_lazy)):
+                    decision = 1
+                elif close_price >= max_eager[i] or (exited and close_price <= last_sell_price * (1 + bad_eager)):
+                    buy = (close_price >= max_table[i, buy_col[members]]) | (exited & (close_price <= last_sell_price * (1 + bad_p[members])))
+                    if buy.all():
+                        decision = 1
+                    elif buy.any():
+                        forked = (i, members[buy], members[~buy])
+
+            if forked is not None:
+                break
+            bar_steps += 1
+
+            if decision == -1:
+                cash = coin * close_price * (1 - fee)
+                g.trades += 1
+                coin = 0.0
+                if risk:
+                    g.trade_bars.append(i)
+                    g.trade_values.append(cash)
+                if last_buy_price > 0:
+                    curr_profit = close_price - last_buy_price
+                    if curr_profit >= 0:
+                        g.sell_good += 1
+                        g.win_total += curr_profit
+                        g.win_count += 1
+                    else:
+                        g.sell_bad += 1
+                        g.loss_total += curr_profit
+                        g.loss_count += 1
+                last_sell_price = close_price
+            elif decision == 1:
+                coin = cash / close_price * (1 - fee)
+                highest_price = close_price  # Reset highest price after buying
+                cash = 0.0
+                g.trades += 1
+                if risk:
+                    g.trade_bars.append(i)
+                    g.trade_values.append(coin)
+                if last_sell_price > 0:
+                    curr_profit = close_price - last_sell_price
+                    if curr_profit >= 0:
+                        g.buy_good += 1
+                    else:
+                        g.buy_bad += 1
+                last_buy_price = close_price
+
+        g.coin = coin
+        g.cash = cash
+        g.highest_price = highest_price
+        g.last_buy_price = last_buy_price
+        g.last_sell_price = last_sell_price
+
+        if forked is not None:
+            # Both halves resume on the diverging bar; each now agrees on it
+            i, trading, waiting = forked
+            stack.append(g.fork(waiting, i))
+            stack.append(g.fork(trading, i))
+            continue
+
+        groups += 1
+        close_price = closes[-1] if data_len > max_window_size else 0.0
+        final_balance = coin + cash / close_price if close_price else float('nan')
+        aver_wins = g.win_total / g.win_count if g.win_count else 0.0
+        aver_losses = g.loss_total / g.loss_count if g.loss_count else 0.0
+        metrics = risk_metrics(bars.close, max_window_size, g.trade_bars, g.trade_values, start_coin, start_cash, periods_per_year) if risk else NO_RISK_METRICS
+        for k in members.tolist():
+            stop_percentage, buy_window, sell_window, go_percentage, bad_percentage = params[k]
+            results[k] = SimulationResult(data_len, coin, cash, final_balance, coin * close_price + cash, g.trades,
+                                          g.buy_good, g.buy_bad, g.sell_good, g.sell_bad, aver_wins, aver_losses,
+                                          window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage, *metrics)
+
+    for k in np.flatnonzero(skipped).tolist():
+        stop_percentage, buy_window, sell_window, go_percentage, bad_percentage = params[k]
+        results[k] = SimulationResult.skipped(window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage)
+
+    if stats is not None:
+        stats['bar_steps'] = bar_steps
+        stats['independent_bar_steps'] = len(live) * max(0, data_len - max_window_size)
+        stats['groups'] = groups
+    return results
+
+
+def format_stats(stats):
+    """
+    Returns:
+        one line with the bar-steps simulated and saved, from the stats of
+        one or more simulate_forking() calls added up
+    """
+    independent = stats['independent_bar_steps']
+    skipped = 1 - stats['bar_steps'] / independent if independent else 0.0
+    return (f"Prefix sharing simulated {stats['bar_steps']} of {independent} bar-steps ({skipped:.1%} skipped) "
+            f"along {stats['groups']} trade paths")
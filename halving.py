@@ -0,0 +1,84 @@
+"""
+Successive-halving search over a parameter grid.
+
+Instead of simulating every combination over the whole series, the search
+runs in rungs over growing prefixes of the data: every configuration is
+evaluated on a short prefix, the best 1/eta of them (by the ranking metric,
+marked to market at the end of the prefix) move on to a prefix eta times
+longer, and so on until the survivors run on the full series. Work is
+counted in bar-steps (simulated bars per configuration) so the report can
+say how much of the exhaustive sweep was skipped.
+"""
+
+import math
+
+from shared_data import run_shared_batch
+from sweep import chunked, rank_value, stream_results
+
+
+def rung_lengths(data_len, max_window_size, rungs, eta):
+    """
+    Returns:
+        increasing prefix lengths (in bars) of the rungs, the last one being data_len
+    """
+    work = data_len - max_window_size
+    lengths = []
+    for rung in range(rungs):
+        length = max_window_size + max(1, math.ceil(work / eta ** (rungs - 1 - rung)))
+        if not lengths or length > lengths[-1]:
+            lengths.append(min(length, data_len))
+    return lengths
+
+
+def evaluate(executor, name, params, length, window_size, start_coin, start_cash, max_window_size, batch_size, max_pending, risk=True):
+    """
+    Simulates params over the first length bars of an attached dataset,
+    with the risk metrics if risk.
+
+    Returns:
+        list of SimulationResult in the order of params
+    """
+    results = [None] * len(params)
+    tasks = (
+        (index, run_shared_batch, (name, window_size, start_coin, start_cash, max_window_size, chunk, length, risk))
+        for index, chunk in chunked(params, batch_size)
+    )
+    for index, batch in stream_results(executor, tasks, max_pending):
+        results[index:index + len(batch)] = batch
+    return results
+
+
+def successive_halving(executor, name, grid, data_len, window_size, start_coin, start_cash, max_window_size, rank_by='final_cash', rungs=3, eta=3, batch_size=256, max_pending=16,
+                       risk=True):
+    """
+    Runs a successive-halving search with the dataset attached as name,
+    computing the risk metrics if risk.
+
+    Returns:
+        (list of (grid index, SimulationResult) of the survivors on the full
+        series, report dict with the rungs and the bar-steps simulated and skipped)
+    """
+    survivors = list(range(len(grid)))
+    report = {'rungs': [], 'exhaustive_steps': len(grid) * (data_len - max_window_size), 'steps': 0}
+    lengths = rung_lengths(data_len, max_window_size, rungs, eta)
+    for rung, length in enumerate(lengths):
+        results = evaluate(executor, name, [grid[k] for k in survivors], length, window_size, start_coin, start_cash, max_window_size, batch_size, max_pending, risk)
+        report['steps'] += len(survivors) * (length - max_window_size)
+        scored = list(zip(survivors, results))
+        if rung == len(lengths) - 1:
+            report['rungs'].append({'length': length, 'configs': len(survivors), 'kept': len(survivors)})
+            report['skipped_steps'] = report['exhaustive_steps'] - report['steps']
+            return scored, report
+        keep = max(1, math.ceil(len(survivors) / eta))
+        # Ties go to the lower grid index, as in the exhaustive sweep
+        scored.sort(key=lambda entry: (-rank_value(entry[1], rank_by), entry[0]))
+        report['rungs'].append({'length': length, 'configs': len(survivors), 'kept': keep})
+        survivors = sorted(index for index, _ in scored[:keep])
+
+
+def format_report(report):
+    lines = [f"Rung {rung}: {entry['configs']} configurations on the first {entry['length']} bars, kept {entry['kept']}"
+             for rung, entry in enumerate(report['rungs'])]
+    skipped = report['skipped_steps'] / report['exhaustive_steps'] if report['exhaustive_steps'] else 0.0
+    lines.append(f"Successive halving simulated {report['steps']} of {report['exhaustive_steps']} bar-steps ({skipped:.1%} skipped)")
+    return '\n'.join(lines)
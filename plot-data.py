@@ -5,10 +5,17 @@ import os
 import pandas as pd
 import plotly.graph_objects as go
 
-def compute_bull_bear_boundaries(input_csv):
+from datasets import load_frame
+from figures import downsample_ohlc
+
+# Candles drawn at most; longer series are merged into wider candles
+DEFAULT_MAX_POINTS = 2000
+
+def compute_bull_bear_boundaries(input_csv, use_cache=True, df=None):
     """
     Reads the CSV file, determines the boundary sample numbers between
-    Bull #1 / Bear / Bull #2, and returns them.
+    Bull #1 / Bear / Bull #2, and returns them. A frame already loaded with
+    load_frame() can be passed as df to skip reading the file again.
 
     Returns:
         (boundary_sample_1, boundary_sample_2, final_sample)
@@ -20,13 +27,13 @@ def compute_bull_bear_boundaries(input_csv):
       (min Close in the second half)
     - final_sample       = the final sample index in the dataset
     """
-    # Read CSV
-    df = pd.read_csv(input_csv)
+    # Read CSV (memory-mapped from the binary dataset cache after the first run)
+    if df is None:
+        df = load_frame(input_csv, use_cache)
 
     # Ensure we have a 0-based "Sample" index
     # so that df["Sample"] goes from 0 to len(df)-1
-    df.reset_index(drop=False, inplace=True)
-    df.rename(columns={"index": "Sample"}, inplace=True)
+    df = df.reset_index(drop=False).rename(columns={"index": "Sample"})
 
     # Split data into first half and second half
     half_idx = len(df) // 2
@@ -45,37 +52,42 @@ def compute_bull_bear_boundaries(input_csv):
     return boundary_sample_1, boundary_sample_2, final_sample
 
 
-def create_plot_figure(input_csv, boundary_sample_1, boundary_sample_2):
+def create_plot_figure(input_csv, boundary_sample_1, boundary_sample_2, use_cache=True, df=None, max_points=None):
     """
     Creates and returns a Plotly Figure with three line segments:
         - Bull #1: from start to boundary_sample_1
         - Bear:    from boundary_sample_1 to boundary_sample_2
         - Bull #2: from boundary_sample_2 to the end
 
-    The figure also contains a candlestick chart of the OHLC data.
+    The figure also contains a candlestick chart of the OHLC data. With
+    max_points, consecutive bars are merged so at most that many candles
+    are drawn; highs and lows are kept. df skips reading the file again, as
+    in compute_bull_bear_boundaries().
 
     Returns:
         plotly.graph_objects.Figure
     """
-    # Read CSV
-    df = pd.read_csv(input_csv)
+    # Read CSV; "Timestamp" headers are loaded as "DateTime"
+    if df is None:
+        df = load_frame(input_csv, use_cache)
 
     # Ensure we have a 0-based "Sample" index
-    df.reset_index(drop=False, inplace=True)
-    df.rename(columns={"index": "Sample"}, inplace=True)
+    df = df.reset_index(drop=False).rename(columns={"index": "Sample"})
 
     # Convert the DateTime column from Unix seconds
     df["DateTime"] = pd.to_datetime(df["DateTime"], unit="s")
 
     # Build candlestick chart
+    time, open_, high, low, close = downsample_ohlc(df["DateTime"].to_numpy(), df["Open"].to_numpy(), df["High"].to_numpy(),
+                                                    df["Low"].to_numpy(), df["Close"].to_numpy(), max_points)
     fig = go.Figure(
         data=[
             go.Candlestick(
-                x=df["DateTime"],
-                open=df["Open"],
-                high=df["High"],
-                low=df["Low"],
-                close=df["Close"],
+                x=time,
+                open=open_,
+                high=high,
+                low=low,
+                close=close,
                 name="OHLC"
             )
         ]
@@ -144,6 +156,42 @@ def create_plot_figure(input_csv, boundary_sample_1, boundary_sample_2):
     return fig
 
 
+def save_figure(fig, output_file, include_plotlyjs=True):
+    """
+    Writes a figure as HTML or, for any other extension, as a static image.
+    include_plotlyjs is passed to write_html(); 'directory' shares one
+    plotly.min.js between the HTML files of a directory.
+    """
+    _, extension = os.path.splitext(output_file)
+    extension = extension.lower()
+
+    if extension == ".html":
+        fig.write_html(output_file, include_plotlyjs=include_plotlyjs)
+        print(f"Chart saved as HTML to: {output_file}")
+    else:
+        # For static images, you need kaleido installed:
+        #   pip install kaleido
+        fig.write_image(output_file, width=1920, height=1080, scale=2)
+        print(f"Chart saved as an image to: {output_file}")
+
+
+def plot_dataset(input_csv, output_file=None, use_cache=True, max_points=DEFAULT_MAX_POINTS, show_figure=False, include_plotlyjs=True):
+    """
+    Loads a dataset once, computes its bull/bear boundaries and plots them.
+
+    Returns:
+        (boundary_sample_1, boundary_sample_2, final_sample)
+    """
+    df = load_frame(input_csv, use_cache)
+    boundary_sample_1, boundary_sample_2, final_sample = compute_bull_bear_boundaries(input_csv, use_cache, df)
+    fig = create_plot_figure(input_csv, boundary_sample_1, boundary_sample_2, use_cache, df, max_points)
+    if show_figure:
+        fig.show()
+    if output_file:
+        save_figure(fig, output_file, include_plotlyjs)
+    return boundary_sample_1, boundary_sample_2, final_sample
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Plot OHLC data, mark bull/bear segments, and optionally show/save the figure."
@@ -152,11 +200,17 @@ def main():
     parser.add_argument("output_file", nargs="?", default=None, help="Optional output filename (HTML or image).")
     parser.add_argument("--show-figure", action="store_true", default=False,
                         help="If set, display the Plotly figure on screen.")
+    parser.add_argument("--max-points", type=int, default=DEFAULT_MAX_POINTS,
+                        help=f"Merge bars so at most this many candles are drawn (default {DEFAULT_MAX_POINTS}; 0 draws every bar).")
+    parser.add_argument("--no-cache", action="store_true", default=False,
+                        help="Parse the CSV file instead of using the binary dataset cache.")
 
     args = parser.parse_args()
 
-    # 1. Compute boundary samples
-    boundary_sample_1, boundary_sample_2, final_sample = compute_bull_bear_boundaries(args.input_csv)
+    # 1. Load the dataset once and compute boundary samples
+    use_cache = not args.no_cache
+    df = load_frame(args.input_csv, use_cache)
+    boundary_sample_1, boundary_sample_2, final_sample = compute_bull_bear_boundaries(args.input_csv, use_cache, df)
 
     # Print them
     print(f"Bull Market #1: start sample = 0, end sample = {boundary_sample_1}")
@@ -164,7 +218,7 @@ def main():
     print(f"Bull Market #2: start sample = {boundary_sample_2}, end sample = {final_sample}")
 
     # 2. Create plot figure
-    fig = create_plot_figure(args.input_csv, boundary_sample_1, boundary_sample_2)
+    fig = create_plot_figure(args.input_csv, boundary_sample_1, boundary_sample_2, use_cache, df, args.max_points or None)
 
     # 3. Show figure if requested
     if args.show_figure:
@@ -172,18 +226,7 @@ def main():
 
     # 4. Save figure if output file is specified
     if args.output_file:
-        _, extension = os.path.splitext(args.output_file)
-        extension = extension.lower()
-
-        if extension == ".html":
-            fig.write_html(args.output_file)
-            print(f"Chart saved as HTML to: {args.output_file}")
-        else:
-            # For static images, you need kaleido installed:
-            #   pip install kaleido
-            fig.write_image(args.output_file, width=1920, height=1080, scale=2)
-            print(f"Chart saved as an image to: {args.output_file}")
-
+        save_figure(fig, args.output_file)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import glob
+import importlib.util
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from datasets import load_bars
+from engine import simulate_history
+from figures import simulation_figure
+from sweep import RANK_METRICS, oriented_value
+
+
+def _load_plot_data():
+    """
+    Returns:
+        the plot-data.py module
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plot-data.py')
+    spec = importlib.util.spec_from_file_location('plot_data', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+plot_data = _load_plot_data()
+
+
+def render_dataset(input_csv, output_file, use_cache, max_points):
+    """
+    Plots one dataset with its bull/bear segments, as plot-data.py does.
+
+    Returns:
+        output_file
+    """
+    plot_data.plot_dataset(input_csv, output_file, use_cache, max_points, include_plotlyjs='directory')
+    return output_file
+
+
+def render_configuration(data_file, use_cache, max_window_size, start_coin, start_cash, params, output_dir, max_points, webgl):
+    """
+    Replays one configuration with full history and writes its figure.
+
+    Returns:
+        path of the HTML file
+    """
+    window_size, stop_percentage, buy_window, sell_window, go_percentage, bad_percentage = params
+    bars = load_bars(data_file, use_cache)
+    result, history = simulate_history(bars, window_size, start_coin, start_cash, False, stop_percentage, max_window_size,
+                                       buy_window, sell_window, go_percentage, bad_percentage)
+    title = ('Simulation Results: buy_window='+str(buy_window)+' sell_window='+str(sell_window)+' stop='+str(stop_percentage)+' go='+str(go_percentage)
+             +' bad='+str(bad_percentage)+' trades='+str(result.trades)+' balance=$'+str(round(result.final_cash,2)))
+    output_file = os.path.join(output_dir, 'results-'+os.path.splitext(os.path.basename(data_file))[0]+'-bw'+str(buy_window)+'-sw'+str(sell_window)
+                               +'-s'+str(stop_percentage)+'-g'+str(go_percentage)+'-b'+str(bad_percentage)+'.html')
+    simulation_figure(history, title, max_points, webgl).write_html(output_file, include_plotlyjs='directory')
+    return output_file
+
+
+def top_configurations(results_csv, rank_by, top):
+    """
+    Reads a --results-csv file and picks its best configurations.
+
+    Returns:
+        list of (start_coin, start_cash, (window_size, stop, buy_window, sell_window, go, bad)), best first
+    """
+    with open(results_csv, newline='') as f:
+        rows = list(csv.DictReader(f))
+    # Stable sort: ties keep their order in the file
+    rows.sort(key=lambda row: oriented_value(rank_by, float(row[rank_by])), reverse=True)
+    return [(float(row['start_coin']), float(row['start_cash']),
+             (int(row['window_size']), float(row['stop_percentage']), int(row['buy_window']), int(row['sell_window']),
+              float(row['go_percentage']), float(row['bad_percentage'])))
+            for row in rows[:top]]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Render figures for many datasets or configurations in parallel."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    datasets = commands.add_parser("datasets", help="Plot the OHLC candles and bull/bear segments of each dataset, as plot-data.py does.")
+    datasets.add_argument("output_dir", help="Directory for the HTML files.")
+    datasets.add_argument("datasets", nargs='+', help="CSV files or glob patterns.")
+
+    configs = commands.add_parser("configs", help="Replay the best configurations of a sweep and plot each one.")
+    configs.add_argument("output_dir", help="Directory for the HTML files.")
+    configs.add_argument("data_file", help="Path to the input CSV file the sweep ran on.")
+    configs.add_argument("results_csv", help="Results of the sweep, written with --results-csv.")
+    configs.add_argument("max_window_size", type=int, help="max_window_size of the sweep (the first simulated bar).")
+    configs.add_argument("--top", type=int, default=10, help="Number of configurations to plot.")
+    configs.add_argument("--rank-by", choices=sorted(RANK_METRICS), default='final_cash', help="Metric used to rank configurations (max_drawdown and exposure rank lowest first).")
+    configs.add_argument("--no-webgl", action="store_true", default=False, help="Draw with SVG instead of WebGL traces.")
+
+    for command in (datasets, configs):
+        command.add_argument("--workers", type=int, default=os.cpu_count(), help="Figures rendered in parallel (default: one per CPU).")
+        command.add_argument("--max-points", type=int, default=None,
+                             help="Downsample to at most this many candles or line points (default 2000 candles / 4000 points; 0 keeps every bar).")
+        command.add_argument("--no-cache", action="store_true", default=False,
+                             help="Parse the CSV file instead of using the binary dataset cache.")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    use_cache = not args.no_cache
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        if args.command == 'datasets':
+            max_points = plot_data.DEFAULT_MAX_POINTS if args.max_points is None else args.max_points or None
+            paths = [path for pattern in args.datasets for path in (sorted(glob.glob(pattern)) or [pattern])]
+            futures = [executor.submit(render_dataset, path, os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0] + '.html'),
+                                       use_cache, max_points)
+                       for path in paths]
+        else:
+            max_points = 4000 if args.max_points is None else args.max_points or None
+            futures = [executor.submit(render_configuration, args.data_file, use_cache, args.max_window_size, start_coin, start_cash,
+                                       params, args.output_dir, max_points, not args.no_webgl)
+                       for start_coin, start_cash, params in top_configurations(args.results_csv, args.rank_by, args.top)]
+        for future in futures:
+            output_file = future.result()
+            if args.command == 'configs':
+                print(f"Wrote {output_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
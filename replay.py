@@ -0,0 +1,153 @@
+"""
+Re-pricing of recorded trade logs under other fees, slippage and starting capital.
+
+Which bars a configuration trades on does not depend on the fee or on the
+size of its balances, only on the prices and on whether it holds coin. So a
+sweep can be simulated once with TradeLogs recorded, and every (fee,
+slippage, start_coin, start_cash) variant is then a replay of the fills.
+replay() advances all logs and all variants together, one trade at a time,
+as masked (logs, variants) array updates; with no fee and no slippage it
+reproduces the simulation's balances exactly.
+
+Slippage moves the fill price against the trade (buys fill at
+price * (1 + slippage), sells at price * (1 - slippage)); the strategy's
+signals and its win/loss statistics stay on the close prices.
+"""
+
+import itertools
+import json
+from typing import NamedTuple
+
+import numpy as np
+
+from engine import TradeLog
+
+
+class Variant(NamedTuple):
+    fee: float
+    slippage: float
+    start_coin: float
+    start_cash: float
+
+
+def variant_grid(fees=(0.0,), slippages=(0.0,), start_coins=(0.0,), start_cashes=(1000.0,)):
+    """
+    Returns:
+        list of Variant, every combination of the given values
+    """
+    return [Variant(*values) for values in itertools.product(fees, slippages, start_coins, start_cashes)]
+
+
+def check_variants(variants, holding=None):
+    """
+    Raises ValueError unless every variant can replay logs recorded holding
+    coin at the start (holding) or only cash: fee and slippage must be in
+    [0, 1), and the first decision depends on the starting position, which
+    is not checked if holding is None.
+    """
+    for variant in variants:
+        if not (0 <= variant.fee < 1 and 0 <= variant.slippage < 1):
+            raise ValueError(f"fee and slippage must be in [0, 1), got {variant.fee} and {variant.slippage}")
+        if holding is None:
+            continue
+        if holding != (variant.start_coin > 0) or (not holding and variant.start_cash <= 0):
+            raise ValueError(f"{variant} does not start in the position the logs were recorded from "
+                             f"({'holding coin' if holding else 'holding cash only'})")
+
+
+def _check(logs, variants):
+    for holding in set(log.holding for log in logs) or {None}:
+        check_variants(variants, holding)
+
+
+def replay(logs, variants):
+    """
+    Replays every log under every variant.
+
+    Returns:
+        dict of (len(logs), len(variants)) float64 arrays: end_coin,
+        end_cash, final_balance and final_cash, as in SimulationResult
+    """
+    variants = list(variants)
+    _check(logs, variants)
+    fee = np.array([v.fee for v in variants])
+    slippage = np.array([v.slippage for v in variants])
+    lengths = np.array([len(log) for log in logs], dtype=np.int64)
+    steps = int(lengths.max()) if len(logs) else 0
+
+    # (logs, trades) tables padded with side 0 past the end of each log
+    side = np.zeros((len(logs), steps), dtype=np.int8)
+    price = np.zeros((len(logs), steps))
+    for k, log in enumerate(logs):
+        side[k, :len(log)] = log.side
+        price[k, :len(log)] = log.price
+    last_close = np.array([log.last_close for log in logs])
+
+    coin = np.tile(np.array([v.start_coin for v in variants], dtype=np.float64), (len(logs), 1))
+    cash = np.tile(np.array([v.start_cash for v in variants], dtype=np.float64), (len(logs), 1))
+    sell_factor = 1 - slippage
+    buy_factor = 1 + slippage
+    keep = 1 - fee
+
+    for t in range(steps):
+        sells = np.flatnonzero(side[:, t] == -1)
+        if len(sells):
+            fill = price[sells, t][:, None] * sell_factor
+            cash[sells] = coin[sells] * fill * keep
+            coin[sells] = 0.0
+        buys = np.flatnonzero(side[:, t] == 1)
+        if len(buys):
+            fill = price[buys, t][:, None] * buy_factor
+            coin[buys] = cash[buys] / fill * keep
+            cash[buys] = 0.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final_balance = coin + cash / last_close[:, None]
+        final_cash = coin * last_close[:, None] + cash
+    return {'end_coin': coin, 'end_cash': cash, 'final_balance': final_balance, 'final_cash': final_cash}
+
+
+def save_logs(path, params, logs, settings=None):
+    """
+    Saves the trade logs of a sweep, with their parameter tuples, to one .npz
+    file. settings is a JSON-serializable dict of what the logs were recorded
+    from (see log_settings()), stored with them so load_logs() callers can
+    check it.
+    """
+    offsets = np.zeros(len(logs) + 1, dtype=np.int64)
+    np.cumsum([len(log) for log in logs], out=offsets[1:])
+    np.savez(path,
+             params=np.array(params, dtype=np.float64).reshape(len(params), 5),
+             offsets=offsets,
+             index=np.concatenate([log.index for log in logs]) if logs else np.empty(0, dtype=np.int64),
+             side=np.concatenate([log.side for log in logs]) if logs else np.empty(0, dtype=np.int8),
+             price=np.concatenate([log.price for log in logs]) if logs else np.empty(0),
+             holding=np.array([log.holding for log in logs], dtype=bool),
+             last_close=np.array([log.last_close for log in logs]),
+             settings=np.array(json.dumps(settings or {})))
+
+
+def log_settings(dataset_hash, start_coin, start_cash, max_window_size):
+    """
+    Returns:
+        dict of the inputs a sweep's trade logs depend on, for save_logs()
+    """
+    return {'dataset': dataset_hash, 'start_coin': float(start_coin), 'start_cash': float(start_cash), 'max_window_size': int(max_window_size)}
+
+
+def load_logs(path):
+    """
+    Returns:
+        (list of parameter tuples, list of TradeLog, settings dict) saved by
+        save_logs(); settings is None for files saved without them
+    """
+    with np.load(path) as data:
+        # Every data[...] access reads the array from the file again: read each one once
+        arrays = {name: data[name] for name in data.files}
+    params = [(stop, int(bw), int(sw), go, bad) for stop, bw, sw, go, bad in arrays['params'].tolist()]
+    offsets = arrays['offsets'].tolist()
+    index, side, price = arrays['index'], arrays['side'], arrays['price']
+    logs = [TradeLog(index[a:b], side[a:b], price[a:b], holding, last_close)
+            for a, b, holding, last_close in zip(offsets[:-1], offsets[1:], arrays['holding'].tolist(), arrays['last_close'].tolist())]
+    settings = json.loads(arrays['settings'].item()) if 'settings' in arrays else None
+    return params, logs, settings or None
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from engine import OHLCV_COLUMNS
+
+DAY = 86400
+
+# First day of halving cycles 2 to 5 (cycle 1 starts with the data), as in the data/ files
+CYCLE_STARTS = ('2012-11-28', '2016-07-09', '2020-05-11', '2024-04-19')
+
+TIMEFRAMES = ('1D', '5D', '1W', '1ME', '3ME')
+
+# Raw column names accepted for each field, compared case-insensitively
+TIME_NAMES = ('datetime', 'timestamp', 'time', 'date', 'unix', 'open_time')
+FIELD_NAMES = {
+    'Open': ('open',),
+    'High': ('high',),
+    'Low': ('low',),
+    'Close': ('close',),
+    'Volume': ('volume', 'volume_btc', 'amount', 'size', 'qty', 'quantity'),
+}
+PRICE_NAMES = ('price', 'last')
+
+
+def resolve_columns(header):
+    """
+    Maps the raw file's header onto the fields needed.
+
+    Returns:
+        (time column, {OHLCV field: raw column}); for tick data without
+        OHLC columns all four prices map to the price column
+    """
+    lower = {name.lower().strip(): name for name in header}
+
+    def find(names):
+        return next((lower[name] for name in names if name in lower), None)
+
+    time_column = find(TIME_NAMES)
+    if time_column is None:
+        raise ValueError(f"no time column, expected one of {', '.join(TIME_NAMES)}")
+    fields = {field: find(names) for field, names in FIELD_NAMES.items()}
+    if any(fields[field] is None for field in ('Open', 'High', 'Low', 'Close')):
+        price = find(PRICE_NAMES)
+        if price is None:
+            raise ValueError("no OHLC or price columns")
+        for field in ('Open', 'High', 'Low', 'Close'):
+            fields[field] = price
+    if fields['Volume'] is None:
+        raise ValueError(f"no volume column, expected one of {', '.join(FIELD_NAMES['Volume'])}")
+    return time_column, fields
+
+
+def to_seconds(values):
+    """
+    Converts a raw time column (Unix seconds, ms, us or ns, or date strings) to int64 Unix seconds.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        values = values.to_numpy(dtype=np.float64)
+        scale = 1
+        magnitude = np.nanmax(np.abs(values)) if len(values) else 0
+        for threshold, divisor in ((1e17, 10 ** 9), (1e14, 10 ** 6), (1e11, 10 ** 3)):
+            if magnitude >= threshold:
+                scale = divisor
+                break
+        return np.floor(values / scale).astype(np.int64)
+    # Parsed strings get the resolution pandas infers (us, ms, ...), so count seconds from the epoch instead
+    return ((pd.to_datetime(values, utc=True) - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+
+
+def aggregate_days(path, chunk_rows=1_000_000):
+    """
+    Streams a raw minute or tick file in chunks of chunk_rows rows and
+    aggregates it into UTC daily bars. Memory is bounded by one chunk plus
+    one entry per day, whatever the file size; rows need not be sorted.
+
+    Returns:
+        dict of int64 "day" (days since the epoch) and float64 OHLCV arrays, by day
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    time_column, fields = resolve_columns(header)
+    usecols = sorted({time_column, *fields.values()})
+    # day -> [first second, open, high, low, last second, close, volume]
+    days = {}
+    # round_trip parses every price to the exact double it was written from
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows, float_precision='round_trip'):
+        seconds = to_seconds(chunk[time_column])
+        frame = pd.DataFrame({'t': seconds, **{field: chunk[column].to_numpy(dtype=np.float64) for field, column in fields.items()}})
+        frame = frame.dropna().sort_values('t', kind='stable')
+        frame['day'] = frame['t'] // DAY
+        grouped = frame.groupby('day', sort=True).agg(t0=('t', 'first'), Open=('Open', 'first'), High=('High', 'max'), Low=('Low', 'min'),
+                                                      t1=('t', 'last'), Close=('Close', 'last'), Volume=('Volume', 'sum'))
+        for day, t0, o, h, l, t1, c, v in grouped.itertuples(name=None):
+            entry = days.get(day)
+            if entry is None:
+                days[day] = [t0, o, h, l, t1, c, v]
+                continue
+            # A day split across chunks
+            if t0 < entry[0]:
+                entry[0], entry[1] = t0, o
+            entry[2] = max(entry[2], h)
+            entry[3] = min(entry[3], l)
+            if t1 >= entry[4]:
+                entry[4], entry[5] = t1, c
+            entry[6] += v
+    order = sorted(days)
+    return {
+        'day': np.array(order, dtype=np.int64),
+        'Open': np.array([days[d][1] for d in order]),
+        'High': np.array([days[d][2] for d in order]),
+        'Low': np.array([days[d][3] for d in order]),
+        'Close': np.array([days[d][5] for d in order]),
+        'Volume': np.array([days[d][6] for d in order]),
+    }
+
+
+def _month_index(day):
+    date = datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))
+    return date.year * 12 + date.month - 1
+
+
+def _month_end(month):
+    year, month = divmod(month + 1, 12)
+    return (datetime.date(year, month + 1, 1) - datetime.date(1970, 1, 1)).days - 1
+
+
+def bin_labels(days, timeframe):
+    """
+    Labels every daily bar with the day its timeframe bar is stamped with,
+    following the pandas resample conventions of the data/ files: 5D bins
+    start on the first day and carry their first day; weeks run Monday to
+    Sunday and carry the Sunday; months carry their last day; 3-month bins
+    end on the first month and every third month after it.
+
+    Returns:
+        int64 array of label days
+    """
+    if timeframe == '1D':
+        return days
+    if timeframe == '5D':
+        return days[0] + (days - days[0]) // 5 * 5
+    if timeframe == '1W':
+        # 1970-01-01 was a Thursday: Monday-based weekday is (day + 3) % 7
+        return days + 6 - (days + 3) % 7
+    months = np.array([_month_index(day) for day in days.tolist()])
+    if timeframe == '1ME':
+        return np.array([_month_end(month) for month in months.tolist()], dtype=np.int64)
+    if timeframe == '3ME':
+        first = months[0]
+        ends = first + -(-(months - first) // 3) * 3
+        return np.array([_month_end(month) for month in ends.tolist()], dtype=np.int64)
+    raise ValueError(f"unknown timeframe {timeframe}, expected one of {', '.join(TIMEFRAMES)}")
+
+
+def resample(daily, timeframe):
+    """
+    Aggregates daily bars into a timeframe.
+
+    Returns:
+        dict with an int64 Unix-seconds time column and float64 OHLCV arrays
+    """
+    labels = bin_labels(daily['day'], timeframe)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+    return {
+        'time': labels[starts] * DAY,
+        'Open': daily['Open'][starts],
+        'High': np.maximum.reduceat(daily['High'], starts),
+        'Low': np.minimum.reduceat(daily['Low'], starts),
+        'Close': daily['Close'][ends],
+        'Volume': np.add.reduceat(daily['Volume'], starts),
+    }
+
+
+def split_cycles(daily, starts=CYCLE_STARTS):
+    """
+    Returns:
+        list of (cycle number, daily bars of the cycle), without empty cycles
+    """
+    bounds = [(datetime.date.fromisoformat(start) - datetime.date(1970, 1, 1)).days for start in starts]
+    edges = np.searchsorted(daily['day'], bounds)
+    cycles = []
+    for number, (a, b) in enumerate(zip(np.r_[0, edges], np.r_[edges, len(daily['day'])]), 1):
+        if b > a:
+            cycles.append((number, {name: values[a:b] for name, values in daily.items()}))
+    return cycles
+
+
+def write_bars(path, bars, timeframe, output_format):
+    """
+    Writes bars in the backtester's CSV schema ("DateTime" for daily bars,
+    "Timestamp" otherwise) or as an .npz file the backtester loads directly.
+    """
+    time_name = 'DateTime' if timeframe == '1D' or output_format == 'npz' else 'Timestamp'
+    columns = {time_name: bars['time'], **{name: bars[name] for name in OHLCV_COLUMNS}}
+    if output_format == 'npz':
+        np.savez(path, **columns)
+    else:
+        pd.DataFrame(columns).to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Aggregate a raw CRYPTEX minute or tick export into the backtester's 1D/5D/1W/1ME/3ME bar files in one streaming pass."
+    )
+    parser.add_argument("input_file", help="Raw CSV export (optionally .gz/.zip compressed) with a time column and OHLCV or price/volume columns.")
+    parser.add_argument("output_dir", help="Directory for the bar files.")
+    parser.add_argument("--name", default="btc", help="File name prefix (default: btc).")
+    parser.add_argument("--timeframes", nargs='+', choices=TIMEFRAMES, default=list(TIMEFRAMES),
+                        help="Timeframes to write (default: all).")
+    parser.add_argument("--split-cycles", action="store_true",
+                        help="Also write one set of files per halving cycle.")
+    parser.add_argument("--format", choices=('csv', 'npz'), default='csv',
+                        help="csv (the data/ schema) or npz (binary columns, loaded directly by the backtester).")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000,
+                        help="Raw rows read per chunk; bounds the memory used (default: 1000000).")
+    args = parser.parse_args()
+
+    daily = aggregate_days(args.input_file, args.chunk_rows)
+    if not len(daily['day']):
+        parser.error(f"{args.input_file} has no rows")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    first_year = (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(daily['day'][0]))).year
+    last_year = (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(daily['day'][-1]))).year
+    series = [(f"{args.name}_{first_year}-{last_year}", daily)]
+    if args.split_cycles:
+        series += [(f"{args.name}_cycle{number}", cycle) for number, cycle in split_cycles(daily)]
+
+    for prefix, bars in series:
+        for timeframe in args.timeframes:
+            path = os.path.join(args.output_dir, f"{prefix}_{timeframe}.{args.format}")
+            resampled = resample(bars, timeframe)
+            write_bars(path, resampled, timeframe, args.format)
+            print(f"{path}: {len(resampled['time'])} bars")
+
+
+if __name__ == "__main__":
+    main()
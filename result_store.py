@@ -0,0 +1,140 @@
+"""
+Persistent store of simulation results, so repeated, widened and resumed
+sweeps skip the combinations they have already computed.
+
+Results live in an SQLite database keyed by the dataset's content hash, the
+strategy version, the run settings (start coin/cash, max_window_size,
+window_size) and the full parameter tuple. Rows are committed as they
+arrive, so an interrupted sweep resumes where it stopped.
+"""
+
+import math
+import sqlite3
+
+from engine import RISK_METRICS, STRATEGY_VERSION, SimulationResult
+from sweep import LOWER_IS_BETTER
+
+_KEY_COLUMNS = ('dataset', 'strategy', 'start_coin', 'start_cash', 'max_window_size', 'window_size',
+                'stop_percentage', 'buy_window', 'sell_window', 'go_percentage', 'bad_percentage')
+_RESULT_COLUMNS = ('data_len', 'end_coin', 'end_cash', 'final_balance', 'final_cash', 'trades',
+                   'buy_good', 'buy_bad', 'sell_good', 'sell_bad', 'win_average', 'loss_average') + RISK_METRICS
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS results (
+    dataset TEXT NOT NULL,
+    strategy INTEGER NOT NULL,
+    start_coin REAL NOT NULL,
+    start_cash REAL NOT NULL,
+    max_window_size INTEGER NOT NULL,
+    window_size INTEGER NOT NULL,
+    stop_percentage REAL NOT NULL,
+    buy_window INTEGER NOT NULL,
+    sell_window INTEGER NOT NULL,
+    go_percentage REAL NOT NULL,
+    bad_percentage REAL NOT NULL,
+    data_file TEXT,
+    {', '.join(f'{name} REAL' for name in _RESULT_COLUMNS)},
+    PRIMARY KEY ({', '.join(_KEY_COLUMNS)})
+) WITHOUT ROWID
+"""
+
+
+class ResultStore:
+    """
+    SQLite-backed result store.
+
+    run_key() fixes everything but the parameter tuple; lookup() and save()
+    then work on SimulationResult records of that run.
+    """
+
+    def __init__(self, path, commit_every=1000):
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(_SCHEMA)
+        # Databases created before the risk metrics lack their columns; their rows are from an older strategy version
+        existing = {row[1] for row in self._db.execute('PRAGMA table_info(results)')}
+        for name in _RESULT_COLUMNS:
+            if name not in existing:
+                self._db.execute(f'ALTER TABLE results ADD COLUMN {name} REAL')
+        self._db.commit()
+        self._commit_every = commit_every
+        self._uncommitted = 0
+
+    @staticmethod
+    def run_key(dataset_hash, start_coin, start_cash, max_window_size, window_size=0):
+        return dataset_hash, STRATEGY_VERSION, float(start_coin), float(start_cash), int(max_window_size), int(window_size)
+
+    def lookup(self, run_key, params, risk=False):
+        """
+        With risk, rows stored without risk metrics (by the pandas engine or
+        by a sweep that did not need them) count as missing, so they are
+        simulated again.
+
+        Returns:
+            dict mapping each stored (stop, buy_window, sell_window, go, bad)
+            tuple of params to its SimulationResult
+        """
+        query = (f"SELECT {', '.join(_RESULT_COLUMNS)} FROM results WHERE "
+                 + ' AND '.join(f'{name} = ?' for name in _KEY_COLUMNS))
+        found = {}
+        for combination in params:
+            row = self._db.execute(query, (*run_key, *combination)).fetchone()
+            # SQLite stores NaN as NULL
+            if row is not None and not (risk and None in row[-len(RISK_METRICS):]):
+                found[tuple(combination)] = self._record(run_key, combination, row)
+        return found
+
+    def save(self, run_key, results, data_file=None):
+        """
+        Stores SimulationResult records, committing every commit_every rows.
+        """
+        columns = _KEY_COLUMNS + ('data_file',) + _RESULT_COLUMNS
+        self._db.executemany(
+            f"INSERT OR REPLACE INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [(*run_key, *result.params, data_file, *(getattr(result, name) for name in _RESULT_COLUMNS)) for result in results])
+        self._uncommitted += len(results)
+        if self._uncommitted >= self._commit_every:
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+
+    def best(self, metric='final_cash', limit=10, dataset_hash=None):
+        """
+        Bulk query of the best stored configurations across past runs.
+
+        Returns:
+            list of (data_file, run settings dict, SimulationResult), best first
+        """
+        if metric not in _RESULT_COLUMNS:
+            raise ValueError(f"unknown metric {metric!r}")
+        where, args = ('WHERE dataset = ? AND strategy = ?', (dataset_hash, STRATEGY_VERSION)) if dataset_hash else ('WHERE strategy = ?', (STRATEGY_VERSION,))
+        rows = self._db.execute(
+            f"SELECT {', '.join(_KEY_COLUMNS)}, data_file, {', '.join(_RESULT_COLUMNS)} FROM results {where} ORDER BY {metric} IS NULL, {metric} {'ASC' if metric in LOWER_IS_BETTER else 'DESC'} LIMIT ?",
+            (*args, limit)).fetchall()
+        best = []
+        for row in rows:
+            key, data_file, values = row[:len(_KEY_COLUMNS)], row[len(_KEY_COLUMNS)], row[len(_KEY_COLUMNS) + 1:]
+            settings = dict(zip(_KEY_COLUMNS[2:6], key[2:6]))
+            best.append((data_file, settings, self._record(key[:6], key[6:], values)))
+        return best
+
+    @staticmethod
+    def _record(run_key, params, values):
+        stop_percentage, buy_window, sell_window, go_percentage, bad_percentage = params
+        data_len, end_coin, end_cash, final_balance, final_cash, trades, buy_good, buy_bad, sell_good, sell_bad, win_average, loss_average = values[:12]
+        return SimulationResult(int(data_len), end_coin, end_cash, final_balance, final_cash, int(trades),
+                                int(buy_good), int(buy_bad), int(sell_good), int(sell_bad), win_average, loss_average,
+                                run_key[5], stop_percentage, buy_window, sell_window, go_percentage, bad_percentage,
+                                *(math.nan if value is None else value for value in values[12:]))
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
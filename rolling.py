@@ -0,0 +1,95 @@
+"""
+Rolling min/max index shared by every simulation over one dataset.
+
+run_simulation compares each close price against the min of the last
+sell_window closes and the max of the last buy_window closes. Instead of
+slicing the window on every bar of every grid task, the index precomputes
+both series once per dataset for every window in the sweep, using a sparse
+table: O(n log W) to build the power-of-two levels, then O(n) per window.
+"""
+
+import numpy as np
+
+
+def _sparse_table(values, reduce, max_window):
+    """
+    Builds the power-of-two levels of a sparse table.
+
+    Returns:
+        list where level k holds reduce() over values[j:j + 2**k] at index j
+    """
+    levels = [values]
+    span = 1
+    while span * 2 <= max_window:
+        prev = levels[-1]
+        levels.append(reduce(prev[:-span], prev[span:]))
+        span *= 2
+    return levels
+
+
+def _rolling(levels, reduce, window, n):
+    """
+    Queries a sparse table for every window of the given size.
+
+    Returns:
+        float64 array where index i holds reduce() over values[i - window + 1:i + 1];
+        indexes before the first full window are NaN
+    """
+    out = np.full(n, np.nan)
+    if window > n:
+        return out
+    k = window.bit_length() - 1
+    level = levels[k]
+    span = 1 << k
+    # window [s, s + window) is covered by [s, s + span) and [s + window - span, s + window)
+    starts = n - window + 1
+    out[window - 1:] = reduce(level[:starts], level[window - span:window - span + starts])
+    return out
+
+
+class RollingIndex:
+    """
+    Rolling min and max of a close-price series for a set of window sizes.
+
+    min(w)[i] equals min(close[i - w + 1:i + 1]) and max(w)[i] equals
+    max(close[i - w + 1:i + 1]) for every i >= w - 1.
+    """
+
+    def __init__(self, close, windows):
+        close = np.ascontiguousarray(close, dtype=np.float64)
+        self.windows = sorted(set(int(w) for w in windows))
+        if self.windows and self.windows[0] < 1:
+            raise ValueError(f"window sizes must be at least 1, got {self.windows[0]}")
+        n = len(close)
+        max_window = self.windows[-1] if self.windows else 1
+        min_levels = _sparse_table(close, np.minimum, max_window)
+        max_levels = _sparse_table(close, np.maximum, max_window)
+        # (windows, bars) tables, one contiguous row per window
+        self.min_table = np.empty((len(self.windows), n))
+        self.max_table = np.empty((len(self.windows), n))
+        for k, w in enumerate(self.windows):
+            self.min_table[k] = _rolling(min_levels, np.minimum, w, n)
+            self.max_table[k] = _rolling(max_levels, np.maximum, w, n)
+        self._row = {w: k for k, w in enumerate(self.windows)}
+
+    @classmethod
+    def from_tables(cls, windows, min_table, max_table):
+        """
+        Wraps tables built by another RollingIndex (e.g. attached from shared
+        memory) without recomputing them.
+        """
+        index = cls.__new__(cls)
+        index.windows = list(windows)
+        index.min_table = min_table
+        index.max_table = max_table
+        index._row = {w: k for k, w in enumerate(index.windows)}
+        return index
+
+    def __contains__(self, window):
+        return window in self._row
+
+    def min(self, window):
+        return self.min_table[self._row[window]]
+
+    def max(self, window):
+        return self.max_table[self._row[window]]
@@ -0,0 +1,166 @@
+"""
+Zero-copy sharing of a dataset with ProcessPoolExecutor workers.
+
+The owner publishes the OHLCV arrays and the rolling min/max tables of a
+dataset into multiprocessing.shared_memory blocks once. Each worker attaches
+to them in the pool initializer and tasks refer to the dataset by name, so a
+task payload is just the parameter tuple and the machine holds one copy of
+the data no matter how many tasks or workers there are.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import Bars, simulate_batch, simulate_history, simulate_metrics
+from forking import simulate_forking
+from rolling import RollingIndex
+
+# Datasets attached in this process: name -> (bars, rolling, shared memory blocks, bars per year)
+_attached = {}
+
+
+def _publish_array(array, blocks):
+    """
+    Copies an array into a new shared memory block.
+
+    Returns:
+        (block name, shape, dtype string) describing the block
+    """
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block.name, array.shape, array.dtype.str
+
+
+def _attach_array(spec, blocks):
+    block_name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=block_name)
+    blocks.append(block)
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    array.flags.writeable = False
+    return array
+
+
+class SharedDataset:
+    """
+    Owner side of a dataset published to shared memory.
+
+    Use as a context manager (or call close()) so the blocks are unlinked on
+    normal exit, on errors and on Ctrl-C. spec is the small picklable
+    description passed to attach() in every worker. periods_per_year
+    annualizes the risk metrics of the dataset's simulations.
+    """
+
+    def __init__(self, name, bars, rolling, periods_per_year=None):
+        self.name = name
+        self._blocks = []
+        try:
+            self.spec = {
+                'name': name,
+                'columns': [_publish_array(column, self._blocks) for column in bars],
+                'windows': list(rolling.windows),
+                'min_table': _publish_array(rolling.min_table, self._blocks),
+                'max_table': _publish_array(rolling.max_table, self._blocks),
+                'periods_per_year': periods_per_year,
+            }
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(*specs):
+    """
+    Pool initializer: maps every published dataset into this worker.
+    """
+    for spec in specs:
+        if spec['name'] in _attached:
+            continue
+        blocks = []
+        bars = Bars(*(_attach_array(column, blocks) for column in spec['columns']))
+        rolling = RollingIndex.from_tables(spec['windows'], _attach_array(spec['min_table'], blocks), _attach_array(spec['max_table'], blocks))
+        _attached[spec['name']] = (bars, rolling, blocks, spec['periods_per_year'])
+
+
+def dataset(name, length=None):
+    """
+    Returns:
+        (bars, rolling) of a dataset attached in this process, cut to its
+        first length bars if length is given
+    """
+    bars, rolling, _, _ = _attached[name]
+    if length is not None and length < len(bars):
+        # Rolling windows only look back, so a prefix of the tables is the prefix's index
+        bars = Bars(*(column[:length] for column in bars))
+        rolling = RollingIndex.from_tables(rolling.windows, rolling.min_table[:, :length], rolling.max_table[:, :length])
+    return bars, rolling
+
+
+def _periods_per_year(name):
+    return _attached[name][3]
+
+
+def run_shared_simulation(name, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, risk=True):
+    """Worker task: one metrics-only simulation over an attached dataset; risk False skips the risk metrics."""
+    bars, rolling = dataset(name)
+    if debug:
+        # Prints the per-bar debug output as simulate() does
+        return simulate_history(bars, window_size, start_coin, start_cash, debug, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling,
+                                _periods_per_year(name))[0]
+    return simulate_metrics(bars, window_size, start_coin, start_cash, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage, rolling,
+                            _periods_per_year(name), risk)
+
+
+def run_shared_batch(name, window_size, start_coin, start_cash, max_window_size, params, length=None, risk=True):
+    """Worker task: simulate_batch() over an attached dataset or its first length bars."""
+    bars, rolling = dataset(name, length)
+    return simulate_batch(bars, window_size, start_coin, start_cash, max_window_size, params, rolling, periods_per_year=_periods_per_year(name), risk=risk)
+
+
+def run_shared_trades(name, window_size, start_coin, start_cash, max_window_size, params, length=None, risk=True):
+    """
+    Worker task: simulate_batch() over an attached dataset, also recording trades.
+
+    Returns:
+        (list of SimulationResult, list of TradeLog)
+    """
+    bars, rolling = dataset(name, length)
+    logs = []
+    results = simulate_batch(bars, window_size, start_coin, start_cash, max_window_size, params, rolling, logs, _periods_per_year(name), risk)
+    return results, logs
+
+
+def run_shared_forking(name, window_size, start_coin, start_cash, max_window_size, params, length=None, risk=True):
+    """Worker task: simulate_forking() over an attached dataset or its first length bars."""
+    bars, rolling = dataset(name, length)
+    return simulate_forking(bars, window_size, start_coin, start_cash, max_window_size, params, rolling, periods_per_year=_periods_per_year(name), risk=risk)
+
+
+def run_shared_forking_stats(name, window_size, start_coin, start_cash, max_window_size, params, length=None, risk=True):
+    """
+    Worker task: simulate_forking() over an attached dataset, also counting
+    the bar-steps that prefix sharing saved.
+
+    Returns:
+        (list of SimulationResult, stats dict of simulate_forking())
+    """
+    bars, rolling = dataset(name, length)
+    stats = {}
+    results = simulate_forking(bars, window_size, start_coin, start_cash, max_window_size, params, rolling, stats, _periods_per_year(name), risk)
+    return results, stats
@@ -0,0 +1,284 @@
+"""
+Incremental, bar-by-bar form of the trading strategy for live candles.
+
+StreamingStrategy holds the state of one parameter combination and takes one
+OHLCV bar at a time. The rolling min/max of the close prices are kept in
+monotonic deques, so each bar costs O(1) amortized instead of a rescan of
+the window, and no history beyond the longest window is held. Feeding every
+bar of a dataset through update() gives the same SimulationResult as
+simulate_metrics() over the whole series. The risk metrics are accumulated
+bar by bar (running peak, sums of returns and of their squares) in the
+order the vectorized engines sum them, so they match exactly too.
+"""
+
+from collections import deque
+from typing import NamedTuple
+
+import math
+
+from engine import SimulationResult, risk_summary
+
+NAN = float('nan')
+
+
+class Signal(NamedTuple):
+    """
+    Decision taken on one bar and the levels in force for the next one.
+
+    decision is 1 for a buy, -1 for a sell and 0 otherwise (always 0 during
+    the first max_window_size bars). stop_price and go_price are set while
+    holding coin, bad_price while holding cash; the others are NaN.
+    """
+    index: int
+    decision: int
+    close: float
+    min_range: float
+    max_range: float
+    stop_price: float
+    go_price: float
+    bad_price: float
+    coin: float
+    cash: float
+    balance: float
+
+
+class _RollingExtreme:
+    """
+    Rolling min or max of the last window values as a monotonic deque of
+    (index, value) pairs, oldest first.
+    """
+
+    def __init__(self, window, is_max, entries=()):
+        self.window = window
+        self.is_max = is_max
+        self.entries = deque(tuple(entry) for entry in entries)
+
+    def push(self, index, value):
+        """
+        Returns:
+            the extreme of the window ending at index, value included
+        """
+        entries = self.entries
+        if self.is_max:
+            while entries and entries[-1][1] <= value:
+                entries.pop()
+        else:
+            while entries and entries[-1][1] >= value:
+                entries.pop()
+        entries.append((index, value))
+        if entries[0][0] <= index - self.window:
+            entries.popleft()
+        return entries[0][1]
+
+
+class StreamingStrategy:
+    """
+    The buy/sell/stop/go/bad state machine of one parameter combination,
+    advanced one bar at a time.
+
+    Takes the same parameters as simulate_metrics(). Bars before
+    max_window_size only fill the rolling windows, as in the batch engines.
+    """
+
+    # Attributes saved by snapshot(), besides the rolling windows
+    _STATE = ('window_size', 'start_coin', 'start_cash', 'stop_percentage', 'max_window_size', 'buy_window', 'sell_window',
+              'go_percentage', 'bad_percentage', 'index', 'coin', 'cash', 'close_price', 'highest_price', 'go_price', 'bad_price',
+              'last_buy_price', 'last_sell_price', 'trades', 'buy_good', 'buy_bad', 'sell_good', 'sell_bad',
+              'win_total', 'win_count', 'loss_total', 'loss_count', 'periods_per_year', 'first_equity', 'last_equity', 'peak_equity',
+              'low_ratio', 'return_sum', 'return_square_sum', 'downside_square_sum', 'held_bars',
+              'entry_cash', 'gross_profit', 'gross_loss')
+
+    def __init__(self, window_size, start_coin, start_cash, stop_percentage, max_window_size, buy_window, sell_window, go_percentage, bad_percentage,
+                 periods_per_year=None):
+        if max_window_size < min(buy_window, sell_window) or max(buy_window, sell_window) > max_window_size + 1:
+            raise ValueError(f"windows {buy_window}/{sell_window} do not fit before bar {max_window_size}")
+        self.window_size = window_size
+        self.start_coin = start_coin
+        self.start_cash = start_cash
+        self.stop_percentage = stop_percentage
+        self.max_window_size = max_window_size
+        self.buy_window = buy_window
+        self.sell_window = sell_window
+        self.go_percentage = go_percentage
+        self.bad_percentage = bad_percentage
+
+        self.index = 0
+        self.coin = start_coin
+        self.cash = start_cash
+        self.close_price = 0.0
+        self.highest_price = 0.0
+        self.go_price = 0
+        self.bad_price = 0
+        self.last_buy_price = 0.0
+        self.last_sell_price = 0.0
+        self.trades = 0
+        self.buy_good = 0
+        self.buy_bad = 0
+        self.sell_good = 0
+        self.sell_bad = 0
+        self.win_total = 0
+        self.win_count = 0
+        self.loss_total = 0
+        self.loss_count = 0
+
+        # Running aggregates of the equity curve for the risk metrics
+        self.periods_per_year = periods_per_year
+        self.first_equity = None
+        self.last_equity = 0.0
+        self.peak_equity = 0.0
+        # Lowest equity to running peak ratio: the max drawdown is 1 minus it
+        self.low_ratio = 1.0
+        self.return_sum = 0.0
+        self.return_square_sum = 0.0
+        self.downside_square_sum = 0.0
+        self.held_bars = 0
+        self.entry_cash = None
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+
+        self._min = _RollingExtreme(sell_window, False)
+        self._max = _RollingExtreme(buy_window, True)
+
+    def update(self, open_price, high, low, close, volume):
+        """
+        Advances the strategy by one bar. Only the close price drives the
+        strategy; the other fields are accepted so a candle can be passed as is.
+
+        Returns:
+            Signal
+        """
+        i = self.index
+        self.index += 1
+        close_price = float(close)
+        min_range = self._min.push(i, close_price)
+        max_range = self._max.push(i, close_price)
+        decision = 0
+
+        if i >= self.max_window_size:
+            self.close_price = close_price
+            fee = 0.000
+
+            if self.coin > 0:
+                # Trailing stop logic
+                if close_price > self.highest_price:
+                    self.highest_price = close_price
+                stop_price = self.highest_price * (1 - self.stop_percentage)
+
+                # Sell if the price falls below the stop price, min range, or if the profit exceeds go_percentage
+                if close_price <= min_range or close_price <= stop_price or (self.last_buy_price > 0 and close_price >= self.go_price):
+                    self.bad_price = close_price * (1 + self.bad_percentage)
+                    self.cash = self.coin * close_price * (1 - fee)
+                    self.trades += 1
+                    self.coin = 0.0
+                    decision = -1
+                    if self.entry_cash is not None:
+                        if self.cash >= self.entry_cash:
+                            self.gross_profit += self.cash - self.entry_cash
+                        else:
+                            self.gross_loss += self.entry_cash - self.cash
+                        self.entry_cash = None
+                    if self.last_buy_price > 0:
+                        curr_profit = close_price - self.last_buy_price
+                        if curr_profit >= 0:
+                            self.sell_good += 1
+                            self.win_total += curr_profit
+                            self.win_count += 1
+                        else:
+                            self.sell_bad += 1
+                            self.loss_total += curr_profit
+                            self.loss_count += 1
+                    self.last_sell_price = close_price
+
+            elif self.cash > 0:
+                if close_price >= max_range or (self.last_sell_price > 0 and close_price <= self.bad_price):
+                    self.go_price = close_price * (1 + self.go_percentage)
+                    self.entry_cash = self.cash
+                    self.coin = self.cash / close_price * (1 - fee)
+                    self.highest_price = close_price  # Reset highest price after buying
+                    self.cash = 0.0
+                    self.trades += 1
+                    decision = 1
+                    if self.last_sell_price > 0:
+                        curr_profit = close_price - self.last_sell_price
+                        if curr_profit >= 0:
+                            self.buy_good += 1
+                        else:
+                            self.buy_bad += 1
+                    self.last_buy_price = close_price
+
+            self._track_equity(self.coin * close_price + self.cash)
+
+        if self.coin > 0:
+            stop_price, go_price, bad_price = self.highest_price * (1 - self.stop_percentage), self.go_price, NAN
+        else:
+            stop_price, go_price, bad_price = NAN, NAN, self.bad_price
+        return Signal(i, decision, close_price, min_range, max_range, stop_price, go_price, bad_price,
+                      self.coin, self.cash, self.coin * close_price + self.cash)
+
+    def _track_equity(self, equity):
+        """Adds one bar's end-of-bar equity to the risk aggregates."""
+        if self.first_equity is None:
+            self.first_equity = self.peak_equity = equity
+        else:
+            # A return from a balance of 0 is undefined, as NumPy's NaN or inf is in the other engines
+            r = equity / self.last_equity - 1 if self.last_equity else math.nan
+            self.return_sum += r
+            self.return_square_sum += r * r
+            if r < 0:
+                self.downside_square_sum += r * r
+            self.peak_equity = max(self.peak_equity, equity)
+        if self.peak_equity > 0:
+            self.low_ratio = min(self.low_ratio, equity / self.peak_equity)
+        self.last_equity = equity
+        if self.coin > 0:
+            self.held_bars += 1
+
+    def risk(self):
+        """
+        Returns:
+            tuple of the RISK_METRICS values of the bars seen so far
+        """
+        bars = self.index - self.max_window_size
+        if bars <= 0:
+            return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+        return risk_summary(bars, self.first_equity, self.last_equity, 1 - self.low_ratio, self.return_sum, self.return_square_sum,
+                            self.downside_square_sum, self.held_bars, self.gross_profit, self.gross_loss, self.periods_per_year)
+
+    def result(self):
+        """
+        Returns:
+            SimulationResult of the bars seen so far, identical to
+            simulate_metrics() over the same bars
+        """
+        close_price = self.close_price
+        aver_wins = self.win_total / self.win_count if self.win_count else 0.0
+        aver_losses = self.loss_total / self.loss_count if self.loss_count else 0.0
+        return SimulationResult(self.index, self.coin, self.cash, self.coin + self.cash / close_price, self.coin * close_price + self.cash, self.trades,
+                                self.buy_good, self.buy_bad, self.sell_good, self.sell_bad, aver_wins, aver_losses,
+                                self.window_size, self.stop_percentage, self.buy_window, self.sell_window, self.go_percentage, self.bad_percentage,
+                                *self.risk())
+
+    def snapshot(self):
+        """
+        Returns:
+            JSON-serializable dict of the full state, for restore()
+        """
+        state = {name: getattr(self, name) for name in self._STATE}
+        state['min_window'] = [list(entry) for entry in self._min.entries]
+        state['max_window'] = [list(entry) for entry in self._max.entries]
+        return state
+
+    @classmethod
+    def restore(cls, state):
+        """
+        Rebuilds a strategy from a snapshot() so it continues with the next bar.
+        """
+        missing = [name for name in cls._STATE if name not in state]
+        if missing:
+            raise ValueError(f"state lacks {', '.join(missing)}: it was saved by an older version, replay the bars from the start")
+        strategy = cls.__new__(cls)
+        for name in cls._STATE:
+            setattr(strategy, name, state[name])
+        strategy._min = _RollingExtreme(strategy.sell_window, False, state['min_window'])
+        strategy._max = _RollingExtreme(strategy.buy_window, True, state['max_window'])
+        return strategy
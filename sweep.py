@@ -0,0 +1,305 @@
+"""
+Streaming dispatch and reduction of parameter-sweep results.
+
+Tasks are submitted to the pool in bounded chunks and their results are
+consumed in completion order, so the coordinator only ever holds the tasks
+in flight, a running top-K and a few aggregate statistics, however large
+the grid is. Per-combination rows are written to a sink as they arrive.
+"""
+
+import csv
+import heapq
+import math
+import operator
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import islice
+
+from engine import RISK_METRICS
+
+# SimulationResult attributes a sweep can be ranked by
+RANK_METRICS = ('final_cash', 'final_balance', 'trades', 'win_average',
+                'max_drawdown', 'sharpe', 'sortino', 'exposure', 'profit_factor', 'cagr')
+
+# Rank metrics where the smallest value is the best
+LOWER_IS_BETTER = ('max_drawdown', 'exposure')
+
+RESULT_COLUMNS = ('window_size', 'stop_percentage', 'buy_window', 'sell_window', 'go_percentage', 'bad_percentage',
+                  'start_coin', 'start_cash', 'end_coin', 'end_cash', 'final_balance', 'final_cash', 'trades',
+                  'buy_good', 'buy_bad', 'sell_good', 'sell_bad', 'win_average', 'loss_average',
+                  'max_drawdown', 'sharpe', 'sortino', 'exposure', 'profit_factor', 'cagr')
+
+_COMPARISONS = {'<=': operator.le, '>=': operator.ge, '<': operator.lt, '>': operator.gt}
+
+
+def parameter_grid(min_window_size, max_window_size):
+    """
+    The parameter axes swept by backtester-parallel.py.
+
+    Returns:
+        (stop_percentages, buy_windows, sell_windows, go_percentages, bad_percentages)
+    """
+    #stop_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
+    #stop_percentages = [0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
+    #buy_windows = [7, 14, 21, 28, 35, 42, 49, 56, 63, 70, 77, 84, 91, 98]
+    #sell_windows = [7, 14, 21, 28, 35, 42, 49, 56, 63, 70, 77, 84, 91, 98]
+    
+    sell_windows = []
+    sell_window_min = min_window_size
+    sell_window_max = max_window_size
+    sell_window_increment = 1    
+    for i in range(sell_window_min,sell_window_max,sell_window_increment):
+        sell_windows.append(i)
+    
+    #sell_windows = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+    stop_percentages = [0.1,0.2,0.3]
+    
+    buy_windows = []
+    buy_window_min = min_window_size
+    buy_window_max = max_window_size
+    buy_window_increment = 1    
+    for i in range(buy_window_min,buy_window_max,buy_window_increment):
+        buy_windows.append(i)
+    
+    #buy_windows = [1, 7, 14]
+    #sell_windows = [14]
+    #go_percentages = [2.0]
+    #bad_percentages = [2.0]
+    #go_percentages = [1.7, 1.8, 1.9, 2.0, 2.1, 2.2, 2.3]
+    #bad_percentages = [1.7, 1.8, 1.9, 2.0, 2.1, 2.2, 2.3]
+    go_percentages = [0.1, 1.0, 2.0, 3.0, 4.0, 5.0]
+    bad_percentages = [0.1, 1.0, 2.0, 3.0, 4.0, 5.0]
+    #go_percentages = [0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
+    #bad_percentages = [0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
+    #go_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
+    #bad_percentages = [0.01,0.02,0.04,0.06,0.08,0.1,0.12,0.14,0.16,0.18,0.2,0.22,0.24,0.26,0.28,0.3,0.32,0.34,0.36,0.38,0.4,0.42,0.44,0.46,0.48,0.5]
+    
+    #stop_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1]
+    #buy_windows = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    #sell_windows = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    #go_percentages = [0.01, 0.02,0.04,0.06,0.08,0.1]
+    #bad_percentages = [0.01,0.02,0.04,0.06,0.08,0.1]
+
+    return stop_percentages, buy_windows, sell_windows, go_percentages, bad_percentages
+
+
+def rank_value(result, metric):
+    """
+    Returns:
+        the metric of a result oriented so that greater is better; NaN
+        (a metric the engine did not compute) ranks last
+    """
+    return oriented_value(metric, getattr(result, metric))
+
+
+def oriented_value(metric, value):
+    """
+    Returns:
+        value of metric oriented so that greater is better, -inf for NaN
+    """
+    if value != value:
+        return -math.inf
+    return -value if metric in LOWER_IS_BETTER else value
+
+
+def parse_constraint(text):
+    """
+    Parses a --constraint option such as 'max_drawdown<=0.3'.
+
+    Returns:
+        (metric, comparison, value)
+    """
+    match = re.fullmatch(r'\s*(\w+)\s*(<=|>=|<|>)\s*(\S+)\s*', text)
+    if not match or match[1] not in RANK_METRICS:
+        raise ValueError(f"expected METRIC<=VALUE, METRIC>=VALUE, METRIC<VALUE or METRIC>VALUE with METRIC one of {', '.join(RANK_METRICS)}; got {text!r}")
+    return match[1], match[2], float(match[3])
+
+
+def uses_risk_metrics(metric, constraints=()):
+    """
+    Returns:
+        True if ranking by metric or checking the (metric, comparison, value)
+        constraints needs the risk metrics, which the engines only compute
+        when asked to
+    """
+    return metric in RISK_METRICS or any(name in RISK_METRICS for name, _, _ in constraints)
+
+
+def satisfies(result, constraints):
+    """
+    Returns:
+        True if the result meets every (metric, comparison, value) constraint
+    """
+    return all(_COMPARISONS[comparison](getattr(result, metric), value) for metric, comparison, value in constraints)
+
+
+def terminate_pool(executor):
+    """
+    Stops a ProcessPoolExecutor without waiting for queued tasks (used on Ctrl-C).
+    """
+    # ProcessPoolExecutor has no public way to stop running workers
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into lists of up to size items without materializing it.
+
+    Yields:
+        (index of the first item, list of items)
+    """
+    iterator = iter(iterable)
+    start = 0
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def stream_results(executor, tasks, max_pending):
+    """
+    Submits tasks to the executor keeping at most max_pending in flight.
+
+    tasks yields (tag, fn, args) tuples. Yields (tag, fn(*args)) in
+    completion order. A task with fn None is already done: (tag, args) is
+    yielded right away without going through the pool.
+    """
+    pending = {}
+    for tag, fn, args in tasks:
+        if fn is None:
+            yield tag, args
+            continue
+        pending[executor.submit(fn, *args)] = tag
+        if len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
+
+
+class TopK:
+    """
+    Running top-K of results by a metric (see rank_value()).
+
+    Ties go to the lower grid index, so the best entry is the same one an
+    in-order scan picking the first strictly greater value would choose.
+    Results that fail any of the (metric, comparison, value) constraints
+    are left out.
+    """
+
+    def __init__(self, k, metric='final_cash', constraints=()):
+        self.k = k
+        self.metric = metric
+        self.constraints = tuple(constraints)
+        self._heap = []
+        self._best_key = None
+
+    def push(self, index, result):
+        """
+        Returns:
+            True if the result is the new best
+        """
+        if self.constraints and not satisfies(result, self.constraints):
+            return False
+        key = (rank_value(result, self.metric), -index)
+        is_best = self._best_key is None or key > self._best_key
+        if is_best:
+            self._best_key = key
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, (*key, result))
+        elif key > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, (*key, result))
+        return is_best
+
+    def best(self):
+        """
+        Returns:
+            list of SimulationResult, best first
+        """
+        return [entry[2] for entry in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+    def best_indexes(self):
+        """
+        Returns:
+            list of the grid indexes of best(), in the same order
+        """
+        return [-entry[1] for entry in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+class SweepStats:
+    """Aggregate statistics of a metric over every finished combination."""
+
+    def __init__(self, metric='final_cash'):
+        self.metric = metric
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+
+    def add(self, result):
+        value = getattr(result, self.metric)
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0.0
+        return f"Combinations: {self.count}, {self.metric} min: {self.minimum}, mean: {mean}, max: {self.maximum}"
+
+
+def result_row(result, start_coin, start_cash):
+    """
+    Returns:
+        the RESULT_COLUMNS values of a SimulationResult
+    """
+    r = result
+    return (r.window_size, r.stop_percentage, r.buy_window, r.sell_window, r.go_percentage, r.bad_percentage,
+            start_coin, start_cash, r.end_coin, r.end_cash, r.final_balance, r.final_cash, r.trades,
+            r.buy_good, r.buy_bad, r.sell_good, r.sell_bad, r.win_average, r.loss_average,
+            r.max_drawdown, r.sharpe, r.sortino, r.exposure, r.profit_factor, r.cagr)
+
+
+class PrintSink:
+    """Writes one human-readable line per combination to stdout."""
+
+    def __init__(self, start_coin, start_cash):
+        self.start_coin = start_coin
+        self.start_cash = start_cash
+
+    def write(self, result):
+        r = result
+        print(f"Window Size: {r.window_size}, Stop Percentage: {r.stop_percentage}, Buy Window: {r.buy_window}, Sell Window: {r.sell_window}, Go Percentage: {r.go_percentage}, Bad Percentage: {r.bad_percentage}, "
+              f"Start Coins: {self.start_coin}, Start Cash: {self.start_cash}, "
+              f"End Coins: {r.end_coin}, End Cash: {r.end_cash}, Final Balance: {r.final_balance}, Balance (in cash): {r.final_cash}, "
+              f"Trades: {r.trades}, buy_good: {r.buy_good}, buy_bad: {r.buy_bad}, sell_good: {r.sell_good}, sell_bad: {r.sell_bad}, win_average: {r.win_average}, loss_average: {r.loss_average}, "
+              f"max_drawdown: {r.max_drawdown}, sharpe: {r.sharpe}, sortino: {r.sortino}, exposure: {r.exposure}, profit_factor: {r.profit_factor}, cagr: {r.cagr}")
+
+    def close(self):
+        sys.stdout.flush()
+
+
+class CsvSink:
+    """Writes one RESULT_COLUMNS row per combination to a CSV file."""
+
+    def __init__(self, path, start_coin, start_cash):
+        self.start_coin = start_coin
+        self.start_cash = start_cash
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(RESULT_COLUMNS)
+
+    def write(self, result):
+        self._writer.writerow(result_row(result, self.start_coin, self.start_cash))
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,155 @@
+"""
+Per-task telemetry for sweeps dispatched with sweep.stream_results().
+
+SweepTracer wraps the (tag, fn, args) tasks so each one runs through
+traced_call() in the worker, which times the call and reports its pid and
+result size back with the result. The coordinator adds the submit time and
+payload size and writes one record per task to a trace file: JSON lines
+(one object per task, written as they finish) or, for a path ending in
+.json, Chrome trace format (open in chrome://tracing or Perfetto, one row
+per worker). A sampled subset of tasks can run under cProfile; their
+profiles are merged into one pstats file.
+"""
+
+import cProfile
+import json
+import os
+import pickle
+import pstats
+import time
+
+
+class _Profile:
+    """Adapter giving pstats.Stats the raw stats dict of a worker's profiler."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def traced_call(fn, args, profile):
+    """
+    Worker side of a traced task: runs fn(*args), optionally under cProfile.
+
+    Returns:
+        (result, record dict with the worker pid, start/finish wall-clock
+        times, simulation seconds, result size and profiler stats)
+    """
+    start = time.time()
+    t0 = time.perf_counter()
+    if profile:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn, *args)
+        profiler.create_stats()
+        stats = profiler.stats
+    else:
+        result = fn(*args)
+        stats = None
+    seconds = time.perf_counter() - t0
+    record = {'pid': os.getpid(), 'start': start, 'finish': time.time(), 'sim_seconds': seconds,
+              'result_bytes': len(pickle.dumps(result, pickle.HIGHEST_PROTOCOL)), 'profile': stats}
+    return result, record
+
+
+class SweepTracer:
+    """
+    Coordinator side: wraps tasks, collects the worker records and keeps
+    running totals for the live summary.
+    """
+
+    def __init__(self, path, workers, profile_every=0):
+        self.path = path
+        self.workers = workers
+        self.profile_every = profile_every
+        self.chrome = path.endswith('.json')
+        self._file = open(path, 'w')
+        self._events = []
+        self._submitted = {}
+        self._profile = None
+        self._seq = 0
+        self.started = time.time()
+        self.tasks = 0
+        self.busy = 0.0
+        self.queue_wait = 0.0
+
+    def wrap(self, tasks):
+        """
+        Routes every (tag, fn, args) task through traced_call(). Tasks with
+        fn None are already done and pass through untraced.
+        """
+        for tag, fn, args in tasks:
+            if fn is None:
+                yield (None, tag), None, args
+                continue
+            seq = self._seq
+            self._seq += 1
+            profile = self.profile_every > 0 and seq % self.profile_every == 0
+            self._submitted[seq] = (fn.__name__, time.time(), len(pickle.dumps(args, pickle.HIGHEST_PROTOCOL)))
+            yield (seq, tag), traced_call, (fn, args, profile)
+
+    def unwrap(self, results):
+        """
+        Records the telemetry of wrapped results from stream_results().
+
+        Yields:
+            (tag, result) as the untraced tasks would have
+        """
+        for (seq, tag), value in results:
+            if seq is None:
+                yield tag, value
+                continue
+            result, record = value
+            self._record(seq, result, record)
+            yield tag, result
+
+    def _record(self, seq, result, record):
+        name, submit, payload_bytes = self._submitted.pop(seq)
+        stats = record.pop('profile')
+        if stats is not None:
+            if self._profile is None:
+                self._profile = pstats.Stats(_Profile(stats))
+            else:
+                self._profile.add(_Profile(stats))
+        # Batch tasks return a list of results, or a (results, extras) tuple
+        results = result[0] if isinstance(result, tuple) else result
+        record.update(task=seq, fn=name, submit=submit, payload_bytes=payload_bytes, configs=len(results) if isinstance(results, list) else 1,
+                      queue_seconds=record['start'] - submit, profiled=stats is not None)
+        self.tasks += 1
+        self.busy += record['finish'] - record['start']
+        self.queue_wait += record['queue_seconds']
+        if self.chrome:
+            self._events.append({'name': name, 'cat': 'task', 'ph': 'X', 'pid': record['pid'], 'tid': record['pid'],
+                                 'ts': (record['start'] - self.started) * 1e6, 'dur': (record['finish'] - record['start']) * 1e6,
+                                 'args': {key: record[key] for key in ('task', 'configs', 'payload_bytes', 'result_bytes', 'sim_seconds', 'queue_seconds')}})
+        else:
+            self._file.write(json.dumps(record) + '\n')
+
+    def summary(self, completed, total):
+        """
+        Returns:
+            one-line throughput, worker utilization, queue latency and ETA summary
+        """
+        elapsed = time.time() - self.started
+        rate = completed / elapsed if elapsed > 0 else 0.0
+        utilization = self.busy / (elapsed * self.workers) if elapsed > 0 else 0.0
+        queue = self.queue_wait / self.tasks if self.tasks else 0.0
+        eta = (total - completed) / rate if rate > 0 else float('inf')
+        return f"{rate:.1f} sims/s, utilization {utilization:.0%}, mean queue wait {queue * 1000:.1f}ms, ETA {eta:.1f}s"
+
+    def close(self, profile_out=None, top=15):
+        """
+        Finishes the trace file; saves the merged profile to profile_out, or
+        prints its top functions by cumulative time.
+        """
+        if self._file.closed:
+            return
+        if self.chrome:
+            json.dump({'traceEvents': self._events, 'displayTimeUnit': 'ms'}, self._file)
+        self._file.close()
+        if self._profile is not None:
+            if profile_out:
+                self._profile.dump_stats(profile_out)
+            else:
+                self._profile.sort_stats('cumulative').print_stats(top)
@@ -0,0 +1,147 @@
+"""
+Fills a cube with a real sweep of two datasets, one of them only partly
+simulated, and checks its queries against plain NumPy reductions of the
+same results.
+"""
+
+import itertools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cube as cube_module  # noqa: E402
+from cube import AXES, ResultCube  # noqa: E402
+from datasets import load_bars  # noqa: E402
+from engine import simulate_batch  # noqa: E402
+from rolling import RollingIndex  # noqa: E402
+from sweep import parameter_grid  # noqa: E402
+
+DATA_FILES = [os.path.join(ROOT, 'data', f'btc_cycle{cycle}_5D.csv') for cycle in (2, 3)]
+START_COIN, START_CASH = 0, 1000
+MIN_WINDOW_SIZE, MAX_WINDOW_SIZE = 2, 7
+PARAMETER_AXES = parameter_grid(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE)
+GRID = list(itertools.product(*PARAMETER_AXES))
+SHAPE = (len(DATA_FILES),) + tuple(len(values) for values in PARAMETER_AXES)
+# Grid indexes simulated for each dataset; the second one is only half done
+SIMULATED = [np.arange(len(GRID)), np.arange(0, len(GRID), 2)]
+METRICS = ('final_cash', 'max_drawdown', 'trades')
+
+
+@pytest.fixture(scope='module')
+def results():
+    """
+    Returns:
+        list of (grid indexes, SimulationResult list), one per dataset
+    """
+    swept = []
+    for data_file, indexes in zip(DATA_FILES, SIMULATED):
+        bars = load_bars(data_file, False)
+        rolling = RollingIndex(bars.close, set(PARAMETER_AXES[1]) | set(PARAMETER_AXES[2]))
+        swept.append((indexes, simulate_batch(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, [GRID[k] for k in indexes], rolling)))
+    return swept
+
+
+@pytest.fixture(scope='module')
+def expected(results):
+    """
+    Returns:
+        {metric: float array of SHAPE, NaN where not simulated}
+    """
+    arrays = {}
+    for metric in METRICS:
+        array = np.full(SHAPE, np.nan)
+        for position, (indexes, records) in enumerate(results):
+            array[position].reshape(-1)[indexes] = [getattr(record, metric) for record in records]
+        arrays[metric] = array
+    return arrays
+
+
+@pytest.fixture(scope='module')
+def cube(results, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('sweep') / 'results.cube')
+    settings = {'start_coin': START_COIN, 'start_cash': START_CASH, 'max_window_size': MAX_WINDOW_SIZE, 'window_size': 0}
+    with ResultCube.create(path, DATA_FILES, PARAMETER_AXES, settings, METRICS) as written:
+        for data_file, (indexes, records) in zip(DATA_FILES, results):
+            written.write(data_file, indexes, records)
+    with ResultCube(path) as cube:
+        yield cube
+
+
+@pytest.fixture(params=[cube_module.BLOCK_BYTES, 4096])
+def block_bytes(request, monkeypatch):
+    # The small size makes marginal() and top() read many blocks
+    monkeypatch.setattr(cube_module, 'BLOCK_BYTES', request.param)
+    return request.param
+
+
+def test_values(cube, expected):
+    assert cube.shape == SHAPE and cube.settings['start_cash'] == START_CASH
+    names, values = cube.values('final_cash')
+    assert names == list(AXES)
+    np.testing.assert_array_equal(values, expected['final_cash'])
+    names, values = cube.values('trades', dataset=DATA_FILES[1], buy_window=[4, 2])
+    assert names == list(AXES[1:])
+    np.testing.assert_array_equal(values, expected['trades'][1][:, [2, 0]])
+
+
+@pytest.mark.parametrize('reduce', ['max', 'min', 'mean'])
+@pytest.mark.parametrize('keep', [['buy_window', 'sell_window'], ['sell_window', 'dataset'], ['dataset'], ['bad_percentage']])
+def test_marginal(cube, expected, block_bytes, reduce, keep):
+    names, values = cube.marginal('final_cash', keep, reduce)
+    reduced = tuple(k for k, axis in enumerate(AXES) if axis not in keep)
+    manual = {'max': np.nanmax, 'min': np.nanmin, 'mean': np.nanmean}[reduce](expected['final_cash'], axis=reduced)
+    kept = [axis for axis in AXES if axis in keep]
+    assert names == keep
+    np.testing.assert_allclose(values, np.transpose(manual, [kept.index(axis) for axis in keep]), rtol=1e-12)
+
+
+def test_marginal_selection(cube, expected):
+    names, values = cube.marginal('final_cash', ['go_percentage'], 'max', dataset=DATA_FILES[0], stop_percentage=0.1)
+    assert names == ['go_percentage']
+    np.testing.assert_array_equal(values, np.nanmax(expected['final_cash'][0, 0], axis=(0, 1, 3)))
+
+
+@pytest.mark.parametrize('metric', ['final_cash', 'max_drawdown'])
+def test_top(cube, expected, block_bytes, metric):
+    flat = expected[metric].reshape(-1)
+    sign = -1.0 if metric == 'max_drawdown' else 1.0
+    # Best first, ties in grid order
+    order = sorted(np.flatnonzero(~np.isnan(flat)).tolist(), key=lambda cell: (-sign * flat[cell], cell))[:10]
+    top = cube.top(metric, 10)
+    assert [value for _, value in top] == [flat[cell] for cell in order]
+    for (axes, _), cell in zip(top, order):
+        position = np.unravel_index(cell, SHAPE)
+        assert axes == {axis: cube.axes[axis][p] for axis, p in zip(AXES, position)}
+
+
+def test_top_fixed(cube, expected):
+    top = cube.top('final_cash', 1, dataset=DATA_FILES[0])
+    assert top[0][1] == np.nanmax(expected['final_cash'][0])
+    assert top[0][0]['dataset'] == DATA_FILES[0]
+
+
+@pytest.mark.parametrize('metric', ['final_cash', 'max_drawdown'])
+def test_best_region_radius_zero(cube, metric):
+    cell, mean, value = cube.best_region(metric, 0, dataset=DATA_FILES[0])
+    (best, best_value), = cube.top(metric, 1, dataset=DATA_FILES[0])
+    assert cell == best and mean == value == best_value
+
+
+def test_best_region(cube, expected):
+    cell, mean, value = cube.best_region('final_cash', 1, dataset=DATA_FILES[1])
+    values = expected['final_cash'][1]
+    # Neighbourhood mean of every cell by brute force, over simulated cells only
+    means = np.full(values.shape, -np.inf)
+    for index in np.ndindex(values.shape):
+        box = values[tuple(slice(max(i - 1, 0), i + 2) for i in index)]
+        if np.isfinite(box).any():
+            means[index] = np.nanmean(box)
+    best = np.unravel_index(int(np.argmax(means)), means.shape)
+    assert cell == {'dataset': DATA_FILES[1], **{axis: cube.axes[axis][p] for axis, p in zip(AXES[1:], best)}}
+    assert mean == pytest.approx(means[best], rel=1e-12)
+    assert value == values[best] or (np.isnan(value) and np.isnan(values[best]))
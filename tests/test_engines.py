@@ -0,0 +1,121 @@
+"""
+Checks every simulation engine against the pandas reference engine of
+backtester-parallel.py on a few grid points of one dataset.
+"""
+
+import importlib.util
+import itertools
+import math
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datasets import load_bars, load_frame, periods_per_year  # noqa: E402
+from engine import SimulationResult, simulate, simulate_batch, simulate_metrics  # noqa: E402
+from forking import simulate_forking  # noqa: E402
+from rolling import RollingIndex  # noqa: E402
+from streaming import StreamingStrategy  # noqa: E402
+from sweep import parameter_grid  # noqa: E402
+
+DATA_FILE = os.path.join(ROOT, 'data', 'btc_cycle2_5D.csv')
+START_COIN, START_CASH = 0, 1000
+MIN_WINDOW_SIZE, MAX_WINDOW_SIZE = 2, 7
+# Every 450th combination of the 2700, plus one that trades often
+GRID = list(itertools.product(*parameter_grid(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE)))
+PARAMS = GRID[::450] + [(0.1, 4, 4, 5.0, 0.1)]
+
+
+def _load_reference():
+    path = os.path.join(ROOT, 'backtester-parallel.py')
+    spec = importlib.util.spec_from_file_location('backtester_parallel', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _core(result):
+    """
+    Returns:
+        the fields of a SimulationResult shared with the 28-element tuple,
+        leaving out the risk metrics
+    """
+    if isinstance(result, tuple):
+        result = SimulationResult.from_tuple(result)
+    return result.astuple()[:-6]
+
+
+def _streamed(bars, p, periods_per_year=None):
+    strategy = StreamingStrategy(0, START_COIN, START_CASH, p[0], MAX_WINDOW_SIZE, *p[1:], periods_per_year=periods_per_year)
+    for bar in zip(*bars):
+        strategy.update(*bar)
+    return strategy.result()
+
+
+@pytest.fixture(scope='module')
+def bars():
+    return load_bars(DATA_FILE, False)
+
+
+@pytest.fixture(scope='module')
+def rolling(bars):
+    return RollingIndex(bars.close, {p[1] for p in PARAMS} | {p[2] for p in PARAMS})
+
+
+@pytest.fixture(scope='module')
+def expected():
+    reference = _load_reference()
+    frame = load_frame(DATA_FILE, False)
+    return [_core(reference.run_simulation(frame, 0, START_COIN, START_CASH, False, p[0], MAX_WINDOW_SIZE, *p[1:], True, engine='pandas'))
+            for p in PARAMS]
+
+
+def test_reference_trades(expected):
+    assert any(result[5] > 0 for result in expected)
+
+
+@pytest.mark.parametrize('cleanup', [True, False])
+def test_simulate(bars, expected, cleanup):
+    actual = [_core(simulate(bars, 0, START_COIN, START_CASH, False, p[0], MAX_WINDOW_SIZE, *p[1:], cleanup)) for p in PARAMS]
+    assert actual == expected
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_simulate_metrics(bars, rolling, expected, shared):
+    actual = [_core(simulate_metrics(bars, 0, START_COIN, START_CASH, p[0], MAX_WINDOW_SIZE, *p[1:], rolling=rolling if shared else None))
+              for p in PARAMS]
+    assert actual == expected
+
+
+@pytest.mark.parametrize('risk', [False, True])
+def test_simulate_batch(bars, rolling, expected, risk):
+    actual = [_core(r) for r in simulate_batch(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, PARAMS, rolling, risk=risk)]
+    assert actual == expected
+
+
+@pytest.mark.parametrize('risk', [False, True])
+def test_simulate_forking(bars, rolling, expected, risk):
+    actual = [_core(r) for r in simulate_forking(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, PARAMS, rolling, risk=risk)]
+    assert actual == expected
+
+
+def test_streaming_strategy(bars, expected):
+    assert [_core(_streamed(bars, p)) for p in PARAMS] == expected
+
+
+def test_risk_metrics_agree(bars, rolling):
+    ppy = periods_per_year(DATA_FILE, False)
+    scalar = [simulate_metrics(bars, 0, START_COIN, START_CASH, p[0], MAX_WINDOW_SIZE, *p[1:], rolling=rolling, periods_per_year=ppy) for p in PARAMS]
+    assert not any(math.isnan(value) for result in scalar for value in result.astuple())
+    assert simulate_batch(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, PARAMS, rolling, periods_per_year=ppy) == scalar
+    assert simulate_forking(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, PARAMS, rolling, periods_per_year=ppy) == scalar
+    assert [_streamed(bars, p, ppy) for p in PARAMS] == scalar
+
+
+def test_batch_of_one(bars, rolling):
+    for p in PARAMS:
+        scalar = simulate_metrics(bars, 0, START_COIN, START_CASH, p[0], MAX_WINDOW_SIZE, *p[1:], rolling=rolling)
+        assert simulate_batch(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, [p], rolling) == [scalar]
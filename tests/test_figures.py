@@ -0,0 +1,92 @@
+"""
+Checks that the downsampling of figures.py keeps the extremes of the real
+daily price series while staying within the requested number of points.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datasets import load_bars, load_frame  # noqa: E402
+from engine import simulate_history  # noqa: E402
+from figures import bucket_starts, downsample_line, downsample_ohlc, minmax_indices, simulation_figure  # noqa: E402
+
+DATA_FILE = os.path.join(ROOT, 'data', 'btc_2010-2024_1D.csv')
+MAX_POINTS = (100, 999, 2000)
+# Replay of the best 5D configuration, whose stop levels are NaN on some bars
+REPLAY_FILE = os.path.join(ROOT, 'data', 'btc_cycle2_5D.csv')
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return load_frame(DATA_FILE, False)
+
+
+@pytest.fixture(scope='module')
+def history():
+    return simulate_history(load_bars(REPLAY_FILE, False), 0, 0, 1000, False, 0.1, 7, 4, 4, 5.0, 0.1)[1]
+
+
+def _buckets(length, max_points):
+    starts = bucket_starts(length, max_points)
+    return zip(starts, np.r_[starts[1:], length])
+
+
+def test_bucket_starts():
+    assert bucket_starts(10, 20).tolist() == list(range(10))
+    starts = bucket_starts(5000, 7)
+    assert len(starts) == 7 and starts[0] == 0
+    assert np.diff(starts).max() - np.diff(starts).min() <= 1
+
+
+@pytest.mark.parametrize('max_points', MAX_POINTS)
+def test_minmax_indices(frame, max_points):
+    y = frame['Close'].to_numpy()
+    indices = minmax_indices(y, max_points)
+    assert len(indices) <= max_points
+    assert np.all(np.diff(indices) > 0)
+    kept = set(indices.tolist())
+    for start, end in _buckets(len(y), max_points // 4):
+        bucket = y[start:end]
+        assert {start, end - 1, start + int(np.argmin(bucket)), start + int(np.argmax(bucket))} <= kept
+
+
+def test_minmax_indices_short(frame):
+    y = frame['Close'].to_numpy()[:50]
+    assert minmax_indices(y, 50).tolist() == list(range(50))
+    assert minmax_indices(y, None).tolist() == list(range(50))
+
+
+def test_downsample_line_skips_nan(history):
+    y = history.stop_price
+    finite = np.flatnonzero(np.isfinite(y))
+    x, kept = downsample_line(np.arange(len(y)), y, 40)
+    assert len(kept) <= 40 and np.all(np.isfinite(kept))
+    assert np.array_equal(kept, y[x])
+    assert x[0] == finite[0] and x[-1] == finite[-1]
+    assert kept.min() == np.nanmin(y) and kept.max() == np.nanmax(y)
+
+
+@pytest.mark.parametrize('max_points', MAX_POINTS)
+def test_downsample_ohlc(frame, max_points):
+    columns = [frame[name].to_numpy() for name in ('DateTime', 'Open', 'High', 'Low', 'Close')]
+    time, open_, high, low, close = downsample_ohlc(*columns, max_points)
+    assert len(close) <= max_points
+    assert high.max() == columns[2].max() and low.min() == columns[3].min()
+    candles = [(columns[0][start], columns[1][start], columns[2][start:end].max(), columns[3][start:end].min(), columns[4][end - 1])
+               for start, end in _buckets(len(frame), max_points)]
+    assert list(zip(time, open_, high, low, close)) == candles
+
+
+def test_simulation_figure_points(history):
+    fig = simulation_figure(history, 'test', max_points=40)
+    for trace in fig.data:
+        if trace.name in ('Buy Signal', 'Sell Signal'):
+            assert len(trace.x) == np.count_nonzero(history.buy if trace.name == 'Buy Signal' else history.sell)
+        else:
+            assert len(trace.x) <= 40
@@ -0,0 +1,74 @@
+"""
+Rebuilds the data/ bar files of one halving cycle from raw intraday rows,
+with string and with numeric time columns, through resample-data.py.
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Rebuilt exactly; the coarse files of cycles 2 and 3 carry rounding from their original source
+CYCLE = os.path.join(ROOT, 'data', 'btc_cycle4_{}.csv')
+# Seconds into the day of the raw rows built for every daily bar
+OFFSETS = (0, 21600, 43200, 86340)
+
+
+def _load_resample():
+    path = os.path.join(ROOT, 'resample-data.py')
+    spec = importlib.util.spec_from_file_location('resample_data', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+resample_data = _load_resample()
+
+
+def _raw_rows(daily, time_format):
+    """
+    Returns:
+        DataFrame of len(OFFSETS) rows per daily bar that aggregate back to
+        it, with the time column as Unix seconds or as date strings. Some
+        data/ bars close above their high, so every row repeats the bar's
+        prices and only the first one carries its volume.
+    """
+    seconds = (daily['DateTime'].to_numpy()[:, None] + np.array(OFFSETS)).ravel()
+    prices = {name.lower(): np.repeat(daily[name].to_numpy(), len(OFFSETS)) for name in ('Open', 'High', 'Low', 'Close')}
+    volume = np.zeros(len(seconds))
+    volume[::len(OFFSETS)] = daily['Volume'].to_numpy()
+    if time_format == 'string':
+        times = pd.to_datetime(seconds, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+        column = 'timestamp'
+    else:
+        times = seconds
+        column = 'unix'
+    return pd.DataFrame({column: times, **prices, 'volume': volume})
+
+
+@pytest.fixture(scope='module', params=['string', 'numeric'])
+def daily(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp(request.param) / 'raw.csv'
+    _raw_rows(pd.read_csv(CYCLE.format('1D'), float_precision='round_trip'), request.param).to_csv(path, index=False)
+    # Small chunks, so that days also merge across chunk boundaries
+    return resample_data.aggregate_days(str(path), chunk_rows=999)
+
+
+@pytest.mark.parametrize('timeframe', resample_data.TIMEFRAMES)
+def test_resample_matches_data_files(daily, timeframe):
+    expected = pd.read_csv(CYCLE.format(timeframe), float_precision='round_trip')
+    bars = resample_data.resample(daily, timeframe)
+    np.testing.assert_array_equal(bars['time'], expected.iloc[:, 0].to_numpy())
+    for name in ('Open', 'High', 'Low', 'Close', 'Volume'):
+        np.testing.assert_array_equal(bars[name], expected[name].to_numpy())
+
+
+@pytest.mark.parametrize('values', [pd.Series(['2012-11-28 00:00:00', '2012-11-28 10:00:01']),
+                                    pd.Series([1354060800, 1354096801]),
+                                    pd.Series([1354060800000, 1354096801000]),
+                                    pd.Series([1354060800 * 10 ** 9, 1354096801 * 10 ** 9])])
+def test_to_seconds(values):
+    assert resample_data.to_seconds(values).tolist() == [1354060800, 1354096801]
@@ -0,0 +1,90 @@
+"""
+Checks that the result store hands back what a sweep saved, so resumed and
+widened sweeps only simulate the combinations they have not seen.
+"""
+
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datasets import content_hash, load_bars  # noqa: E402
+from engine import simulate_batch  # noqa: E402
+from result_store import ResultStore  # noqa: E402
+from rolling import RollingIndex  # noqa: E402
+from sweep import parameter_grid  # noqa: E402
+
+DATA_FILE = os.path.join(ROOT, 'data', 'btc_cycle2_5D.csv')
+START_COIN, START_CASH = 0, 1000
+MIN_WINDOW_SIZE, MAX_WINDOW_SIZE = 2, 7
+GRID = list(itertools.product(*parameter_grid(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE)))
+# The first sweep covers every 300th combination; the widened one every 150th
+FIRST, WIDENED = GRID[::300], GRID[::150]
+
+
+@pytest.fixture(scope='module')
+def bars():
+    return load_bars(DATA_FILE, False)
+
+
+@pytest.fixture(scope='module')
+def rolling(bars):
+    return RollingIndex(bars.close, {p[1] for p in GRID} | {p[2] for p in GRID})
+
+
+@pytest.fixture(scope='module')
+def run_key():
+    return ResultStore.run_key(content_hash(DATA_FILE, False), START_COIN, START_CASH, MAX_WINDOW_SIZE)
+
+
+def _sweep(bars, rolling, params, risk=True):
+    return simulate_batch(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, params, rolling, risk=risk)
+
+
+def test_resume(tmp_path, bars, rolling, run_key):
+    results = _sweep(bars, rolling, FIRST)
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        store.save(run_key, results, DATA_FILE)
+    # A new connection sees the committed rows, as an interrupted sweep's rerun does
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        found = store.lookup(run_key, FIRST, risk=True)
+    assert found == {result.params: result for result in results}
+
+
+def test_widened_grid(tmp_path, bars, rolling, run_key):
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        store.save(run_key, _sweep(bars, rolling, FIRST), DATA_FILE)
+        found = store.lookup(run_key, WIDENED)
+        assert set(found) == set(FIRST)
+        missing = [p for p in WIDENED if p not in found]
+        assert len(missing) == len(WIDENED) - len(FIRST)
+        store.save(run_key, _sweep(bars, rolling, missing), DATA_FILE)
+        assert store.lookup(run_key, WIDENED) == {result.params: result for result in _sweep(bars, rolling, WIDENED)}
+
+
+def test_other_settings_miss(tmp_path, bars, rolling, run_key):
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        store.save(run_key, _sweep(bars, rolling, FIRST), DATA_FILE)
+        assert store.lookup(ResultStore.run_key(run_key[0], START_COIN, 2000, MAX_WINDOW_SIZE), FIRST) == {}
+        assert store.lookup(ResultStore.run_key('0' * 64, START_COIN, START_CASH, MAX_WINDOW_SIZE), FIRST) == {}
+
+
+def test_risk_needs_metrics(tmp_path, bars, rolling, run_key):
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        store.save(run_key, _sweep(bars, rolling, FIRST, risk=False), DATA_FILE)
+        assert set(store.lookup(run_key, FIRST)) == set(FIRST)
+        assert store.lookup(run_key, FIRST, risk=True) == {}
+
+
+def test_best(tmp_path, bars, rolling, run_key):
+    results = _sweep(bars, rolling, WIDENED)
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        store.save(run_key, results, DATA_FILE)
+        best = store.best('final_cash', 3, run_key[0])
+    assert [result for _, _, result in best] == sorted(results, key=lambda result: -result.final_cash)[:3]
+    assert {data_file for data_file, _, _ in best} == {DATA_FILE}
+    assert best[0][1] == {'start_coin': START_COIN, 'start_cash': START_CASH, 'max_window_size': MAX_WINDOW_SIZE, 'window_size': 0}
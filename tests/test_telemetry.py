@@ -0,0 +1,132 @@
+"""
+Runs a small traced sweep over one dataset in a process pool and checks the
+trace records, the merged profile and the live summary of SweepTracer.
+"""
+
+import itertools
+import json
+import os
+import pstats
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datasets import load_bars, periods_per_year  # noqa: E402
+from engine import simulate_batch  # noqa: E402
+from rolling import RollingIndex  # noqa: E402
+from shared_data import SharedDataset, attach, run_shared_batch  # noqa: E402
+from sweep import chunked, parameter_grid, stream_results  # noqa: E402
+from telemetry import SweepTracer  # noqa: E402
+
+DATA_FILE = os.path.join(ROOT, 'data', 'btc_cycle2_5D.csv')
+START_COIN, START_CASH = 0, 1000
+MIN_WINDOW_SIZE, MAX_WINDOW_SIZE = 2, 7
+GRID = list(itertools.product(*parameter_grid(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE)))[::50]
+WORKERS = 2
+CHUNKS = [chunk for _, chunk in chunked(GRID, 6)]
+
+
+@pytest.fixture(scope='module')
+def bars():
+    return load_bars(DATA_FILE, False)
+
+
+@pytest.fixture(scope='module')
+def rolling(bars):
+    return RollingIndex(bars.close, {p[1] for p in GRID} | {p[2] for p in GRID})
+
+
+@pytest.fixture(scope='module')
+def ppy():
+    return periods_per_year(DATA_FILE, False)
+
+
+@pytest.fixture(scope='module')
+def executor(bars, rolling, ppy):
+    with SharedDataset(DATA_FILE, bars, rolling, ppy) as shared:
+        with ProcessPoolExecutor(max_workers=WORKERS, initializer=attach, initargs=(shared.spec,)) as executor:
+            yield executor
+
+
+def _tasks(cached=()):
+    """
+    Yields:
+        (chunk index, fn, args) batch tasks over CHUNKS; chunks listed
+        in cached are already done and carry a placeholder result
+    """
+    for index, chunk in enumerate(CHUNKS):
+        if index in cached:
+            yield index, None, 'cached'
+        else:
+            yield index, run_shared_batch, (DATA_FILE, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, chunk)
+
+
+def _sweep(tracer, executor, cached=()):
+    return dict(tracer.unwrap(stream_results(executor, tracer.wrap(_tasks(cached)), 4)))
+
+
+@pytest.mark.parametrize('suffix', ['.jsonl', '.json'])
+def test_traced_results(tmp_path, executor, bars, rolling, ppy, suffix):
+    tracer = SweepTracer(str(tmp_path / f'trace{suffix}'), WORKERS)
+    results = _sweep(tracer, executor, cached={1})
+    tracer.close()
+    assert results.pop(1) == 'cached'
+    expected = [simulate_batch(bars, 0, START_COIN, START_CASH, MAX_WINDOW_SIZE, chunk, rolling, periods_per_year=ppy) for chunk in CHUNKS]
+    assert results == {index: chunk for index, chunk in enumerate(expected) if index != 1}
+    assert tracer.tasks == len(results)
+
+
+def test_jsonl_records(tmp_path, executor):
+    path = tmp_path / 'trace.jsonl'
+    tracer = SweepTracer(str(path), WORKERS)
+    _sweep(tracer, executor)
+    tracer.close()
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record['task'] for record in records) == list(range(len(records)))
+    assert sum(record['configs'] for record in records) == len(GRID)
+    for record in records:
+        assert record['fn'] == 'run_shared_batch'
+        assert record['submit'] <= record['start'] <= record['finish']
+        assert record['payload_bytes'] > 0 and record['result_bytes'] > 0
+        assert record['pid'] != os.getpid() and not record['profiled']
+
+
+def test_chrome_trace(tmp_path, executor):
+    path = tmp_path / 'trace.json'
+    tracer = SweepTracer(str(path), WORKERS)
+    _sweep(tracer, executor)
+    tracer.close()
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    assert len(events) == tracer.tasks
+    assert all(event['ph'] == 'X' and event['dur'] >= 0 and event['pid'] == event['tid'] for event in events)
+    assert sum(event['args']['configs'] for event in events) == len(GRID)
+
+
+def test_profile(tmp_path, executor):
+    path = tmp_path / 'trace.jsonl'
+    tracer = SweepTracer(str(path), WORKERS, profile_every=2)
+    _sweep(tracer, executor)
+    tracer.close(str(tmp_path / 'sweep.prof'))
+    with open(path) as f:
+        profiled = sorted(record['task'] for record in map(json.loads, f) if record['profiled'])
+    assert profiled == list(range(0, tracer.tasks, 2))
+    functions = {name for _, _, name in pstats.Stats(str(tmp_path / 'sweep.prof')).stats}
+    assert 'simulate_batch' in functions
+
+
+def test_summary(tmp_path, executor):
+    tracer = SweepTracer(str(tmp_path / 'trace.jsonl'), WORKERS)
+    assert tracer.summary(0, len(GRID)).endswith('mean queue wait 0.0ms, ETA infs')
+    _sweep(tracer, executor)
+    rate, utilization, queue, eta = tracer.summary(len(GRID), len(GRID)).split(', ')
+    tracer.close()
+    assert float(rate.split()[0]) > 0
+    assert utilization.startswith('utilization ') and utilization.endswith('%')
+    assert queue.startswith('mean queue wait ') and queue.endswith('ms')
+    assert eta == 'ETA 0.0s'
@@ -0,0 +1,119 @@
+"""
+Runs the walk-forward over the bull/bear regimes of one dataset in a process
+pool and checks it against the README sample and against direct simulations
+of each regime.
+"""
+
+import importlib.util
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datasets import load_bars, periods_per_year  # noqa: E402
+from engine import Bars, simulate_batch  # noqa: E402
+from rolling import RollingIndex  # noqa: E402
+from shared_data import SharedDataset, attach  # noqa: E402
+from sweep import parameter_grid, rank_value  # noqa: E402
+from walk_forward import format_walk_forward, regime_segments, walk_forward  # noqa: E402
+
+DATA_FILE = os.path.join(ROOT, 'data', 'btc_cycle2_5D.csv')
+START_COIN, START_CASH = 0, 1000
+MIN_WINDOW_SIZE, MAX_WINDOW_SIZE = 2, 7
+AXES = parameter_grid(MIN_WINDOW_SIZE, MAX_WINDOW_SIZE)
+GRID = list(itertools.product(*AXES))
+SEGMENTS = [('Bull #1', 7, 73), ('Bear', 73, 155), ('Bull #2', 155, 264)]
+# Sample output of the walk-forward in README.md
+README_SAMPLE = """\
+Segment Bull #1: bars 7 to 72
+Segment Bear: bars 73 to 154
+Segment Bull #2: bars 155 to 263
+Train on Bull #1, test on Bear: stop 0.1, buy_window 4, sell_window 4, go 5.0, bad 0.1
+  In sample:     final cash 186821.82, trades 18, max drawdown 0.1908593670595179, sharpe 4.869872301036509
+  Out of sample: final cash 1741.78, trades 42, max drawdown 0.5985687703961855, sharpe 0.7746464143735804
+  Best on Bear in hindsight by final_cash: final cash 2015.14, trades 40, max drawdown 0.5450783922262482, sharpe 0.8299751042043759
+Train on Bear, test on Bull #2: stop 0.2, buy_window 2, sell_window 4, go 5.0, bad 0.1
+  In sample:     final cash 2015.14, trades 40, max drawdown 0.5450783922262482, sharpe 0.8299751042043759
+  Out of sample: final cash 1949.86, trades 29, max drawdown 0.3224557005640405, sharpe 1.0978574057712334
+  Best on Bull #2 in hindsight by final_cash: final cash 2824.11, trades 15, max drawdown 0.2804365945870251, sharpe 1.5174581405333516"""
+
+
+def _load_plot_data():
+    path = os.path.join(ROOT, 'plot-data.py')
+    spec = importlib.util.spec_from_file_location('plot_data', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def bars():
+    return load_bars(DATA_FILE, False)
+
+
+@pytest.fixture(scope='module')
+def rolling(bars):
+    return RollingIndex(bars.close, set(AXES[1]) | set(AXES[2]))
+
+
+@pytest.fixture(scope='module')
+def ppy():
+    return periods_per_year(DATA_FILE, False)
+
+
+@pytest.fixture(scope='module')
+def executor(bars, rolling, ppy):
+    with SharedDataset(DATA_FILE, bars, rolling, ppy) as shared:
+        with ProcessPoolExecutor(max_workers=2, initializer=attach, initargs=(shared.spec,)) as executor:
+            yield executor
+
+
+def _segment(bars, ppy, start, end, params):
+    """
+    Returns:
+        SimulationResult list of params simulated on the bars start to end
+        exclusive, with rolling tables of the cut bars rather than the
+        shared ones of the whole dataset
+    """
+    cut = Bars(*(column[:end] for column in bars))
+    cut_rolling = RollingIndex(cut.close, set(AXES[1]) | set(AXES[2]))
+    return simulate_batch(cut, 0, START_COIN, START_CASH, start, params, cut_rolling, periods_per_year=ppy)
+
+
+def test_regime_segments(bars):
+    boundaries = _load_plot_data().compute_bull_bear_boundaries(DATA_FILE, False)
+    assert regime_segments(boundaries, MAX_WINDOW_SIZE, len(bars)) == SEGMENTS
+    # The warm-up swallows all of Bull #1, and the data ends inside the Bear regime
+    assert regime_segments(boundaries, 80, 154) == [('Bear', 80, 154)]
+    assert regime_segments(boundaries, 72, 264) == SEGMENTS[1:]
+
+
+@pytest.mark.parametrize('share_prefixes', [False, True])
+def test_readme_sample(executor, share_prefixes):
+    report = walk_forward(executor, DATA_FILE, GRID, SEGMENTS, 0, START_COIN, START_CASH, batch_size=256, max_pending=8, share_prefixes=share_prefixes)
+    assert format_walk_forward(report, SEGMENTS, 'final_cash') == README_SAMPLE
+
+
+def test_direct_simulation(executor, bars, ppy):
+    report = walk_forward(executor, DATA_FILE, GRID, SEGMENTS, 0, START_COIN, START_CASH, 'sharpe', batch_size=100, max_pending=8)
+    swept = [_segment(bars, ppy, start, end, GRID) for _, start, end in SEGMENTS]
+    for train, entry in enumerate(report):
+        # First of the best by grid order, as TopK breaks ties
+        best = max(range(len(GRID)), key=lambda k: (rank_value(swept[train][k], 'sharpe'), -k))
+        hindsight = max(range(len(GRID)), key=lambda k: (rank_value(swept[train + 1][k], 'sharpe'), -k))
+        _, start, end = SEGMENTS[train + 1]
+        assert entry['best'] == swept[train][best]
+        assert entry['out_of_sample'] == _segment(bars, ppy, start, end, [GRID[best]])[0]
+        assert entry['hindsight'] == swept[train + 1][hindsight]
+
+
+def test_unmet_constraints(executor):
+    report = walk_forward(executor, DATA_FILE, GRID, SEGMENTS, 0, START_COIN, START_CASH, constraints=[('trades', '>', 1000)], max_pending=8)
+    assert [(entry['best'], entry['out_of_sample'], entry['hindsight']) for entry in report] == [(None, None, None)] * 2
+    assert format_walk_forward(report, SEGMENTS, 'final_cash').splitlines()[3:] == [
+        'Train on Bull #1: no configuration meets the constraints', 'Train on Bear: no configuration meets the constraints']
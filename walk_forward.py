@@ -0,0 +1,115 @@
+"""
+Walk-forward evaluation over the bull/bear regimes of a dataset.
+
+plot-data.py's compute_bull_bear_boundaries() splits a series into Bull #1,
+Bear and Bull #2. Instead of optimizing over the whole file, the walk-forward
+picks the best configuration on each regime (the training segment) and
+reports how it does on the next one (out of sample), next to the best
+configuration of that regime in hindsight.
+
+Every (segment, parameter chunk) is one pool task, and all of them run
+concurrently. A segment is simulated from its first bar with max_window_size
+set to that bar and the dataset cut after its last bar. The rolling windows
+only look back, so the tables built once for the whole dataset already hold
+the warm-up of every segment and nothing is re-scanned from the start of the
+series. Each segment starts from start_coin and start_cash.
+
+Only the running best of each segment is kept during the sweep; a second,
+small pass then simulates each training winner on the next segment.
+"""
+
+from shared_data import run_shared_batch, run_shared_forking
+from sweep import TopK, chunked, stream_results
+
+REGIMES = ('Bull #1', 'Bear', 'Bull #2')
+
+
+def regime_segments(boundaries, max_window_size, data_len):
+    """
+    Splits the bars after max_window_size at the bull/bear boundaries.
+
+    Returns:
+        list of (regime name, first bar, end bar exclusive); segments that
+        would have fewer than two bars after max_window_size are left out
+    """
+    boundary_1, boundary_2, final_sample = boundaries
+    edges = [0, int(boundary_1), int(boundary_2), int(final_sample) + 1]
+    segments = []
+    for name, start, end in zip(REGIMES, edges, edges[1:]):
+        start = max(start, max_window_size)
+        end = min(end, data_len)
+        if end - start >= 2:
+            segments.append((name, start, end))
+    return segments
+
+
+def walk_forward(executor, name, grid, segments, window_size, start_coin, start_cash, rank_by='final_cash', constraints=(),
+                 batch_size=256, max_pending=16, share_prefixes=False, risk=True):
+    """
+    Sweeps the grid on every segment of the dataset attached as name, then
+    pairs each segment's best configuration with its result on the next one.
+    The risk metrics are computed only if risk.
+
+    Returns:
+        list of dicts, one per segment after the first, with 'train' and
+        'test' (the regime names), 'best' (the training winner's
+        SimulationResult on the training segment), 'out_of_sample' (the
+        same parameters on the test segment) and 'hindsight' (the best
+        result on the test segment); 'best' and 'out_of_sample' are None
+        if no configuration meets the constraints on the training segment
+    """
+    batch_fn = run_shared_forking if share_prefixes else run_shared_batch
+    tasks = (
+        ((segment, index), batch_fn, (name, window_size, start_coin, start_cash, start, chunk, end, risk))
+        for segment, (_, start, end) in enumerate(segments)
+        for index, chunk in chunked(grid, batch_size)
+    )
+    tops = [TopK(1, rank_by, constraints) for _ in segments]
+    for (segment, index), batch in stream_results(executor, tasks, max_pending):
+        for offset, result in enumerate(batch):
+            tops[segment].push(index + offset, result)
+
+    # Each training winner on the next segment
+    tasks = (
+        (train, run_shared_batch, (name, window_size, start_coin, start_cash, segments[train + 1][1],
+                                   [grid[tops[train].best_indexes()[0]]], segments[train + 1][2], risk))
+        for train in range(len(segments) - 1)
+        if tops[train].best()
+    )
+    out_of_sample = {train: batch[0] for train, batch in stream_results(executor, tasks, max_pending)}
+
+    report = []
+    for train in range(len(segments) - 1):
+        best = tops[train].best()
+        hindsight = tops[train + 1].best()
+        report.append({'train': segments[train][0], 'test': segments[train + 1][0], 'best': best[0] if best else None,
+                       'out_of_sample': out_of_sample.get(train), 'hindsight': hindsight[0] if hindsight else None})
+    return report
+
+
+def _describe(result, rank_by):
+    text = f"final cash {round(result.final_cash, 2)}, trades {result.trades}"
+    shown = ('final_cash', 'trades')
+    # NaN when the sweep skipped the risk metrics
+    if result.max_drawdown == result.max_drawdown:
+        text += f", max drawdown {result.max_drawdown}, sharpe {result.sharpe}"
+        shown += ('max_drawdown', 'sharpe')
+    if rank_by not in shown:
+        text += f", {rank_by} {getattr(result, rank_by)}"
+    return text
+
+
+def format_walk_forward(report, segments, rank_by):
+    lines = [f"Segment {name}: bars {start} to {end - 1}" for name, start, end in segments]
+    for entry in report:
+        best, out_of_sample, hindsight = entry['best'], entry['out_of_sample'], entry['hindsight']
+        if best is None:
+            lines.append(f"Train on {entry['train']}: no configuration meets the constraints")
+            continue
+        lines.append(f"Train on {entry['train']}, test on {entry['test']}: stop {best.stop_percentage}, buy_window {best.buy_window}, sell_window {best.sell_window}, "
+                     f"go {best.go_percentage}, bad {best.bad_percentage}")
+        lines.append(f"  In sample:     {_describe(best, rank_by)}")
+        lines.append(f"  Out of sample: {_describe(out_of_sample, rank_by)}")
+        if hindsight is not None:
+            lines.append(f"  Best on {entry['test']} in hindsight by {rank_by}: {_describe(hindsight, rank_by)}")
+    return '\n'.join(lines)